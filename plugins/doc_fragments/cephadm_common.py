@@ -0,0 +1,123 @@
+# Copyright 2026, StackHPC, Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+
+class ModuleDocFragment(object):
+
+    # Options shared by all modules, see cephadm_argument_spec()
+    DOCUMENTATION = r'''
+options:
+    ceph_transport:
+        description:
+            - How ceph commands are sent to the cluster.
+              If 'cli' is used, every command runs the 'ceph' CLI in a
+              'cephadm shell' container.
+              If 'rados' is used, commands are sent to the monitors through
+              a single librados connection, which requires python3-rados,
+              /etc/ceph/ceph.conf and the admin keyring on the host.
+              If 'host' is used, 'ceph' commands run the 'ceph' CLI
+              installed on the host, e.g. with cephadm_install_ceph_cli,
+              without starting a container. It requires ceph.conf and a
+              readable keyring, see I(cephadm_config) and
+              I(cephadm_keyring). Other commands, and commands reading or
+              writing files, still run in a 'cephadm shell' container.
+              If 'auto' is used, 'rados' is used when available, falling
+              back to 'cli' otherwise. 'host' is never picked by 'auto'.
+            - The default, 'cli', runs the same commands as previous
+              releases. The other transports must be chosen explicitly, as
+              they use whichever librados or ceph CLI is installed on the
+              host rather than the version of the cluster image.
+        required: false
+        choices: ['auto', 'cli', 'rados', 'host']
+        default: cli
+        type: str
+    detailed_timings:
+        description:
+            - The result of the module has a C(timings) list, with the wall
+              time in seconds, rc and output size of each command run.
+            - If true, the time spent starting the 'cephadm shell' container
+              (C(cephadm)) is told apart from the time spent in the 'ceph'
+              CLI (C(ceph)) for each command run through the CLI.
+            - Can also be enabled by setting the CEPHADM_DETAILED_TIMINGS
+              environment variable.
+        required: false
+        default: false
+        type: bool
+    cephadm_image:
+        description:
+            - Container image passed to 'cephadm --image', instead of
+              letting cephadm look for the image of the local daemons on
+              every 'cephadm shell'.
+            - Can also be set with the CEPHADM_IMAGE environment variable.
+        required: false
+        type: str
+    cephadm_fsid:
+        description:
+            - fsid passed to 'cephadm shell --fsid', instead of letting
+              cephadm infer it from /var/lib/ceph.
+        required: false
+        type: str
+    cephadm_config:
+        description:
+            - Path of the ceph.conf passed to 'cephadm shell --config'.
+        required: false
+        type: str
+    cephadm_keyring:
+        description:
+            - Path of the keyring passed to 'cephadm shell --keyring'.
+        required: false
+        type: str
+    cephadm_discover:
+        description:
+            - Read the fsid from /etc/ceph/ceph.conf, the image from the
+              unit files of the local daemons, and use ceph.conf and the
+              admin keyring if they exist, once per module run. They are
+              passed explicitly to every 'cephadm shell' like the options
+              above, which win over the discovered values.
+            - The discovered values are cached on the host in the
+              directory of the cluster in /var/run/ceph, and discovered
+              again once ceph.conf, the admin keyring, the daemons of the
+              cluster or the unit file the image was read from change.
+        required: false
+        default: false
+        type: bool
+'''
+
+    # Options of the modules supporting fingerprints, see
+    # fingerprint_argument_spec()
+    FINGERPRINT = r'''
+options:
+    fingerprint:
+        description:
+            - Store a fingerprint of the desired state in the monitors
+              config-key store, along with the OSD map epoch, once the
+              object is reconciled.
+            - While both the fingerprint and the epoch match on the next
+              runs, the module exits unchanged after a single cheap check
+              instead of querying the cluster.
+        required: false
+        default: false
+        type: bool
+    force_verify:
+        description:
+            - When I(fingerprint) is used, verify the object against the
+              cluster even if its fingerprint matches, then store the
+              fingerprint again.
+        required: false
+        default: false
+        type: bool
+'''
@@ -17,41 +17,1533 @@
 from __future__ import (absolute_import, division, print_function)
 __metaclass__ = type
 
+import atexit
+import base64
+import codecs
+import concurrent.futures
 import datetime
+import errno
+import glob
+import hashlib
+import json
+import os
+import re
+import subprocess
+import tempfile
+import threading
+import time
+import weakref
 
+from ansible.module_utils.basic import env_fallback
 
-def generate_ceph_cmd(sub_cmd, args):
+try:
+    from shlex import quote
+except ImportError:
+    from pipes import quote
+
+try:
+    import rados
+    HAS_RADOS = True
+except ImportError:
+    HAS_RADOS = False
+
+try:
+    import ceph_argparse
+    HAS_CEPH_ARGPARSE = True
+except ImportError:
+    HAS_CEPH_ARGPARSE = False
+
+CEPHADM_TIMEOUT = 60
+# Maximum number of command groups run concurrently by a parallel batch
+BATCH_PARALLELISM = 4
+CEPH_CONF = '/etc/ceph/ceph.conf'
+CEPH_ADMIN_KEYRING = '/etc/ceph/ceph.client.admin.keyring'
+CEPH_DATA_DIR = '/var/lib/ceph'
+# Options pinning what 'cephadm shell' otherwise infers from the host on
+# every invocation: (module option, cephadm option, option of 'shell')
+SHELL_PINS = (
+    ('cephadm_image', '--image', False),
+    ('cephadm_fsid', '--fsid', True),
+    ('cephadm_config', '--config', True),
+    ('cephadm_keyring', '--keyring', True),
+)
+
+# Options handled by the 'ceph' CLI itself rather than sent to the monitors
+CLI_ONLY_OPTIONS = ('-o', '--out-file', '-c', '--conf', '-k', '--keyring',
+                    '-n', '--name', '--id', '--user', '--cluster', '-s',
+                    '--status', '-w', '--watch', '-h', '--help')
+SNAPSHOT_DIR = '/var/run/ceph'
+SNAPSHOT_FILE = 'ansible_cluster_snapshot.json'
+SHELL_PINS_FILE = 'ansible_shell_pins.json'
+BATCH_MARKER = '__CEPHADM_BATCH_RESULT__'
+DETAILED_TIMINGS_ENV = 'CEPHADM_DETAILED_TIMINGS'
+FINGERPRINT_PREFIX = 'stackhpc/cephadm/fingerprint'
+# Bump when the meaning of the options of a module changes, so that the
+# objects applied by an older release are verified again.
+FINGERPRINT_VERSION = 1
+
+# Shell function used to run each command of a batch inside a single
+# 'cephadm shell' container. stdout and stderr are base64 encoded so that
+# arbitrary command output can't be confused with the result markers, the
+# time spent in the command is reported in nanoseconds.
+BATCH_RUNNER = '''_cephadm_start=$(date +%s%N)
+_cephadm_run() {
+    _index=$1
+    shift
+    _out=$(mktemp)
+    _err=$(mktemp)
+    _start=$(date +%s%N)
+    "$@" </dev/null >"$_out" 2>"$_err"
+    _rc=$?
+    _elapsed=$(($(date +%s%N) - _start))
+    printf '%s %s %s %s %s %s\\n' ''' + BATCH_MARKER + ''' "$_index" "$_rc" \\
+        "$(base64 -w0 <"$_out")" "$(base64 -w0 <"$_err")" "$_elapsed"
+    rm -f "$_out" "$_err"
+    return $_rc
+}
+'''
+# Last line of a batch, reporting the time spent running the whole script
+BATCH_TOTAL = '''printf '%s total %s\\n' ''' + BATCH_MARKER + ''' \\
+    "$(($(date +%s%N) - _cephadm_start))"
+'''
+
+
+def generate_cephadm_shell_cmd(timeout=CEPHADM_TIMEOUT):
     '''
-    Generate 'ceph' command line to execute
+    Generate the 'cephadm shell' prefix used to run commands in a container
     '''
 
-    cmd = [
+    return [
         'cephadm',
         '--timeout',
-        '60',
+        str(timeout),
         'shell',
         '--',
-        'ceph',
     ]
+
+
+def generate_ceph_cmd(sub_cmd, args):
+    '''
+    Generate 'ceph' command line to execute
+    '''
+
+    cmd = generate_cephadm_shell_cmd()
+    cmd.append('ceph')
     cmd.extend(sub_cmd + args)
 
     return cmd
 
 
+def container_cmd(cmd):
+    '''
+    Return the part of a 'cephadm shell' command line run in the container
+    '''
+
+    if cmd[:1] == ['cephadm'] and '--' in cmd:
+        return cmd[cmd.index('--') + 1:]
+
+    return cmd
+
+
+def get_mtime(path):
+    '''
+    Return the modification time of a path, None if it doesn't exist
+    '''
+
+    try:
+        return os.stat(path).st_mtime
+    except (IOError, OSError):
+        return None
+
+
+def discover_shell_pins(conf=CEPH_CONF, keyring=CEPH_ADMIN_KEYRING,
+                        data_dir=CEPH_DATA_DIR, cache_dir=SNAPSHOT_DIR):
+    '''
+    Read the image, fsid, config and keyring of the local cluster
+
+    The fsid comes from ceph.conf and the image from the unit files of the
+    local daemons, preferably a monitor, which cephadm writes again when it
+    redeploys them, e.g. on upgrades. Only the ones found are returned.
+
+    The pins are cached in the directory of the cluster in cache_dir along
+    with the modification times of the files and directory they were read
+    from, and only discovered again once one of these changed.
+    '''
+
+    fsid = get_local_fsid(conf)
+    if fsid is None:
+        return {}
+
+    cache_path = None
+    if cache_dir and os.path.isdir(os.path.join(cache_dir, fsid)):
+        cache_path = os.path.join(cache_dir, fsid, SHELL_PINS_FILE)
+        cached = read_snapshot(cache_path)
+        if (isinstance(cached, dict) and cached.get('sources') and
+                all(get_mtime(path) == mtime
+                    for path, mtime in cached['sources'])):
+            return cached['pins']
+
+    # Modification times are taken before reading, so that a file changed
+    # meanwhile invalidates the cache next time.
+    unit_dir = os.path.join(data_dir, fsid)
+    sources = [[path, get_mtime(path)] for path in (conf, keyring, unit_dir)]
+
+    pins = {'cephadm_fsid': fsid}
+    if os.path.exists(conf):
+        pins['cephadm_config'] = conf
+    if os.path.exists(keyring):
+        pins['cephadm_keyring'] = keyring
+
+    image = None
+    for daemon in ('mon', 'mgr', '*'):
+        for path in sorted(glob.glob(os.path.join(unit_dir, daemon + '.*', 'unit.image'))):  # noqa: E501
+            mtime = get_mtime(path)
+            try:
+                with open(path) as f:
+                    image = f.read().strip()
+            except (IOError, OSError):
+                continue
+            if image:
+                pins['cephadm_image'] = image
+                sources.append([path, mtime])
+                break
+        if image:
+            break
+
+    if cache_path:
+        write_snapshot(cache_path, dict(pins=pins, sources=sources))
+
+    return pins
+
+
+# Pins of each module, looked up once per module run
+_shell_pins = weakref.WeakKeyDictionary()
+
+
+def get_shell_pins(module):
+    '''
+    Return the pins of a module, as a dict of module option to value
+
+    Options set explicitly win over the discovered ones.
+    '''
+
+    pins = _shell_pins.get(module)
+    if pins is not None:
+        return pins
+
+    pins = {}
+    if module.params.get('cephadm_discover') is True:
+        pins = discover_shell_pins()
+    for option, cephadm_option, shell_option in SHELL_PINS:
+        value = module.params.get(option)
+        if isinstance(value, str) and value:
+            pins[option] = value
+
+    _shell_pins[module] = pins
+
+    return pins
+
+
+def pin_shell_cmd(module, cmd):
+    '''
+    Pass the pins of a module explicitly to a 'cephadm shell' command line
+    '''
+
+    prefix = cmd[:cmd.index('--')] if '--' in cmd else cmd
+    if prefix[:1] != ['cephadm'] or 'shell' not in prefix:
+        return cmd
+
+    pins = get_shell_pins(module)
+    if not pins:
+        return cmd
+
+    global_args = []
+    shell_args = []
+    for option, cephadm_option, shell_option in SHELL_PINS:
+        if pins.get(option) and cephadm_option not in prefix:
+            args = shell_args if shell_option else global_args
+            args.extend([cephadm_option, pins[option]])
+
+    shell = cmd.index('shell')
+    return cmd[:1] + global_args + cmd[1:shell + 1] + shell_args + cmd[shell + 1:]  # noqa: E501
+
+
+def generate_batch_script(cmd_groups, parallelism=0):
+    '''
+    Generate a shell script running groups of commands
+
+    Each group stops at its first failing command, the following groups are
+    still executed. Groups run one after another, or up to parallelism
+    groups at a time if set.
+    '''
+
+    lines = [BATCH_RUNNER]
+    if parallelism:
+        # Each group writes its results to its own file so that the output
+        # of concurrent groups can't interleave.
+        lines.append('_results=$(mktemp -d)')
+
+    index = 0
+    for group_index, group in enumerate(cmd_groups):
+        runs = []
+        for cmd in group:
+            runs.append('_cephadm_run {0} {1}'.format(index, ' '.join(quote(a) for a in container_cmd(cmd))))  # noqa: E501
+            index += 1
+        if parallelism:
+            lines.append('while [ "$(jobs -pr | wc -l)" -ge {0} ]; do wait -n; done'.format(parallelism))  # noqa: E501
+            lines.append('{{ {0}; }} >"$_results/{1}" &'.format(' && '.join(runs), group_index))  # noqa: E501
+        else:
+            lines.append(' && '.join(runs))
+
+    if parallelism:
+        lines.append('wait')
+        lines.append('cat "$_results"/*')
+        lines.append('rm -rf "$_results"')
+    lines.append(BATCH_TOTAL)
+
+    return '\n'.join(lines)
+
+
+def parse_batch_output(cmd_list, rc, out, err):
+    '''
+    Split the output of a batch into one (rc, cmd, out, err) per command
+
+    Return a dict indexed by the position of the command in cmd_list,
+    commands which weren't executed are missing.
+    '''
+
+    results = {}
+    for fields in _batch_lines(out):
+        if not fields[1].isdigit():
+            continue
+        index = int(fields[1])
+        if index >= len(cmd_list):
+            continue
+        results[index] = (int(fields[2]),
+                          cmd_list[index],
+                          base64.b64decode(fields[3]).decode('utf-8', 'replace'),  # noqa: E501
+                          base64.b64decode(fields[4]).decode('utf-8', 'replace'))  # noqa: E501
+
+    # The container itself failed (e.g. cephadm couldn't start it), report
+    # its error against the first command which didn't run.
+    if not results and rc != 0:
+        results[0] = (rc, cmd_list[0], '', err)
+
+    return results
+
+
+def _batch_lines(out):
+    '''
+    Yield the fields of the result lines of a batch
+    '''
+
+    for line in out.splitlines():
+        if not line.startswith(BATCH_MARKER + ' '):
+            continue
+        fields = line.split(' ')
+        fields.extend([''] * (6 - len(fields)))
+        yield fields
+
+
+def parse_batch_timings(out):
+    '''
+    Get the time spent in each command of a batch, in seconds
+
+    Return a dict indexed by the position of the command, the time spent
+    running the whole batch script is under the 'total' key.
+    '''
+
+    timings = {}
+    for fields in _batch_lines(out):
+        if fields[1] == 'total':
+            elapsed = fields[2]
+        else:
+            elapsed = fields[5]
+        if not elapsed.isdigit():
+            continue
+        key = fields[1]
+        if key.isdigit():
+            key = int(key)
+        timings[key] = int(elapsed) / 1e9
+
+    return timings
+
+
+def _run_batch(module, cmd_groups, parallelism=0):
+    '''
+    Run groups of commands in a single 'cephadm shell' container
+
+    Return the parsed results, the time spent in each command as returned
+    by parse_batch_timings(), and the run of the container itself as an
+    (rc, cmd, out, err, duration) tuple.
+    '''
+
+    cmd_list = [cmd for group in cmd_groups for cmd in group]
+    cmd = pin_shell_cmd(module, generate_cephadm_shell_cmd(CEPHADM_TIMEOUT * len(cmd_list)))  # noqa: E501
+    cmd.append('bash')
+    # The script is fed on stdin, a single argument can't be longer than
+    # 128 KiB.
+    start = time.time()
+    rc, out, err = module.run_command(cmd, data=generate_batch_script(cmd_groups, parallelism))  # noqa: E501
+    duration = time.time() - start
+
+    cmd = cmd + ['<batch of {0} commands>'.format(len(cmd_list))]
+
+    return (parse_batch_output(cmd_list, rc, out, err),
+            parse_batch_timings(out),
+            (rc, cmd, out, err, duration))
+
+
+def _exec_command_group(module, group):
+    '''
+    Execute a group of commands one by one, stopping at the first failure
+    '''
+
+    results = []
+    for cmd in group:
+        results.append(exec_command(module, cmd))
+        if results[-1][0] != 0:
+            break
+
+    return results
+
+
+def exec_command_groups(module, cmd_groups, parallel=False):
+    '''
+    Execute groups of 'ceph' commands in a single 'cephadm shell' container
+
+    Each group stops at its first failing command. When parallel is set,
+    the groups are independent and up to BATCH_PARALLELISM of them run
+    concurrently. Return, for each group, the list of (rc, cmd, out, err)
+    of its commands which were executed.
+    '''
+
+    cmd_groups = [group for group in cmd_groups if group]
+    cmd_list = [cmd for group in cmd_groups for cmd in group]
+    if not cmd_list:
+        return []
+
+    # Only the CLI pays a container start per command, other transports
+    # run each command on their own.
+    if len(cmd_list) == 1 or get_transport(module).name != 'cli':
+        if parallel and len(cmd_groups) > 1:
+            with concurrent.futures.ThreadPoolExecutor(
+                    max_workers=min(BATCH_PARALLELISM, len(cmd_groups))) as executor:  # noqa: E501
+                return list(executor.map(
+                    lambda group: _exec_command_group(module, group),
+                    cmd_groups))
+        return [_exec_command_group(module, group) for group in cmd_groups]
+
+    parallelism = 0
+    if parallel:
+        parallelism = BATCH_PARALLELISM
+    results, timings, container = _run_batch(module, cmd_groups, parallelism)
+
+    rc, cmd, out, err, duration = container
+    details = {}
+    if detailed_timings(module) and 'total' in timings:
+        details = dict(cephadm=duration - timings['total'],
+                       ceph=timings['total'])
+    record_timing(module, cmd, rc, out, err, duration, 'cli',
+                  batch=len(cmd_list), **details)
+    for index in sorted(results):
+        rc, cmd, out, err = results[index]
+        record_timing(module, cmd, rc, out, err, timings.get(index), 'cli',
+                      batched=True)
+
+    group_results = []
+    index = 0
+    for group in cmd_groups:
+        group_results.append([results[i]
+                              for i in range(index, index + len(group))
+                              if i in results])
+        index += len(group)
+
+    return group_results
+
+
+def exec_commands_batch(module, cmd_list, stop_on_error=False):
+    '''
+    Execute a list of 'ceph' commands in a single 'cephadm shell' container
+
+    Return one (rc, cmd, out, err) tuple per command executed, in order.
+    When stop_on_error is set, commands following a failed one are not
+    executed and are missing from the result.
+    '''
+
+    if stop_on_error:
+        cmd_groups = [cmd_list]
+    else:
+        cmd_groups = [[cmd] for cmd in cmd_list]
+
+    return [result
+            for results in exec_command_groups(module, cmd_groups)
+            for result in results]
+
+
+def cephadm_argument_spec():
+    '''
+    Return the options shared by all the cephadm modules
+    '''
+
+    return dict(
+        ceph_transport=dict(type='str', required=False, default='cli',
+                            choices=['auto', 'cli', 'rados', 'host']),
+        detailed_timings=dict(type='bool', required=False, default=False,
+                              fallback=(env_fallback, [DETAILED_TIMINGS_ENV])),  # noqa: E501
+        cephadm_image=dict(type='str', required=False,
+                           fallback=(env_fallback, ['CEPHADM_IMAGE'])),
+        cephadm_fsid=dict(type='str', required=False),
+        cephadm_config=dict(type='str', required=False),
+        cephadm_keyring=dict(type='str', required=False, no_log=False),
+        cephadm_discover=dict(type='bool', required=False, default=False),
+    )
+
+
+# Timings of the commands executed by each module, see record_timing()
+_timings = weakref.WeakKeyDictionary()
+_timings_lock = threading.Lock()
+
+
+def detailed_timings(module):
+    '''
+    Return whether the timings of a module break the 'cephadm' container
+    startup down from the time spent in the 'ceph' CLI
+    '''
+
+    return module.params.get('detailed_timings') is True
+
+
+def _size(data):
+    if data is None:
+        return 0
+    if not isinstance(data, bytes):
+        data = data.encode('utf-8', 'replace')
+    return len(data)
+
+
+def record_timing(module, cmd, rc, out, err, duration, transport, **details):
+    '''
+    Record the wall time, rc and output size of a command run by a module
+
+    duration is in seconds, or None if unknown. details are added to the
+    entry, e.g. the 'cephadm' and 'ceph' breakdown of detailed timings.
+    '''
+
+    entry = dict(
+        cmd=cmd,
+        rc=rc,
+        duration=duration if duration is None else round(duration, 6),
+        stdout_bytes=_size(out),
+        stderr_bytes=_size(err),
+        transport=transport,
+    )
+    for key, value in details.items():
+        if isinstance(value, float):
+            value = round(value, 6)
+        entry[key] = value
+
+    with _timings_lock:
+        _timings.setdefault(module, []).append(entry)
+
+
+def get_timings(module):
+    '''
+    Return the timings recorded for the commands executed by a module
+    '''
+
+    with _timings_lock:
+        return list(_timings.get(module, []))
+
+
+class CephTransport(object):
+    '''
+    Base class of the backends used to execute 'ceph' commands
+    '''
+
+    name = None
+
+    def supports(self, cmd, stdin=None):
+        '''
+        Return whether the given command can be run by this transport
+        '''
+
+        return True
+
+    def run(self, module, cmd, stdin=None):
+        '''
+        Run a command, return its rc, stdout and stderr
+        '''
+
+        raise NotImplementedError()
+
+
+class CliTransport(CephTransport):
+    '''
+    Run commands as processes, i.e. 'ceph' inside a 'cephadm shell' container
+    '''
+
+    name = 'cli'
+
+    def argv(self, cmd):
+        '''
+        Return the command line of the process running a command
+        '''
+
+        return cmd
+
+    def run(self, module, cmd, stdin=None):
+        binary_data = False
+        if stdin:
+            binary_data = True
+
+        return module.run_command(self.argv(cmd), data=stdin,
+                                  binary_data=binary_data)
+
+
+class HostCliTransport(CliTransport):
+    '''
+    Run 'ceph' commands with the 'ceph' CLI installed on the host
+
+    Saves a container start per command. Commands which aren't 'ceph', or
+    which read or write files, whose paths are in the container, are left
+    to 'cephadm shell'.
+    '''
+
+    name = 'host'
+
+    def __init__(self, ceph, conf=CEPH_CONF, keyring=CEPH_ADMIN_KEYRING):
+        self.prefix = [ceph, '--conf', conf, '--keyring', keyring]
+
+    def supports(self, cmd, stdin=None):
+        args = container_cmd(cmd)
+        if args[:1] != ['ceph']:
+            return False
+
+        for index, arg in enumerate(args):
+            if arg.split('=', 1)[0] in CLI_ONLY_OPTIONS:
+                return False
+            if arg in ('-i', '--in-file') and args[index + 1:index + 2] != ['-']:  # noqa: E501
+                return False
+
+        return True
+
+    def argv(self, cmd):
+        return self.prefix + container_cmd(cmd)[1:]
+
+
+def find_host_ceph(module):
+    '''
+    Return the transport running the host 'ceph' CLI, or None if there is
+    no 'ceph' binary, ceph.conf or readable keyring on the host
+    '''
+
+    pins = get_shell_pins(module)
+    conf = pins.get('cephadm_config', CEPH_CONF)
+    keyring = pins.get('cephadm_keyring', CEPH_ADMIN_KEYRING)
+
+    ceph = module.get_bin_path('ceph')
+    if not ceph or not os.path.exists(conf) or \
+            not os.access(keyring, os.R_OK):
+        return None
+
+    return HostCliTransport(ceph, conf, keyring)
+
+
+class CephArgparseValidator(object):
+    '''
+    Turn 'ceph' CLI arguments into a mon command using ceph_argparse
+
+    The command descriptions are fetched from the monitors once, the same
+    way the 'ceph' CLI does it on every invocation.
+    '''
+
+    def __init__(self, cluster):
+        self.cluster = cluster
+        self.sigdict = None
+
+    def __call__(self, args):
+        if self.sigdict is None:
+            ret, outbuf, outs = self.cluster.mon_command(
+                json.dumps({'prefix': 'get_command_descriptions'}), b'',
+                timeout=CEPHADM_TIMEOUT)
+            if ret != 0:
+                return None
+            self.sigdict = ceph_argparse.parse_json_funcsigs(
+                outbuf.decode('utf-8'), 'cli')
+
+        return ceph_argparse.validate_command(self.sigdict, args) or None
+
+
+class MonCommandTransport(CephTransport):
+    '''
+    Send 'ceph' commands to the monitors over a single client connection
+
+    cluster is a connected rados.Rados, or any object providing a compatible
+    mon_command(), e.g. a fake in-process cluster in unit tests. validate
+    turns the 'ceph' CLI arguments (without output format) into a mon
+    command dict, or None if they aren't a valid command.
+    '''
+
+    name = 'rados'
+
+    def __init__(self, cluster, validate=None):
+        self.cluster = cluster
+        self.validate = validate or CephArgparseValidator(cluster)
+
+    def split_args(self, cmd):
+        '''
+        Split the output format from the 'ceph' CLI arguments
+
+        Return None if the arguments use an option mon_command() can't
+        handle, e.g. writing the output to a file.
+        '''
+
+        args = container_cmd(cmd)
+        if args[:1] != ['ceph']:
+            return None
+
+        args = args[1:]
+        output_format = None
+        ceph_args = []
+        while args:
+            arg = args.pop(0)
+            if arg in ('-f', '--format') and args:
+                output_format = args.pop(0)
+            elif arg.startswith('--format='):
+                output_format = arg.split('=', 1)[1]
+            elif arg.split('=', 1)[0] in CLI_ONLY_OPTIONS:
+                return None
+            elif arg in ('-i', '--in-file'):
+                if args[:1] != ['-']:
+                    return None
+                args.pop(0)
+            else:
+                ceph_args.append(arg)
+
+        return ceph_args, output_format
+
+    def supports(self, cmd, stdin=None):
+        return self.split_args(cmd) is not None
+
+    def run(self, module, cmd, stdin=None):
+        ceph_args, output_format = self.split_args(cmd)
+
+        argdict = self.validate(ceph_args)
+        if not argdict:
+            return errno.EINVAL, '', 'Error EINVAL: invalid command: {0}'.format(' '.join(ceph_args))  # noqa: E501
+        if output_format:
+            argdict['format'] = output_format
+
+        inbuf = stdin or b''
+        if not isinstance(inbuf, bytes):
+            inbuf = inbuf.encode('utf-8')
+
+        ret, outbuf, outs = self.cluster.mon_command(json.dumps(argdict),
+                                                     inbuf,
+                                                     timeout=CEPHADM_TIMEOUT)
+        out = outbuf.decode('utf-8', 'replace')
+
+        # Report errors the same way as the 'ceph' CLI
+        if ret < 0:
+            ret = -ret
+            outs = 'Error {0}: {1}'.format(errno.errorcode.get(ret, 'Unknown'),  # noqa: E501
+                                           outs)
+
+        return ret, out, outs
+
+
+def connect_rados(conffile=CEPH_CONF, keyring=CEPH_ADMIN_KEYRING):
+    '''
+    Connect to the cluster with librados, return None if it isn't possible
+    '''
+
+    if not (HAS_RADOS and HAS_CEPH_ARGPARSE):
+        return None
+
+    if not (os.path.exists(conffile) and os.path.exists(keyring)):
+        return None
+
+    try:
+        cluster = rados.Rados(conffile=conffile, conf=dict(keyring=keyring))
+        cluster.connect(timeout=CEPHADM_TIMEOUT)
+    except Exception:
+        return None
+
+    atexit.register(cluster.shutdown)
+
+    return cluster
+
+
+# Transport selected for each module, so that a module run only connects to
+# the cluster once.
+_transports = weakref.WeakKeyDictionary()
+
+
+def set_transport(module, transport):
+    '''
+    Use the given transport for the commands executed by a module
+    '''
+
+    _transports[module] = transport
+
+
+def get_transport(module):
+    '''
+    Get the transport used to execute the commands of a module
+
+    The CLI in a container is used unless another transport is chosen. With
+    'auto', librados is used when the binding and the admin keyring are
+    available on the host, otherwise commands are run through the CLI in a
+    container. The host 'ceph' CLI is only used when chosen explicitly, as
+    its version may not match the cluster's.
+    '''
+
+    transport = _transports.get(module)
+    if transport is not None:
+        return transport
+
+    choice = module.params.get('ceph_transport') or 'cli'
+    transport = CliTransport()
+    if choice in ('auto', 'rados'):
+        cluster = connect_rados()
+        if cluster is not None:
+            transport = MonCommandTransport(cluster)
+        elif choice == 'rados':
+            fatal("Couldn't connect to the cluster with librados, check "
+                  "that python3-rados is installed and that {0} and {1} "
+                  "exist".format(CEPH_CONF, CEPH_ADMIN_KEYRING), module)
+    if choice == 'host':
+        transport = find_host_ceph(module)
+        if transport is None:
+            fatal("Couldn't find the ceph CLI on the host, check that it "
+                  "is installed and that the config and keyring exist",
+                  module)
+
+    set_transport(module, transport)
+
+    return transport
+
+
 def exec_command(module, cmd, stdin=None):
     '''
     Execute command(s)
     '''
 
-    binary_data = False
-    if stdin:
-        binary_data = True
-    rc, out, err = module.run_command(cmd, data=stdin, binary_data=binary_data)
+    cmd = pin_shell_cmd(module, cmd)
+    transport = get_transport(module)
+    if not transport.supports(cmd, stdin):
+        transport = CliTransport()
+
+    # Time the 'ceph' CLI inside the container to tell it apart from the
+    # container startup.
+    if transport.name == 'cli' and not stdin and detailed_timings(module) \
+            and cmd[:1] == ['cephadm'] and '--' in cmd:
+        results, timings, container = _run_batch(module, [[cmd]])
+        rc, _cmd, out, err = results.get(0, (container[0], cmd) + container[2:4])  # noqa: E501
+        duration = container[4]
+        details = {}
+        if 0 in timings:
+            details = dict(cephadm=duration - timings[0], ceph=timings[0])
+        record_timing(module, cmd, rc, out, err, duration, transport.name,
+                      **details)
+        return rc, cmd, out, err
+
+    start = time.time()
+    rc, out, err = transport.run(module, cmd, stdin)
+    record_timing(module, cmd, rc, out, err, time.time() - start,
+                  transport.name)
 
     return rc, cmd, out, err
 
 
-def exit_module(module, out, rc, cmd, err, startd, changed=False):
+# Size of the chunks JSON output is read and parsed in
+JSON_CHUNK_SIZE = 1 << 20
+_json_decoder = json.JSONDecoder()
+_JSON_NUMBER_CHARS = '0123456789.eE+-'
+_JSON_WS = re.compile(r'[ \t\n\r]*')
+# Anything up to the next bracket, strings included
+_JSON_RUN = re.compile(r'(?:[^"\[\]{}]+|"(?:[^"\\]|\\.)*")*')
+_JSON_SCALAR = re.compile(r'"(?:[^"\\]|\\.)*"|[-+.0-9a-zA-Z]+')
+
+
+class _JsonStream(object):
+    '''
+    JSON text read from chunks, of which only the unparsed part is kept
+    '''
+
+    def __init__(self, chunks):
+        self.chunks = iter(chunks)
+        self.decoder = codecs.getincrementaldecoder('utf-8')('replace')
+        self.buf = ''
+        self.pos = 0
+        self.eof = False
+
+    def fill(self, size=0):
+        '''
+        Read chunks until size characters are buffered, at least one
+        '''
+
+        data = [self.buf[self.pos:]]
+        length = len(data[0])
+        while not self.eof and (len(data) == 1 or length < size):
+            chunk = next(self.chunks, None)
+            if chunk is None:
+                self.eof = True
+                chunk = self.decoder.decode(b'', final=True)
+            elif isinstance(chunk, bytes):
+                chunk = self.decoder.decode(chunk)
+            data.append(chunk)
+            length += len(chunk)
+        if len(data) == 1:
+            raise ValueError('Truncated JSON')
+        self.buf = ''.join(data)
+        self.pos = 0
+
+    def peek(self):
+        '''
+        Skip whitespace and return the next character
+        '''
+
+        while True:
+            self.pos = _JSON_WS.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            self.fill()
+
+    def at_end(self):
+        '''
+        Return whether only whitespace is left
+        '''
+
+        try:
+            self.peek()
+        except ValueError:
+            return True
+        return False
+
+    def expect(self, chars):
+        char = self.peek()
+        if char not in chars:
+            raise ValueError('Expected {0!r} in JSON, got {1!r}'.format(chars, char))  # noqa: E501
+        self.pos += 1
+        return char
+
+    def decode(self):
+        '''
+        Decode the next value as a whole
+        '''
+
+        self.peek()
+        while True:
+            try:
+                value, end = _json_decoder.raw_decode(self.buf, self.pos)
+            except ValueError:
+                end = None
+            # A number may go on in the next chunk
+            if end is not None and (self.eof or (end < len(self.buf) and
+                                                 self.buf[end] not in _JSON_NUMBER_CHARS)):  # noqa: E501
+                self.pos = end
+                return value
+            self.fill(2 * (len(self.buf) - self.pos))
+
+    def skip(self):
+        '''
+        Skip the next value without decoding it
+        '''
+
+        if self.peek() not in '[{':
+            while True:
+                match = _JSON_SCALAR.match(self.buf, self.pos)
+                if match and (match.end() < len(self.buf) or self.eof):
+                    self.pos = match.end()
+                    return
+                self.fill()
+
+        depth = 0
+        while True:
+            self.pos = _JSON_RUN.match(self.buf, self.pos).end()
+            # The run stops at the end of the buffer or of a split string
+            if self.pos == len(self.buf) or self.buf[self.pos] == '"':
+                self.fill()
+                continue
+            depth += 1 if self.buf[self.pos] in '[{' else -1
+            self.pos += 1
+            if depth == 0:
+                return
+
+    def select(self, tree):
+        '''
+        Decode the parts of the next value selected by tree
+        '''
+
+        if tree is None or self.peek() not in '[{':
+            return self.decode()
+
+        if self.expect('[{') == '{':
+            result = {}
+            if self.peek() == '}':
+                self.pos += 1
+                return result
+            while True:
+                key = self.decode()
+                self.expect(':')
+                subtree = tree.get(key, tree.get('*', False))
+                if subtree is False:
+                    self.skip()
+                else:
+                    result[key] = self.select(subtree)
+                if self.expect(',}') == '}':
+                    return result
+
+        result = []
+        subtree = tree.get('*', False)
+        if self.peek() == ']':
+            self.pos += 1
+            return result
+        while True:
+            if subtree is False:
+                self.skip()
+            else:
+                result.append(self.select(subtree))
+            if self.expect(',]') == ']':
+                return result
+
+
+def json_selection(paths):
+    '''
+    Turn dotted paths, e.g. 'pools.*.pool_name', into a selection tree
+
+    '*' stands for any key or list item. A path ends with None in the tree,
+    selecting the whole value.
+    '''
+
+    tree = {}
+    for path in paths:
+        node = tree
+        keys = path.split('.')
+        for key in keys[:-1]:
+            if node.get(key, {}) is None:
+                break
+            node = node.setdefault(key, {})
+        else:
+            node[keys[-1]] = None
+
+    return tree
+
+
+def select_json(chunks, paths=None):
+    '''
+    Parse JSON text read from chunks, keeping only the selected paths
+
+    The text is parsed as it is read: only the current chunk and the
+    selected values are held in memory, the rest is skipped without
+    being decoded. Lists and objects on the way to a selected value keep
+    their shape, with only the selected items. Without paths, the whole
+    value is decoded.
+    '''
+
+    stream = _JsonStream(chunks)
+    value = stream.select(None if paths is None else json_selection(paths))
+    if stream.at_end():
+        return value
+    raise ValueError('Extra data after JSON value')
+
+
+def parse_json(out, paths=None):
+    '''
+    Parse JSON output, only keeping the selected paths, see select_json()
+    '''
+
+    if paths is None:
+        return json.loads(out)
+
+    return select_json((out[i:i + JSON_CHUNK_SIZE]
+                        for i in range(0, len(out), JSON_CHUNK_SIZE)), paths)
+
+
+def exec_command_json(module, cmd, paths=None):
+    '''
+    Execute a command with JSON output, parsing it as it is read
+
+    When the command runs as a process, its output is parsed from the pipe
+    as it comes with select_json() instead of being read whole first, so
+    that large dumps don't have to fit in memory at once.
+
+    Return the rc, cmd, decoded output and stderr, the output is None if
+    the command failed or its output isn't valid JSON.
+    '''
+
+    cmd = pin_shell_cmd(module, cmd)
+    transport = get_transport(module)
+    if not transport.supports(cmd):
+        transport = CliTransport()
+
+    if not isinstance(transport, CliTransport):
+        rc, cmd, out, err = exec_command(module, cmd)
+        data = None
+        if rc == 0:
+            try:
+                data = parse_json(out, paths)
+            except ValueError:
+                pass
+        return rc, cmd, data, err
+
+    start = time.time()
+    size = [0]
+
+    def chunks():
+        for chunk in iter(lambda: proc.stdout.read(JSON_CHUNK_SIZE), b''):
+            size[0] += len(chunk)
+            yield chunk
+
+    with tempfile.TemporaryFile() as err_file:
+        proc = subprocess.Popen(transport.argv(cmd), stdin=subprocess.DEVNULL,  # noqa: E501
+                                stdout=subprocess.PIPE, stderr=err_file)
+        try:
+            data = select_json(chunks(), paths)
+        except ValueError:
+            data = None
+        # Let the command finish if its output couldn't be parsed
+        for chunk in chunks():
+            pass
+        proc.stdout.close()
+        rc = proc.wait()
+        err_file.seek(0)
+        err = err_file.read().decode('utf-8', 'replace')
+
+    if rc != 0:
+        data = None
+    record_timing(module, cmd, rc, '', err, time.time() - start,
+                  transport.name, stdout_bytes=size[0])
+
+    return rc, cmd, data, err
+
+
+class CephShell(object):
+    '''
+    Run commands one at a time in a single long running 'cephadm shell'
+
+    The commands are sent to a 'bash' started in the container, through the
+    same _cephadm_run function as batches, so that running many commands
+    over time, e.g. polling the cluster, only starts one container. The
+    shell is started on the first command, and started again if it exits.
+    shell_cmd overrides the command starting the shell, e.g. in unit tests.
+    '''
+
+    def __init__(self, module, timeout=CEPHADM_TIMEOUT, shell_cmd=None):
+        self.module = module
+        self.shell_cmd = shell_cmd or pin_shell_cmd(module, generate_cephadm_shell_cmd(timeout) + ['bash'])  # noqa: E501
+        self.proc = None
+        self.index = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def start(self):
+        self.proc = subprocess.Popen(self.shell_cmd, stdin=subprocess.PIPE,
+                                     stdout=subprocess.PIPE,
+                                     stderr=subprocess.STDOUT,
+                                     universal_newlines=True)
+        self.proc.stdin.write(BATCH_RUNNER)
+
+    def run(self, cmd):
+        '''
+        Run a command in the shell, return its rc, cmd, stdout and stderr
+        '''
+
+        if self.proc is None:
+            self.start()
+
+        index = self.index
+        self.index += 1
+        start = time.time()
+        try:
+            self.proc.stdin.write('_cephadm_run {0} {1}\n'.format(
+                index, ' '.join(quote(a) for a in container_cmd(cmd))))
+            self.proc.stdin.flush()
+        except (IOError, OSError):
+            # The shell exited, its output tells why
+            pass
+
+        # Anything else than the result of the command comes from cephadm
+        # or the container runtime, and is only reported if the shell exits.
+        output = []
+        for line in iter(self.proc.stdout.readline, ''):
+            fields = next(_batch_lines(line), None)
+            if fields is None or fields[1] != str(index):
+                output.append(line)
+                continue
+            rc = int(fields[2])
+            out = base64.b64decode(fields[3]).decode('utf-8', 'replace')
+            err = base64.b64decode(fields[4]).decode('utf-8', 'replace')
+            break
+        else:
+            rc = self.proc.wait() or 1
+            out, err = '', ''.join(output)
+            self.proc = None
+
+        record_timing(self.module, cmd, rc, out, err, time.time() - start,
+                      'cli', shell=True)
+
+        return rc, cmd, out, err
+
+    def close(self):
+        '''
+        Stop the shell
+        '''
+
+        if self.proc is None:
+            return
+
+        try:
+            self.proc.stdin.close()
+        except (IOError, OSError):
+            pass
+        try:
+            self.proc.wait(timeout=CEPHADM_TIMEOUT)
+        except subprocess.TimeoutExpired:
+            self.proc.kill()
+            self.proc.wait()
+        self.proc = None
+
+
+def _poll(run, cmd, evaluate, paths=None):
+    '''
+    Run a command once and evaluate its JSON output
+    '''
+
+    # Outputs of processes of their own are parsed as they are read
+    if isinstance(run, _CommandRunner):
+        rc, cmd, data, err = run.json(cmd, paths)
+        if rc != 0:
+            return False, None, err.strip() or 'rc={0}'.format(rc)
+        if data is None:
+            return False, None, 'Invalid JSON output'
+        return evaluate(data)
+
+    rc, cmd, out, err = run(cmd)
+    if rc != 0:
+        return False, None, err.strip() or 'rc={0}'.format(rc)
+
+    try:
+        data = parse_json(out, paths)
+    except ValueError:
+        return False, None, out.strip()
+
+    return evaluate(data)
+
+
+class _CommandRunner(object):
+    '''
+    Runner of commands with exec_command(), see command_runner()
+    '''
+
+    def __init__(self, module):
+        self.module = module
+
+    def __call__(self, cmd):
+        return exec_command(self.module, cmd)
+
+    def json(self, cmd, paths=None):
+        return exec_command_json(self.module, cmd, paths)
+
+
+def command_runner(module, timeout):
+    '''
+    Return a function running commands one at a time, and one releasing it
+
+    With the CLI transport, the commands run in the same CephShell, which
+    is kept for up to timeout seconds. Otherwise, the function has a json()
+    method running a command with exec_command_json().
+    '''
+
+    if get_transport(module).name == 'cli':
+        shell = CephShell(module, timeout=timeout)
+        return shell.run, shell.close
+
+    return _CommandRunner(module), lambda: None
+
+
+def wait_for(module, cmd, evaluate, timeout, delay=1, max_delay=30,
+             run=None, paths=None):
+    '''
+    Poll a 'ceph' command until its JSON output satisfies a condition
+
+    evaluate() gets the decoded output and returns whether the condition
+    holds, a measure of the progress towards it and a description of the
+    state. The delay between polls doubles, up to max_delay, while the
+    progress doesn't change and is reset to delay whenever it does. The
+    polls use run, from command_runner(), or a runner of their own. Only
+    the given paths of the output are decoded, see select_json().
+
+    Return whether the condition held before the timeout, the number of
+    polls, the time spent and the last description of the state.
+    '''
+
+    delay = initial_delay = min(delay, max_delay)
+    start = time.time()
+    deadline = start + timeout
+    attempts = 0
+    progress = None
+
+    close = None
+    if run is None:
+        run, close = command_runner(module, timeout + CEPHADM_TIMEOUT)
+
+    try:
+        while True:
+            attempts += 1
+            met, new_progress, status = _poll(run, cmd, evaluate, paths)
+            remaining = deadline - time.time()
+            if met or remaining <= 0:
+                return met, attempts, time.time() - start, status
+
+            # Poll often while the cluster converges, back off while it
+            # doesn't.
+            if attempts > 1 and new_progress != progress:
+                delay = initial_delay
+            elif attempts > 1:
+                delay = min(delay * 2, max_delay)
+            progress = new_progress
+
+            time.sleep(min(delay, remaining))
+    finally:
+        if close is not None:
+            close()
+
+
+def get_local_fsid(conf=CEPH_CONF):
+    '''
+    Get the fsid of the cluster from the local ceph.conf
+    '''
+
+    try:
+        with open(conf) as f:
+            for line in f:
+                key, sep, value = line.partition('=')
+                if sep and key.strip() == 'fsid':
+                    return value.strip()
+    except (IOError, OSError):
+        pass
+
+    return None
+
+
+def get_osdmap_epoch(module):
+    '''
+    Get the current OSD map epoch
+    '''
+
+    cmd = generate_ceph_cmd(sub_cmd=['osd', 'stat'],
+                            args=['-f', 'json'])
+
+    rc, cmd, out, err = exec_command(module, cmd)
+
+    if rc == 0:
+        out = json.loads(out)['epoch']
+
+    return rc, cmd, out, err
+
+
+# Parts of 'osd dump' kept in a snapshot, the OSDs, PG upmaps and blocklist
+# aren't
+SNAPSHOT_OSD_DUMP_PATHS = ['fsid', 'epoch', 'pools', 'erasure_code_profiles']
+
+
+def build_snapshot(osd_dump, crush_rules):
+    '''
+    Build a name indexed snapshot from 'osd dump' and 'osd crush rule dump'
+    '''
+
+    return dict(
+        fsid=osd_dump['fsid'],
+        epoch=osd_dump['epoch'],
+        pools=dict((p['pool_name'], p) for p in osd_dump['pools']),
+        erasure_code_profiles=osd_dump['erasure_code_profiles'],
+        crush_rules=dict((r['rule_name'], r) for r in crush_rules),
+    )
+
+
+def read_snapshot(path):
+    '''
+    Read a cached snapshot, return None if there is no usable one
+    '''
+
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (IOError, OSError, ValueError):
+        return None
+
+
+def write_snapshot(path, snapshot):
+    '''
+    Atomically write a snapshot to the cache, ignoring failures
+    '''
+
+    tmp_path = '{0}.{1}'.format(path, os.getpid())
+    try:
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'w') as f:
+            json.dump(snapshot, f)
+        os.rename(tmp_path, path)
+    except (IOError, OSError):
+        try:
+            os.unlink(tmp_path)
+        except (IOError, OSError):
+            pass
+
+
+def get_cluster_snapshot(module, cache_dir=SNAPSHOT_DIR):
+    '''
+    Get a snapshot of the pools, EC profiles and CRUSH rules of the cluster
+
+    The snapshot is cached on the host, keyed by cluster fsid and OSD map
+    epoch. Every change to pools, EC profiles or CRUSH rules bumps the OSD
+    map epoch, so a cached snapshot is reused until the epoch changes and
+    only costs a cheap 'osd stat' instead of a full dump.
+    Return None if the snapshot couldn't be gathered.
+    '''
+
+    rc, cmd, epoch, err = get_osdmap_epoch(module)
+    if rc != 0:
+        return None
+
+    path = None
+    fsid = get_local_fsid()
+    if fsid and os.path.isdir(os.path.join(cache_dir, fsid)):
+        path = os.path.join(cache_dir, fsid, SNAPSHOT_FILE)
+        snapshot = read_snapshot(path)
+        if (snapshot and snapshot.get('fsid') == fsid and
+                snapshot.get('epoch') == epoch):
+            return snapshot
+
+    results = exec_commands_batch(module,
+                                  [generate_ceph_cmd(sub_cmd=['osd', 'dump'],
+                                                     args=['-f', 'json']),
+                                   generate_ceph_cmd(sub_cmd=['osd', 'crush', 'rule'],  # noqa: E501
+                                                     args=['dump', '-f', 'json'])])  # noqa: E501
+    if len(results) != 2 or results[0][0] != 0 or results[1][0] != 0:
+        return None
+
+    try:
+        osd_dump = parse_json(results[0][2], SNAPSHOT_OSD_DUMP_PATHS)
+    except ValueError:
+        return None
+    snapshot = build_snapshot(osd_dump, json.loads(results[1][2]))
+
+    if path and snapshot['fsid'] == fsid:
+        write_snapshot(path, snapshot)
+
+    return snapshot
+
+
+def fingerprint_argument_spec():
+    '''
+    Return the options of the modules supporting desired state fingerprints
+    '''
+
+    return dict(
+        fingerprint=dict(type='bool', required=False, default=False),
+        force_verify=dict(type='bool', required=False, default=False),
+    )
+
+
+def desired_state_fingerprint(params, options):
+    '''
+    Hash the desired state of an object, i.e. the given options of params
+    '''
+
+    state = dict((option, params.get(option)) for option in options)
+    data = json.dumps([FINGERPRINT_VERSION, state], sort_keys=True)
+
+    return hashlib.sha256(data.encode('utf-8')).hexdigest()
+
+
+def fingerprint_key(kind, name):
+    '''
+    Return the config-key storing the fingerprint of an object
+    '''
+
+    return '{0}/{1}/{2}'.format(FINGERPRINT_PREFIX, kind, name)
+
+
+def check_fingerprint(module, kind, name, options):
+    '''
+    Compare the desired state of an object with the one last applied
+
+    The fingerprint of the desired state is stored in the config-key store
+    along with the OSD map epoch once the object is reconciled. Pools, EC
+    profiles and CRUSH rules live in the OSD map, so while both match,
+    nothing changed since and the object doesn't need to be verified.
+    The epoch and the stored fingerprint are read in a single batch.
+
+    Return the fingerprint to store once the object is reconciled (None
+    when fingerprints are disabled), the current epoch if known, and
+    whether the object is unchanged since it was last applied.
+    '''
+
+    if not module.params.get('fingerprint'):
+        return None, None, False
+
+    fingerprint = desired_state_fingerprint(module.params, options)
+    if module.params.get('force_verify'):
+        return fingerprint, None, False
+
+    epoch_results, key_results = exec_command_groups(
+        module,
+        [[generate_ceph_cmd(sub_cmd=['osd', 'stat'], args=['-f', 'json'])],
+         [generate_ceph_cmd(sub_cmd=['config-key'],
+                            args=['get', fingerprint_key(kind, name)])]],
+        parallel=True)
+
+    epoch = None
+    if epoch_results and epoch_results[0][0] == 0:
+        epoch = json.loads(epoch_results[0][2])['epoch']
+
+    stored = None
+    if key_results and key_results[0][0] == 0:
+        try:
+            stored = json.loads(key_results[0][2])
+        except ValueError:
+            pass
+
+    unchanged = (epoch is not None and
+                 stored == dict(fingerprint=fingerprint, epoch=epoch))
+
+    return fingerprint, epoch, unchanged
+
+
+def store_fingerprint(module, kind, name, fingerprint, epoch=None):
+    '''
+    Store the fingerprint of the desired state of a reconciled object
+
+    epoch is the OSD map epoch the object is in its desired state at, the
+    current epoch is read when None, e.g. once changes have been applied.
+    Failures are ignored, the object is then verified again next time.
+    '''
+
+    if fingerprint is None or module.check_mode:
+        return
+
+    if epoch is None:
+        rc, cmd, epoch, err = get_osdmap_epoch(module)
+        if rc != 0:
+            return
+
+    exec_command(module,
+                 generate_ceph_cmd(sub_cmd=['config-key'],
+                                   args=['set', fingerprint_key(kind, name),
+                                         json.dumps(dict(fingerprint=fingerprint,  # noqa: E501
+                                                         epoch=epoch),
+                                                    sort_keys=True)]))
+
+
+def exit_module(module, out, rc, cmd, err, startd, changed=False, **kwargs):
     endd = datetime.datetime.now()
     delta = endd - startd
 
@@ -64,7 +1556,42 @@ def exit_module(module, out, rc, cmd, err, startd, changed=False):
         stdout=out.rstrip("\r\n"),
         stderr=err.rstrip("\r\n"),
         changed=changed,
+        timings=get_timings(module),
     )
+    result.update(kwargs)
+    module.exit_json(**result)
+
+
+def exit_check_mode(module, cmd_list, out, before, after, startd):
+    '''
+    Report what a module would change, in check mode
+
+    cmd_list are the commands which would run, computed from the running
+    state, and before and after the settings of the object they would
+    change. cmd_list is None if the object can't be reconciled, out then
+    tells why.
+    '''
+
+    endd = datetime.datetime.now()
+    delta = endd - startd
+
+    result = dict(
+        cmds=cmd_list or [],
+        start=str(startd),
+        end=str(endd),
+        delta=str(delta),
+        rc=0,
+        stdout=out,
+        stderr='',
+        changed=bool(cmd_list),
+        diff=dict(before=before, after=after),
+        timings=get_timings(module),
+    )
+
+    if cmd_list is None:
+        result['rc'] = 1
+        module.fail_json(msg=out, **result)
+
     module.exit_json(**result)
 
 
@@ -74,6 +1601,6 @@ def fatal(message, module):
     '''
 
     if module:
-        module.fail_json(msg=message, rc=1)
+        module.fail_json(msg=message, rc=1, timings=get_timings(module))
     else:
         raise Exception(message)
@@ -0,0 +1,147 @@
+# Copyright 2020, Red Hat, Inc.
+# Copyright 2021, StackHPC, Ltd.
+# NOTE: Files adapted from github.com/ceph/ceph-ansible
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+from ansible_collections.stackhpc.cephadm.plugins.module_utils.cephadm_common \
+    import generate_ceph_cmd
+
+# CRUSH rule types, as reported by 'osd crush rule dump'
+RULE_TYPES = {1: 'replicated', 3: 'erasure'}
+
+
+def crush_rule_argument_spec():
+    '''
+    Return the options describing a CRUSH rule
+    '''
+
+    return dict(
+        name=dict(type='str', required=True),
+        state=dict(type='str', required=False, choices=['present', 'absent'], default='present'),  # noqa: E501
+        rule_type=dict(type='str', required=False, choices=['replicated', 'erasure']),  # noqa: E501
+        bucket_root=dict(type='str', required=False),
+        bucket_type=dict(type='str', required=False, choices=['osd', 'host', 'chassis', 'rack', 'row', 'pdu', 'pod',  # noqa: E501
+                                                              'room', 'datacenter', 'zone', 'region', 'root']),  # noqa: E501
+        device_class=dict(type='str', required=False),
+        profile=dict(type='str', required=False),
+    )
+
+
+def create_rule(params):
+    '''
+    Create a new crush replicated/erasure rule
+    '''
+
+    name = params.get('name')
+    rule_type = params.get('rule_type')
+    bucket_root = params.get('bucket_root')
+    bucket_type = params.get('bucket_type')
+    device_class = params.get('device_class')
+    profile = params.get('profile')
+
+    if rule_type == 'replicated':
+        args = ['create-replicated', name, bucket_root, bucket_type]
+        if device_class:
+            args.append(device_class)
+    else:
+        args = ['create-erasure', name]
+        if profile:
+            args.append(profile)
+
+    cmd = generate_ceph_cmd(['osd', 'crush', 'rule'],
+                            args)
+
+    return cmd
+
+
+def get_rule(name):
+    '''
+    Get existing crush rule
+    '''
+
+    args = ['dump', name, '--format=json']
+
+    cmd = generate_ceph_cmd(['osd', 'crush', 'rule'],
+                            args)
+
+    return cmd
+
+
+def remove_rule(name):
+    '''
+    Remove a crush rule
+    '''
+
+    args = ['rm', name]
+
+    cmd = generate_ceph_cmd(['osd', 'crush', 'rule'],
+                            args)
+
+    return cmd
+
+
+def plan_crush_rule(rule, running_rules):
+    '''
+    Compute the commands reconciling a rule with its running state
+
+    Return the list of commands to run and a description of the changes,
+    or None and the reason why the rule can't be reconciled.
+    '''
+
+    name = rule['name']
+    rule_type = rule.get('rule_type')
+    running_rule = running_rules.get(name)
+
+    if rule.get('state') == 'absent':
+        if running_rule is None:
+            return [], "Crush Rule {0} doesn't exist".format(name)
+        return [remove_rule(name)], 'Crush Rule {0} removed.'.format(name)
+
+    if running_rule is None:
+        if not rule_type:
+            return None, "rule_type must be provided when state is 'present'"
+        return [create_rule(rule)], 'Crush Rule {0} created.'.format(name)
+
+    if rule_type and RULE_TYPES.get(running_rule['type'], rule_type) != rule_type:  # noqa: E501
+        return None, 'Can not convert crush rule {0} to {1}'.format(name, rule_type)  # noqa: E501
+
+    return [], 'Crush Rule {0} already exists.'.format(name)
+
+
+def rule_diff(rule, running_rule):
+    '''
+    Return the settings of a rule before and after reconciling it
+
+    Existing rules are never updated. An empty dict stands for a rule which
+    doesn't exist.
+    '''
+
+    before = {}
+    if running_rule is not None:
+        before = dict(rule_type=RULE_TYPES.get(running_rule['type'],
+                                               running_rule['type']))
+
+    if rule.get('state') == 'absent':
+        return before, {}
+
+    if running_rule is not None:
+        return before, before
+
+    return before, dict((key, rule.get(key))
+                        for key in ('rule_type', 'bucket_root', 'bucket_type',
+                                    'device_class', 'profile')
+                        if rule.get(key))
@@ -0,0 +1,272 @@
+# Copyright 2020, Red Hat, Inc.
+# Copyright 2021, StackHPC, Ltd.
+# NOTE: Files adapted from github.com/ceph/ceph-ansible
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+from ansible_collections.stackhpc.cephadm.plugins.module_utils.cephadm_common \
+    import exec_command_groups, generate_ceph_cmd, get_cluster_snapshot
+
+import json
+
+
+def ec_profile_argument_spec():
+    '''
+    Return the options describing an erasure code profile
+    '''
+
+    return dict(
+        name=dict(type='str', required=True),
+        state=dict(type='str', required=False,
+                   choices=['present', 'absent'], default='present'),
+        stripe_unit=dict(type='str', required=False),
+        k=dict(type='str', required=False),
+        m=dict(type='str', required=False),
+        crush_root=dict(type='str', required=False),
+        crush_device_class=dict(type='str', required=False),
+        crush_failure_domain=dict(type='str', required=False),
+        directory=dict(type='str', required=False),
+        plugin=dict(type='str', required=False),
+    )
+
+
+def get_profile(name):
+    '''
+    Get existing profile
+    '''
+
+    args = ['get', name, '--format=json']
+
+    cmd = generate_ceph_cmd(sub_cmd=['osd', 'erasure-code-profile'],
+                            args=args)
+
+    return cmd
+
+
+def create_profile(name, k, m, stripe_unit, crush_device_class, crush_failure_domain, directory, plugin, force=False, crush_root=None):  # noqa: E501
+    '''
+    Create a profile
+    '''
+
+    args = ['set', name, 'k={0}'.format(k), 'm={0}'.format(m)]
+    if stripe_unit:
+        args.append('stripe_unit={0}'.format(stripe_unit))
+    if crush_root:
+        args.append('crush-root={0}'.format(crush_root))
+    if crush_device_class:
+        args.append('crush-device-class={0}'.format(crush_device_class))
+    if crush_failure_domain:
+        args.append('crush-failure-domain={0}'.format(crush_failure_domain))
+    if directory:
+        args.append('directory={0}'.format(directory))
+    if plugin:
+        args.append('plugin={0}'.format(plugin))
+    if force:
+        args.append('--force')
+
+    cmd = generate_ceph_cmd(sub_cmd=['osd', 'erasure-code-profile'],
+                            args=args)
+
+    return cmd
+
+
+def delete_profile(name):
+    '''
+    Delete a profile
+    '''
+
+    args = ['rm', name]
+
+    cmd = generate_ceph_cmd(sub_cmd=['osd', 'erasure-code-profile'],
+                            args=args)
+
+    return cmd
+
+
+def create_profile_from_params(params, force=False):
+    '''
+    Create a profile described by the ec_profile_argument_spec() options
+    '''
+
+    return create_profile(params['name'],
+                          params['k'],
+                          params['m'],
+                          params.get('stripe_unit'),
+                          params.get('crush_device_class'),
+                          params.get('crush_failure_domain'),
+                          params.get('directory'),
+                          params.get('plugin'),
+                          force=force,
+                          crush_root=params.get('crush_root'))
+
+
+# Optional settings of a profile, as (profile key, option)
+PROFILE_KEYS = (
+    ('stripe_unit', 'stripe_unit'),
+    ('crush-root', 'crush_root'),
+    ('crush-device-class', 'crush_device_class'),
+    ('crush-failure-domain', 'crush_failure_domain'),
+    ('directory', 'directory'),
+    ('plugin', 'plugin'),
+)
+
+
+IEC_UNITS = {'K': 1 << 10, 'M': 1 << 20, 'G': 1 << 30}
+
+
+def normalize_value(key, value):
+    '''
+    Return the canonical string form of a profile setting
+
+    Numbers are stored as strings by the monitors, and sizes such as
+    'stripe_unit=4K' are compared in bytes.
+    '''
+
+    value = str(value).strip()
+
+    if key == 'stripe_unit':
+        size = value.upper().rstrip('IB')
+        if size[-1:] in IEC_UNITS and size[:-1].isdigit():
+            return str(int(size[:-1]) * IEC_UNITS[size[-1]])
+    if value.isdigit():
+        return str(int(value))
+    if value.lower() in ('true', 'false'):
+        return value.lower()
+
+    return value
+
+
+def normalize_profile(profile):
+    '''
+    Return a profile with its settings in canonical form
+
+    Settings which aren't set are left out.
+    '''
+
+    return dict((key, normalize_value(key, value))
+                for key, value in profile.items() if value is not None)
+
+
+def desired_profile(params):
+    '''
+    Return the profile described by the ec_profile_argument_spec() options
+    '''
+
+    profile = dict(k=params.get('k'), m=params.get('m'))
+    for key, option in PROFILE_KEYS:
+        profile[key] = params.get(option)
+
+    return normalize_profile(profile)
+
+
+def profile_needs_update(current_profile, params):
+    '''
+    Compare a running profile with the ec_profile_argument_spec() options
+
+    Both sides are normalised first. Only the settings given in the options
+    are compared: those left out get their defaults from the cluster, e.g.
+    osd_pool_default_erasure_code_profile, or from the plugin, which can't
+    be known here.
+    '''
+
+    current_profile = normalize_profile(current_profile)
+
+    return any(current_profile.get(key) != value
+               for key, value in desired_profile(params).items())
+
+
+def get_running_profiles(module, names):
+    '''
+    Get the running profiles of a list of names
+
+    All the profiles are read in a single batch, or from the cluster
+    snapshot if enabled. Return the (rc, cmd, out, err) of the first
+    failed read, a missing profile isn't a failure, and a dict of the
+    existing profiles indexed by name.
+    '''
+
+    if module.params.get('cluster_snapshot'):
+        snapshot = get_cluster_snapshot(module)
+        if snapshot is not None:
+            profiles = snapshot['erasure_code_profiles']
+            return (0, None, '', ''), dict((name, profiles[name])
+                                           for name in names
+                                           if name in profiles)
+
+    names = sorted(set(names))
+    running_profiles = {}
+    if not names:
+        return (0, None, '', ''), running_profiles
+    group_results = exec_command_groups(module,
+                                        [[get_profile(name)] for name in names],  # noqa: E501
+                                        parallel=True)
+    for name, results in zip(names, group_results):
+        if not results:
+            return (1, get_profile(name), '', 'Not run'), {}
+        rc, cmd, out, err = results[0]
+        if rc == 0:
+            running_profiles[name] = json.loads(out)
+        elif 'ENOENT' not in err:
+            return results[0], {}
+
+    return (0, None, '', ''), running_profiles
+
+
+def plan_ec_profile(profile, running_profiles):
+    '''
+    Compute the commands reconciling a profile with its running state
+
+    Return the list of commands to run and a description of the changes,
+    or None and the reason why the profile can't be reconciled.
+    '''
+
+    name = profile['name']
+    running_profile = running_profiles.get(name)
+
+    if profile.get('state') == 'absent':
+        if running_profile is None:
+            return [], "Skipping, the profile {0} doesn't exist".format(name)
+        return [delete_profile(name)], 'Profile {0} removed.'.format(name)
+
+    if not (profile.get('k') and profile.get('m')):
+        return None, "k and m must be provided when state is 'present'"
+
+    if running_profile is None:
+        return [create_profile_from_params(profile)], 'Profile {0} created.'.format(name)  # noqa: E501
+
+    if profile_needs_update(running_profile, profile):
+        return [create_profile_from_params(profile, force=True)], 'Profile {0} updated.'.format(name)  # noqa: E501
+
+    return [], 'Profile {0} already exists and there is nothing to update.'.format(name)  # noqa: E501
+
+
+def profile_diff(profile, running_profile):
+    '''
+    Return the settings of a profile before and after reconciling it
+
+    An empty dict stands for a profile which doesn't exist.
+    '''
+
+    before = dict(running_profile or {})
+
+    if profile.get('state') == 'absent':
+        return before, {}
+
+    if running_profile is not None and \
+            not profile_needs_update(running_profile, profile):
+        return before, before
+
+    return before, desired_profile(profile)
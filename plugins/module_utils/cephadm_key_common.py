@@ -0,0 +1,320 @@
+# Copyright 2018, Red Hat, Inc.
+# Copyright 2021, StackHPC, Ltd.
+# NOTE: Files adapted from github.com/ceph/ceph-ansible
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+from ansible_collections.stackhpc.cephadm.plugins.module_utils.cephadm_common \
+    import generate_ceph_cmd
+
+import base64
+import os
+import re
+import struct
+import time
+
+
+def generate_caps(caps):
+    '''
+    Generate CephX capabilities list
+    '''
+
+    caps_cli = []
+
+    for k, v in caps.items():
+        caps_cli.extend([k, v])
+
+    return caps_cli
+
+
+def create_key(name, caps):  # noqa: E501
+    '''
+    Create a CephX key
+    '''
+    cmd = []
+
+    args = [
+        'get-or-create',
+        name
+    ]
+
+    args.extend(generate_caps(caps))
+    cmd.append(generate_ceph_cmd(sub_cmd=['auth'],
+                                 args=args))
+
+    return cmd
+
+
+def update_key(name, caps):
+    '''
+    Update the caps of a CephX key
+    '''
+
+    cmd = []
+
+    args = [
+        'caps',
+        name,
+    ]
+    args.extend(generate_caps(caps))
+    cmd.append(generate_ceph_cmd(sub_cmd=['auth'],
+                                 args=args))
+
+    return cmd
+
+
+def delete_key(name):
+    '''
+    Delete a CephX key
+    '''
+
+    cmd = []
+
+    args = [
+        'del',
+        name,
+    ]
+
+    cmd.append(generate_ceph_cmd(sub_cmd=['auth'],
+                                 args=args))
+
+    return cmd
+
+
+def get_key(name, dest):
+    '''
+    Get a CephX key (write on the filesystem)
+    '''
+
+    cmd = []
+
+    args = [
+        'get',
+        name,
+        '-o',
+        dest,
+    ]
+
+    cmd.append(generate_ceph_cmd(sub_cmd=['auth'],
+                                 args=args))
+
+    return cmd
+
+
+def info_key(name, output_format):
+    '''
+    Get information about a CephX key
+    '''
+
+    cmd_list = []
+
+    args = [
+        'get',
+        name,
+        '-f',
+        output_format,
+    ]
+
+    cmd_list.append(generate_ceph_cmd(sub_cmd=['auth'],
+                                      args=args))
+
+    return cmd_list
+
+
+def list_keys():
+    '''
+    List all CephX keys
+    '''
+
+    cmd = []
+
+    args = [
+        'ls',
+        '-f',
+        'json',
+    ]
+
+    cmd.append(generate_ceph_cmd(sub_cmd=['auth'],
+                                 args=args))
+
+    return cmd
+
+
+def export_keyrings(names, exported):
+    '''
+    Build a keyring per name from the entities returned by 'auth get'
+
+    Return the keyrings by name, and the names which weren't exported.
+    '''
+
+    entities = dict((entity['entity'], entity) for entity in exported)
+    keyrings = dict((name, generate_keyring([(name, entities[name]['key'],
+                                              entities[name].get('caps', {}))]))  # noqa: E501
+                    for name in names if name in entities)
+
+    return keyrings, [name for name in names if name not in entities]
+
+
+def import_keys():
+    '''
+    Import the CephX keys of a keyring read from stdin
+    '''
+
+    cmd = []
+
+    args = [
+        'import',
+        '-i',
+        '-',
+    ]
+
+    cmd.append(generate_ceph_cmd(sub_cmd=['auth'],
+                                 args=args))
+
+    return cmd
+
+
+def generate_secret():
+    '''
+    Generate a CephX secret, like 'ceph-authtool --gen-print-key'
+    '''
+
+    key = os.urandom(16)
+    header = struct.pack('<hiih', 1, int(time.time()), 0, len(key))
+
+    return base64.b64encode(header + key).decode()
+
+
+def generate_keyring(entities):
+    '''
+    Generate the content of a keyring from (name, secret, caps) tuples
+    '''
+
+    lines = []
+    for name, secret, caps in entities:
+        lines.append('[{0}]'.format(name))
+        lines.append('\tkey = {0}'.format(secret))
+        for service, cap in sorted(caps.items()):
+            lines.append('\tcaps {0} = "{1}"'.format(service, cap))
+
+    return '\n'.join(lines) + '\n'
+
+
+def index_keys(auth_dump):
+    '''
+    Index the entities listed by 'auth ls' by name
+    '''
+
+    return dict((entity['entity'], entity)
+                for entity in auth_dump.get('auth_dump', []))
+
+
+def key_pools(caps):
+    '''
+    Return the names of the pools referred to by CephX capabilities
+    '''
+
+    pools = set()
+    for cap in (caps or {}).values():
+        pools.update(re.findall(r'pool=([^\s,]+)', cap))
+
+    return pools
+
+
+def plan_key(key, running_keys):
+    '''
+    Compute the commands reconciling a key with its running state
+
+    Return the list of commands to run and a description of the changes,
+    or None and the reason why the key can't be reconciled.
+    '''
+
+    name = key['name']
+    caps = key.get('caps')
+    running_key = running_keys.get(name)
+
+    if key.get('state') == 'absent':
+        if running_key is None:
+            return [], "Skipped, since {0} doesn't exist".format(name)
+        return delete_key(name), "{0} deleted.".format(name)
+
+    if running_key is None:
+        if not caps:
+            return None, "Capabilities must be provided when state is 'present'"  # noqa: E501
+        return create_key(name, caps), "{0} created.".format(name)
+
+    if not caps or caps == running_key.get('caps'):
+        return [], "{0} already exists and doesn't need to be updated.".format(name)  # noqa: E501
+
+    return update_key(name, caps), "{0} caps updated.".format(name)
+
+
+def key_diff(key, running_key):
+    '''
+    Return the caps of a key before and after reconciling it
+
+    Secrets are never reported. An empty dict stands for a key which doesn't
+    exist.
+    '''
+
+    before = {}
+    if running_key is not None:
+        before = dict(caps=running_key.get('caps', {}))
+
+    if key.get('state') == 'absent':
+        return before, {}
+
+    after = dict(before)
+    if key.get('caps'):
+        after['caps'] = key['caps']
+
+    return before, after
+
+
+def plan_key_import(key, running_keys):
+    '''
+    Compute the keyring entry reconciling a key with its running state
+
+    'auth import' replaces the secret and all the caps of the entities it
+    imports, so the entry carries the running secret when none is given and
+    the running caps when no caps are given.
+
+    Return a list with the (name, secret, caps) entry to import, empty if
+    the key is up to date, and a description of the changes, or None and
+    the reason why the key can't be reconciled.
+    '''
+
+    name = key['name']
+    caps = key.get('caps')
+    secret = key.get('secret')
+    running_key = running_keys.get(name)
+
+    if running_key is None:
+        if not caps:
+            return None, "Capabilities must be provided when state is 'present'"  # noqa: E501
+        return [(name, secret or generate_secret(), caps)], "{0} created.".format(name)  # noqa: E501
+
+    changes = []
+    if caps and caps != running_key.get('caps'):
+        changes.append('caps')
+    if secret and secret != running_key.get('key'):
+        changes.append('secret')
+
+    if not changes:
+        return [], "{0} already exists and doesn't need to be updated.".format(name)  # noqa: E501
+
+    return ([(name, secret or running_key['key'], caps or running_key['caps'])],  # noqa: E501
+            "{0} {1} updated.".format(name, ' and '.join(changes)))
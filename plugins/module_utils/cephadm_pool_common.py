@@ -0,0 +1,934 @@
+# Copyright 2020, Red Hat, Inc.
+# Copyright 2021, StackHPC, Ltd.
+# NOTE: Files adapted from github.com/ceph/ceph-ansible
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+from ansible_collections.stackhpc.cephadm.plugins.module_utils.cephadm_common \
+    import CEPHADM_TIMEOUT, command_runner, generate_ceph_cmd, exec_command, \
+    exec_command_groups, get_cluster_snapshot, parse_json, wait_for
+
+import json
+
+# Defaults of the PG autoscaler, which plan_pg_nums() mirrors
+PG_NUM_MIN = 32
+TARGET_PG_PER_OSD = 100
+
+
+def pool_argument_spec():
+    '''
+    Return the options describing a pool
+    '''
+
+    return dict(
+        name=dict(type='str', required=True),
+        size=dict(type='str', required=False),
+        min_size=dict(type='str', required=False),
+        pg_num=dict(type='str', required=False),
+        pgp_num=dict(type='str', required=False),
+        pg_autoscale_mode=dict(type='str', required=False, default='on'),
+        target_size_ratio=dict(type='str', required=False, default=None),
+        pool_type=dict(type='str', required=False, default='replicated',
+                       choices=['replicated', 'erasure']),
+        erasure_profile=dict(type='str', required=False, default='default'),
+        rule_name=dict(type='str', required=False, default=None),
+        expected_num_objects=dict(type='str', required=False, default="0"),
+        application=dict(type='str', required=False, default=None),
+        allow_ec_overwrites=dict(type='bool', required=False, default=False)
+    )
+
+
+def pg_num_step_argument_spec():
+    '''
+    Return the options controlling stepped pg_num changes
+    '''
+
+    return dict(
+        pg_num_step=dict(type='int', required=False, default=None),
+        pg_num_max_misplaced=dict(type='float', required=False, default=0.05),
+        pg_num_step_timeout=dict(type='int', required=False, default=3600),
+    )
+
+
+def generate_user_pool_config(params):
+    '''
+    Build the user pool config compared with the running pool details
+    '''
+
+    if (params.get('pg_autoscale_mode').lower() in
+            ['true', 'on', 'yes']):
+        pg_autoscale_mode = 'on'
+    elif (params.get('pg_autoscale_mode').lower() in
+          ['false', 'off', 'no']):
+        pg_autoscale_mode = 'off'
+    else:
+        pg_autoscale_mode = 'warn'
+
+    if params.get('pool_type') == '1':
+        pool_type = 'replicated'
+    elif params.get('pool_type') == '3':
+        pool_type = 'erasure'
+    else:
+        pool_type = params.get('pool_type')
+
+    if not params.get('rule_name'):
+        rule_name = 'replicated_rule' if pool_type == 'replicated' else None
+    else:
+        rule_name = params.get('rule_name')
+
+    return {
+        'pool_name': {'value': params.get('name')},
+        'pg_num': {'value': params.get('pg_num'), 'cli_set_opt': 'pg_num'},
+        'pgp_num': {'value': params.get('pgp_num'), 'cli_set_opt': 'pgp_num'},
+        'pg_autoscale_mode': {'value': pg_autoscale_mode,
+                              'cli_set_opt': 'pg_autoscale_mode'},
+        'target_size_ratio': {'value': params.get('target_size_ratio'),
+                              'cli_set_opt': 'target_size_ratio'},
+        'application': {'value': params.get('application')},
+        'type': {'value': pool_type},
+        'erasure_profile': {'value': params.get('erasure_profile')},
+        'crush_rule': {'value': rule_name, 'cli_set_opt': 'crush_rule'},
+        'expected_num_objects': {'value': params.get('expected_num_objects')},
+        'size': {'value': params.get('size'), 'cli_set_opt': 'size'},
+        'min_size': {'value': params.get('min_size')},
+        'allow_ec_overwrites': {'value': params.get('allow_ec_overwrites')},
+        # Set by plan_new_pools_pg_num(), not a module option
+        'pg_num_planned': {'value': bool(params.get('pg_num_planned'))},
+    }
+
+
+def check_pool_exist(name,
+                     output_format='json'):
+    '''
+    Check if a given pool exists
+    '''
+
+    args = ['stats', name, '-f', output_format]
+
+    cmd = generate_ceph_cmd(sub_cmd=['osd', 'pool'],
+                            args=args)
+
+    return cmd
+
+
+def get_application_pool(name,
+                         output_format='json'):
+    '''
+    Get application type enabled on a given pool
+    '''
+
+    args = ['application', 'get', name, '-f', output_format]
+
+    cmd = generate_ceph_cmd(sub_cmd=['osd', 'pool'],
+                            args=args)
+
+    return cmd
+
+
+def enable_application_pool(name,
+                            application):
+    '''
+    Enable application on a given pool
+    '''
+
+    args = ['application', 'enable', name, application]
+
+    cmd = generate_ceph_cmd(sub_cmd=['osd', 'pool'],
+                            args=args)
+
+    return cmd
+
+
+def disable_application_pool(name,
+                             application):
+    '''
+    Disable application on a given pool
+    '''
+
+    args = ['application', 'disable', name,
+            application, '--yes-i-really-mean-it']
+
+    cmd = generate_ceph_cmd(sub_cmd=['osd', 'pool'],
+                            args=args)
+
+    return cmd
+
+
+def get_pool_ec_overwrites(name, output_format='json'):
+    '''
+    Get EC overwrites on a given pool
+    '''
+
+    args = ['get', name, 'allow_ec_overwrites',
+            '-f', output_format]
+
+    cmd = generate_ceph_cmd(sub_cmd=['osd', 'pool'],
+                            args=args)
+
+    return cmd
+
+
+def enable_ec_overwrites(name):
+    '''
+    Enable EC overwrites on a given pool
+    '''
+
+    args = ['set', name, 'allow_ec_overwrites',
+            'true']
+
+    cmd = generate_ceph_cmd(sub_cmd=['osd', 'pool'],
+                            args=args)
+
+    return cmd
+
+
+def disable_ec_overwrites(name):
+    '''
+    Disable EC overwrites on a given pool
+    '''
+
+    args = ['set', name, 'allow_ec_overwrites',
+            'false']
+
+    cmd = generate_ceph_cmd(sub_cmd=['osd', 'pool'],
+                            args=args)
+
+    return cmd
+
+
+def normalise_pool_details(pool):
+    '''
+    Bring the keys compared by compare_pool_config() to the top level
+    '''
+
+    out = dict(pool)
+
+    # This is a trick because "target_size_ratio" isn't present at the same
+    # level in the dict
+    # ie:
+    # {
+    # 'pg_num': 8,
+    # 'pgp_num': 8,
+    # 'pg_autoscale_mode': 'on',
+    #     'options': {
+    #          'target_size_ratio': 0.1
+    #     }
+    # }
+    # If 'target_size_ratio' is present in 'options', we set it, this way we
+    # end up with a dict containing all needed keys at the same level.
+    if 'target_size_ratio' in out['options'].keys():
+        out['target_size_ratio'] = out['options']['target_size_ratio']
+    else:
+        out['target_size_ratio'] = None
+
+    # 'ls detail' already carries what 'application get' and
+    # 'get allow_ec_overwrites' would return for the pool.
+    application = list(out.get('application_metadata', {}).keys())
+
+    if len(application) == 0:
+        out['application'] = ''
+    else:
+        out['application'] = application[0]
+
+    out['allow_ec_overwrites'] = 'ec_overwrites' in out.get('flags_names', '').split(',')  # noqa: E501
+
+    return out
+
+
+def index_pools(pools):
+    '''
+    Index the normalised details of a list of pools by pool name
+    '''
+
+    return dict((pool['pool_name'], normalise_pool_details(pool))
+                for pool in pools)
+
+
+def get_running_pools(module):
+    '''
+    Get the running details of all the pools
+
+    Return the (rc, cmd, out, err) of the pool listing and a dict of the
+    pool details, including their application and whether EC overwrites
+    are allowed, indexed by pool name.
+    '''
+
+    cmd = list_pools(True)
+
+    if module.params.get('cluster_snapshot'):
+        snapshot = get_cluster_snapshot(module)
+        if snapshot is not None:
+            return (0, cmd, '', ''), index_pools(snapshot['pools'].values())
+
+    rc, cmd, out, err = exec_command(module, cmd)
+    if rc != 0:
+        return (rc, cmd, out, err), {}
+
+    return (rc, cmd, out, err), index_pools(json.loads(out.strip()))
+
+
+def get_running_pool(module, name, erasure=False):
+    '''
+    Get the running details of a given pool
+
+    Return the (rc, cmd, out, err) of the pool lookup, the pool details and,
+    for an erasure pool, whether EC overwrites are allowed. rc is non-zero
+    if the pool doesn't exist.
+    '''
+
+    (rc, cmd, out, err), running_pools = get_running_pools(module)
+    if rc != 0:
+        return (rc, cmd, out, err), None, None
+
+    details = running_pools.get(name)
+    if details is None:
+        return (2, cmd, '', "unrecognized pool '{0}'".format(name)), None, None  # noqa: E501
+
+    ec_overwrites = None
+    if erasure:
+        ec_overwrites = details['allow_ec_overwrites']
+
+    return (rc, cmd, '', err), details, ec_overwrites
+
+
+def compare_pool_config(user_pool_config, running_pool_details):
+    '''
+    Compare user input config pool details with current running pool details
+    '''
+
+    delta = {}
+    filter_keys = ['pg_num', 'pg_placement_num', 'size',
+                   'pg_autoscale_mode', 'target_size_ratio']
+    for key in filter_keys:
+        if (str(running_pool_details[key]) != user_pool_config[key]['value'] and  # noqa: E501
+                user_pool_config[key]['value']):
+            delta[key] = user_pool_config[key]
+
+    if (running_pool_details['application'] !=
+            user_pool_config['application']['value'] and
+            user_pool_config['application']['value']):
+        delta['application'] = {}
+        delta['application']['new_application'] = user_pool_config['application']['value']  # noqa: E501
+        # to be improved (for update_pools()...)
+        delta['application']['value'] = delta['application']['new_application']
+        delta['application']['old_application'] = running_pool_details['application']  # noqa: E501
+
+    return delta
+
+
+def list_pools(details,
+               output_format='json'):
+    '''
+    List existing pools
+    '''
+
+    args = ['ls']
+
+    if details:
+        args.append('detail')
+
+    args.extend(['-f', output_format])
+
+    cmd = generate_ceph_cmd(sub_cmd=['osd', 'pool'],
+                            args=args)
+
+    return cmd
+
+
+def create_pool(name,
+                user_pool_config):
+    '''
+    Create a new pool
+    '''
+
+    args = ['create', user_pool_config['pool_name']['value'],
+            user_pool_config['type']['value']]
+
+    if user_pool_config['pg_autoscale_mode']['value'] != 'on' or \
+            user_pool_config['pg_num_planned']['value']:
+        # The autoscaler starts from the pg_num planned by plan_pg_nums()
+        args.extend(['--pg_num',
+                     user_pool_config['pg_num']['value'],
+                     '--pgp_num',
+                     user_pool_config['pgp_num']['value']])
+    if user_pool_config['pg_autoscale_mode']['value'] == 'on' and \
+            user_pool_config['target_size_ratio']['value']:
+        args.extend(['--target_size_ratio',
+                     user_pool_config['target_size_ratio']['value']])
+
+    if user_pool_config['type']['value'] == 'replicated':
+        args.extend([user_pool_config['crush_rule']['value'],
+                     '--expected_num_objects',
+                     user_pool_config['expected_num_objects']['value'],
+                     '--autoscale-mode',
+                     user_pool_config['pg_autoscale_mode']['value']])
+
+    if (user_pool_config['size']['value'] and
+            user_pool_config['type']['value'] == "replicated"):
+        args.extend(['--size', user_pool_config['size']['value']])
+
+    elif user_pool_config['type']['value'] == 'erasure':
+        args.extend([user_pool_config['erasure_profile']['value']])
+
+        if user_pool_config['crush_rule']['value']:
+            args.extend([user_pool_config['crush_rule']['value']])
+
+        args.extend(['--expected_num_objects',
+                     user_pool_config['expected_num_objects']['value'],
+                     '--autoscale-mode',
+                     user_pool_config['pg_autoscale_mode']['value']])
+
+    cmd = generate_ceph_cmd(sub_cmd=['osd', 'pool'],
+                            args=args)
+
+    return cmd
+
+
+def remove_pool(name):
+    '''
+    Remove a pool
+    '''
+
+    args = ['rm', name, name, '--yes-i-really-really-mean-it']
+
+    cmd = generate_ceph_cmd(sub_cmd=['osd', 'pool'],
+                            args=args)
+
+    return cmd
+
+
+def generate_update_pool_cmd_groups(name, delta):
+    '''
+    Generate the commands updating an existing pool
+
+    Return groups of (key, command) tuples. The groups are independent of
+    each other and can be applied concurrently, commands within a group must
+    run in order: 'pgp_num' can't be raised before 'pg_num', and the old
+    application is disabled before the new one is enabled.
+    '''
+
+    groups = []
+    pg_group = []
+
+    for key in delta.keys():
+        if key != 'application':
+            args = ['set',
+                    name,
+                    delta[key]['cli_set_opt'],
+                    delta[key]['value']]
+
+            cmd = generate_ceph_cmd(sub_cmd=['osd', 'pool'],
+                                    args=args)
+
+            if delta[key]['cli_set_opt'] == 'pg_num':
+                pg_group.insert(0, (key, cmd))
+            elif delta[key]['cli_set_opt'] == 'pgp_num':
+                pg_group.append((key, cmd))
+            else:
+                groups.append([(key, cmd)])
+
+        else:
+            group = []
+            if delta['application']['old_application']:
+                group.append((key, disable_application_pool(name, delta['application']['old_application'])))  # noqa: E501
+            group.append((key, enable_application_pool(name, delta['application']['new_application'])))  # noqa: E501
+            groups.append(group)
+
+    if pg_group:
+        groups.insert(0, pg_group)
+
+    return groups
+
+
+def generate_update_pool_cmds(name, delta):
+    '''
+    Generate the commands updating an existing pool
+    '''
+
+    return [cmd
+            for group in generate_update_pool_cmd_groups(name, delta)
+            for key, cmd in group]
+
+
+def update_pool_report(name, delta, failures=None):
+    '''
+    Describe the changes applied by update_pool()
+
+    failures maps the keys which couldn't be updated to their error.
+    '''
+
+    report = ""
+    failures = failures or {}
+
+    for key in delta.keys():
+        if key in failures:
+            report = report + "\n" + "{0} couldn't be updated: {1} is still not {2}: {3}".format(name, key, delta[key]['value'], failures[key])  # noqa: E501
+        else:
+            report = report + "\n" + "{0} has been updated: {1} is now {2}".format(name, key, delta[key]['value'])  # noqa: E501
+
+    return report
+
+
+def update_pool(module, name, delta):
+    '''
+    Update an existing pool
+
+    Independent changes are applied concurrently. A failure to update a key
+    doesn't prevent the other keys from being updated, each failure is
+    reported against its key.
+    '''
+
+    groups = generate_update_pool_cmd_groups(name, delta)
+    group_results = exec_command_groups(module,
+                                        [[cmd for key, cmd in group]
+                                         for group in groups],
+                                        parallel=True)
+
+    failures = {}
+    failed = None
+    for group, results in zip(groups, group_results):
+        for index, (key, cmd) in enumerate(group):
+            if index >= len(results):
+                # A previous command of the group failed
+                failures.setdefault(key, 'not applied')
+            elif results[index][0] != 0:
+                failures[key] = results[index][3].rstrip("\r\n")
+                failed = failed or results[index]
+
+    out = update_pool_report(name, delta, failures)
+
+    if failed:
+        rc, cmd, _out, _err = failed
+        err = "\n".join("{0}: {1}".format(key, failures[key])
+                        for key in delta.keys() if key in failures)
+        return rc, cmd, out, err
+
+    rc, cmd, _out, err = group_results[-1][-1]
+    return rc, cmd, out, err
+
+
+def prune_pool_delta(delta, running_pool_details):
+    '''
+    Remove the changes which can't be applied to a running pool
+
+    'size' can't be updated on an erasure-coded pool and 'pg_num'/'pgp_num'
+    are managed by the autoscaler when it is on.
+    '''
+
+    if running_pool_details['erasure_code_profile'] and 'size' in delta:
+        del delta['size']
+    if running_pool_details['pg_autoscale_mode'] == 'on':
+        delta.pop('pg_num', None)
+        delta.pop('pgp_num', None)
+
+    return delta
+
+
+def pool_update_delta(user_pool_config, running_pool_details):
+    '''
+    Compute the settings to update on an existing pool
+    '''
+
+    user_pool_config['pg_placement_num'] = {'value': str(running_pool_details['pg_placement_num']), 'cli_set_opt': 'pgp_num'}  # noqa: E501
+
+    return prune_pool_delta(compare_pool_config(user_pool_config,
+                                                running_pool_details),
+                            running_pool_details)
+
+
+def generate_create_pool_cmds(name, user_pool_config):
+    '''
+    Generate the commands creating a new pool with its settings
+    '''
+
+    cmd_list = [create_pool(name, user_pool_config=user_pool_config)]
+
+    if user_pool_config['application']['value']:
+        cmd_list.append(enable_application_pool(name,
+                                                user_pool_config['application']['value']))  # noqa: E501
+    if user_pool_config['min_size']['value']:
+        # not implemented yet
+        pass
+    if user_pool_config['allow_ec_overwrites']['value']:
+        cmd_list.append(enable_ec_overwrites(name))
+
+    return cmd_list
+
+
+def plan_pool(pool, running_pools):
+    '''
+    Compute the commands reconciling a pool with its running state
+
+    Return the list of commands to run and a description of the changes.
+    '''
+
+    name = pool['name']
+    running_pool_details = running_pools.get(name)
+
+    if pool['state'] == 'absent':
+        if running_pool_details is None:
+            return [], "Skipped, since pool {0} doesn't exist".format(name)
+        return [remove_pool(name)], "Pool {0} removed.".format(name)
+
+    user_pool_config = generate_user_pool_config(pool)
+
+    if running_pool_details is None:
+        return (generate_create_pool_cmds(name, user_pool_config),
+                "Pool {0} created.".format(name))
+
+    cmd_list = []
+    report = ""
+
+    if user_pool_config['type']['value'] == 'erasure':
+        allow_ec_overwrites = user_pool_config['allow_ec_overwrites']['value']  # noqa: E501
+        if running_pool_details['allow_ec_overwrites'] != allow_ec_overwrites:
+            if allow_ec_overwrites:
+                cmd_list.append(enable_ec_overwrites(name))
+            else:
+                cmd_list.append(disable_ec_overwrites(name))
+            report = "\n{0} has been updated: allow_ec_overwrites is now {1}".format(name, allow_ec_overwrites)  # noqa: E501
+
+    delta = pool_update_delta(user_pool_config, running_pool_details)
+    cmd_list.extend(generate_update_pool_cmds(name, delta))
+    report += update_pool_report(name, delta)
+
+    if not cmd_list:
+        report = "Pool {0} already exists and there is nothing to update.".format(name)  # noqa: E501
+
+    return cmd_list, report
+
+
+# Settings reported by pool_diff(), as (option, running pool details key)
+POOL_DIFF_KEYS = (
+    ('size', 'size'),
+    ('pg_num', 'pg_num'),
+    ('pgp_num', 'pg_placement_num'),
+    ('pg_autoscale_mode', 'pg_autoscale_mode'),
+    ('target_size_ratio', 'target_size_ratio'),
+    ('application', 'application'),
+    ('allow_ec_overwrites', 'allow_ec_overwrites'),
+)
+
+
+def pool_diff(pool, running_pool_details):
+    '''
+    Return the settings of a pool before and after reconciling it
+
+    The settings after are computed with the same comparison as plan_pool(),
+    an empty dict stands for a pool which doesn't exist.
+    '''
+
+    before = {}
+    if running_pool_details is not None:
+        before = dict((option, running_pool_details[key])
+                      for option, key in POOL_DIFF_KEYS)
+
+    if pool['state'] == 'absent':
+        return before, {}
+
+    user_pool_config = generate_user_pool_config(pool)
+
+    if running_pool_details is None:
+        return before, dict((option, user_pool_config[option]['value'])
+                            for option, key in POOL_DIFF_KEYS
+                            if user_pool_config[option]['value'])
+
+    delta = pool_update_delta(user_pool_config, running_pool_details)
+    after = dict(before)
+    for option, key in POOL_DIFF_KEYS:
+        if key in delta:
+            after[option] = delta[key]['value']
+    if user_pool_config['type']['value'] == 'erasure':
+        after['allow_ec_overwrites'] = user_pool_config['allow_ec_overwrites']['value']  # noqa: E501
+
+    return before, after
+
+
+def pg_num_steps(current, target, step):
+    '''
+    Return the successive pg_num values moving from current to target
+    '''
+
+    steps = []
+    while current != target:
+        if target > current:
+            current = min(current + step, target)
+        else:
+            current = max(current - step, target)
+        steps.append(current)
+
+    # The target may already be set while the PGs are still being split or
+    # merged towards it, wait for it anyway.
+    return steps or [target]
+
+
+# Parts of 'pg dump pools' read by pg_num_reached(), nested in 'pool_stats'
+# or not depending on the release
+PG_DUMP_POOLS_PATHS = [prefix + path
+                       for prefix in ('pool_stats.*.', '*.')
+                       for path in ('poolid', 'num_pg',
+                                    'stat_sum.num_objects_misplaced',
+                                    'stat_sum.num_object_copies')]
+
+
+def pg_num_reached(pool_id, pg_num, max_misplaced):
+    '''
+    Return the evaluation of 'pg dump pools' output by wait_for()
+
+    The pool must have pg_num PGs, and the ratio of misplaced object copies
+    across all the pools must not exceed max_misplaced.
+    '''
+
+    def evaluate(data):
+        # Since Octopus, the pool statistics are nested in 'pool_stats'
+        if isinstance(data, dict):
+            data = data.get('pool_stats', [])
+        num_pg = 0
+        misplaced = copies = 0
+        for pool in data:
+            if pool.get('poolid') == pool_id:
+                num_pg = pool.get('num_pg', 0)
+            misplaced += pool.get('stat_sum', {}).get('num_objects_misplaced', 0)  # noqa: E501
+            copies += pool.get('stat_sum', {}).get('num_object_copies', 0)
+        ratio = float(misplaced) / copies if copies else 0.0
+
+        return (num_pg == pg_num and ratio <= max_misplaced,
+                (num_pg, misplaced),
+                '{0} of {1} PGs, {2:.2%} objects misplaced'.format(num_pg, pg_num, ratio))  # noqa: E501
+
+    return evaluate
+
+
+def step_pg_num(module, name, pool_id, current, target):
+    '''
+    Move the pg_num and pgp_num of a pool to target in steps
+
+    Each step changes pg_num by at most pg_num_step, then waits for the PGs
+    to be split or merged and for misplaced objects to fall to
+    pg_num_max_misplaced. All the steps run in the same CephShell with the
+    CLI transport. current is the pg_num the pool is moving to, so that a
+    run interrupted by a timeout resumes from the last step it set.
+
+    Return the (rc, cmd, out, err) of the last command and the progress:
+    the pg_num reached and the steps completed.
+    '''
+
+    steps = pg_num_steps(current, target, module.params['pg_num_step'])
+    timeout = module.params['pg_num_step_timeout']
+    max_misplaced = module.params['pg_num_max_misplaced']
+    progress = dict(pg_num=current, target=target, steps=[])
+    stat_cmd = generate_ceph_cmd(sub_cmd=['pg', 'dump'],
+                                 args=['pools', '-f', 'json'])
+
+    run, close = command_runner(module, len(steps) * (timeout + CEPHADM_TIMEOUT))  # noqa: E501
+    try:
+        for pg_num in steps:
+            for key in ('pg_num', 'pgp_num'):
+                rc, cmd, out, err = run(generate_ceph_cmd(sub_cmd=['osd', 'pool'],  # noqa: E501
+                                                          args=['set', name, key, str(pg_num)]))  # noqa: E501
+                if rc != 0:
+                    return (rc, cmd, "{0} couldn't be updated: pg_num is still {1}".format(name, progress['pg_num']), err), progress  # noqa: E501
+
+            met, attempts, elapsed, status = wait_for(module, stat_cmd,
+                                                      pg_num_reached(pool_id, pg_num, max_misplaced),  # noqa: E501
+                                                      timeout, run=run,
+                                                      paths=PG_DUMP_POOLS_PATHS)
+            if not met:
+                return (1, stat_cmd,
+                        "{0} couldn't be updated: pg_num is still {1}".format(name, progress['pg_num']),  # noqa: E501
+                        "Timed out after {0} seconds waiting for pg_num {1}: {2}".format(timeout, pg_num, status)), progress  # noqa: E501
+            progress['pg_num'] = pg_num
+            progress['steps'].append(dict(pg_num=pg_num, attempts=attempts,
+                                          elapsed=round(elapsed, 1)))
+    finally:
+        close()
+
+    return (0, stat_cmd,
+            "{0} has been updated: pg_num is now {1} after {2} step(s)".format(name, target, len(steps)),  # noqa: E501
+            ''), progress
+
+
+def nearest_power_of_two(n):
+    '''
+    Round a PG count to the nearest power of two, like the PG autoscaler
+    '''
+
+    v = 1
+    while v < n:
+        v <<= 1
+    x = v >> 1
+
+    return x if x and (v - n) > (n - x) else v
+
+
+def count_crush_osds(nodes, item_name):
+    '''
+    Count the OSDs under a CRUSH item, as named in the 'take' step of a rule
+
+    'default~ssd' only counts the OSDs of the 'ssd' device class under the
+    'default' root.
+    '''
+
+    root, _sep, device_class = item_name.partition('~')
+    by_id = dict((node['id'], node) for node in nodes)
+    by_name = dict((node['name'], node) for node in nodes)
+
+    count = 0
+    pending = [by_name[root]] if root in by_name else []
+    while pending:
+        node = pending.pop()
+        if node.get('type') == 'osd':
+            if not device_class or node.get('device_class') == device_class:
+                count += 1
+        else:
+            pending.extend(by_id[child] for child in node.get('children', [])
+                           if child in by_id)
+
+    return count
+
+
+def rule_root(rule):
+    '''
+    Return the item taken by the first 'take' step of a CRUSH rule
+    '''
+
+    for step in rule.get('steps', []):
+        if step.get('op') == 'take':
+            return step.get('item_name')
+
+    return None
+
+
+def pool_footprint(pool, rules, profiles, nodes):
+    '''
+    Find the CRUSH item a pool maps to, its number of OSDs and the number of
+    OSDs each PG of the pool is placed on
+
+    pool is either a pool option dict or running pool details. Erasure
+    pools without an existing rule map to the root of their profile, like
+    the rule created along with them.
+    '''
+
+    if 'pool_name' in pool:
+        # The size of an erasure pool is already k + m
+        erasure = pool.get('type') == 3
+        profile = profiles.get(pool.get('erasure_code_profile'), {})
+        rule = dict((r['rule_id'], r) for r in rules.values()).get(pool.get('crush_rule'), {})  # noqa: E501
+        pg_size = int(pool.get('size') or 3)
+    else:
+        user_pool_config = generate_user_pool_config(pool)
+        erasure = user_pool_config['type']['value'] == 'erasure'
+        profile = profiles.get(user_pool_config['erasure_profile']['value'], {})  # noqa: E501
+        rule = rules.get(user_pool_config['crush_rule']['value'], {})
+        if erasure:
+            pg_size = int(profile.get('k', 2)) + int(profile.get('m', 1))
+        else:
+            pg_size = int(user_pool_config['size']['value'] or 3)
+
+    item_name = rule_root(rule)
+    if item_name is None:
+        item_name = profile.get('crush-root', 'default') if erasure else 'default'  # noqa: E501
+        if erasure and profile.get('crush-device-class'):
+            item_name += '~' + profile['crush-device-class']
+
+    return item_name, count_crush_osds(nodes, item_name), pg_size
+
+
+def plan_pg_nums(pools, footprints, target_pg_per_osd=TARGET_PG_PER_OSD):
+    '''
+    Compute the final pg_num of pools the way the PG autoscaler would
+
+    pools maps pool names to their target_size_ratio, and footprints maps
+    them to their pool_footprint(). Each CRUSH item gets target_pg_per_osd
+    PGs per OSD, shared between its pools in proportion of their
+    normalised target_size_ratio. Pools without a ratio aren't planned.
+    '''
+
+    total_ratios = {}
+    for name, ratio in pools.items():
+        item_name = footprints[name][0]
+        total_ratios[item_name] = total_ratios.get(item_name, 0.0) + (ratio or 0.0)  # noqa: E501
+
+    pg_nums = {}
+    for name, ratio in pools.items():
+        item_name, osd_count, pg_size = footprints[name]
+        if not ratio or not osd_count:
+            continue
+        ratio = ratio / total_ratios[item_name]
+        pg_target = ratio * osd_count * target_pg_per_osd / pg_size
+        pg_nums[name] = max(PG_NUM_MIN, nearest_power_of_two(pg_target))
+
+    return pg_nums
+
+
+def plan_new_pools_pg_num(module, pools, running_pools):
+    '''
+    Set the final pg_num and pgp_num of the pools to create
+
+    The CRUSH map and erasure code profiles are read in a single batch.
+    Existing pools share the capacity of their CRUSH item with the new
+    ones, only pools to create without an explicit pg_num are changed.
+
+    Return the (rc, cmd, out, err) of the read, the pools and the planned
+    pg_num by pool name.
+    '''
+
+    results = exec_command_groups(module, [
+        [generate_ceph_cmd(sub_cmd=['osd', 'tree'], args=['-f', 'json'])],
+        [generate_ceph_cmd(sub_cmd=['osd', 'crush', 'rule', 'dump'],
+                           args=['-f', 'json'])],
+        [generate_ceph_cmd(sub_cmd=['osd', 'dump'], args=['-f', 'json'])],
+    ])
+    for group in results:
+        if not group or group[0][0] != 0:
+            return group[0] if group else (1, None, '', ''), pools, {}
+
+    nodes = parse_json(results[0][0][2], ['nodes.*.id', 'nodes.*.name',
+                                          'nodes.*.type', 'nodes.*.device_class',  # noqa: E501
+                                          'nodes.*.children'])['nodes']
+    rules = dict((r['rule_name'], r) for r in json.loads(results[1][0][2]))
+    profiles = parse_json(results[2][0][2],
+                          ['erasure_code_profiles'])['erasure_code_profiles']
+
+    new_pools = [pool for pool in pools
+                 if pool.get('state', 'present') == 'present' and
+                 pool['name'] not in running_pools]
+    names = set(pool['name'] for pool in new_pools)
+
+    ratios = {}
+    footprints = {}
+    for pool in new_pools:
+        ratios[pool['name']] = float(pool.get('target_size_ratio') or 0.0)
+        footprints[pool['name']] = pool_footprint(pool, rules, profiles, nodes)  # noqa: E501
+    for name, details in running_pools.items():
+        if name not in names:
+            ratios[name] = float(details.get('target_size_ratio') or 0.0)
+            footprints[name] = pool_footprint(details, rules, profiles, nodes)  # noqa: E501
+
+    pg_nums = plan_pg_nums(ratios, footprints,
+                           module.params.get('target_pg_per_osd') or TARGET_PG_PER_OSD)  # noqa: E501
+    pg_nums = dict((name, pg_num) for name, pg_num in pg_nums.items()
+                   if name in names)
+
+    planned = []
+    for pool in pools:
+        if pool['name'] in pg_nums and not pool.get('pg_num'):
+            pool = dict(pool, pg_num=str(pg_nums[pool['name']]),
+                        pgp_num=str(pg_nums[pool['name']]),
+                        pg_num_planned=True)
+        planned.append(pool)
+
+    return results[-1][-1], planned, pg_nums
@@ -0,0 +1,631 @@
+#!/usr/bin/python
+
+# Copyright 2026, StackHPC, Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+DOCUMENTATION = r'''
+module: cephadm_batch
+author:
+    - StackHPC Ltd. (@stackhpc)
+short_description: Manage Ceph EC profiles, CRUSH rules, pools and keys at once
+version_added: "1.24.0"
+description:
+    - Reconcile erasure code profiles, CRUSH rules, pools and CephX keys
+      described in a single document.
+    - The state of the cluster is read once. Only the objects which differ
+      from their running state are changed, in the order required by their
+      dependencies, e.g. a pool after the CRUSH rule and the EC profile it
+      uses, or a key after the pools its capabilities refer to. Objects
+      being removed are handled in the reverse order.
+    - Independent objects are changed concurrently, in a single
+      'cephadm shell' container for each step of the dependency graph.
+extends_documentation_fragment:
+    - stackhpc.cephadm.cephadm_common
+options:
+    ec_profiles:
+        description:
+            - List of erasure code profiles. See the cephadm_ec_profile module
+              for a description of the options.
+        required: false
+        default: []
+        type: list
+        elements: dict
+        suboptions:
+            name:
+                description:
+                    - name of the profile.
+                required: true
+                type: str
+            state:
+                description:
+                    - Whether the profile should exist or not.
+                required: false
+                choices: ['present', 'absent']
+                default: present
+                type: str
+            stripe_unit:
+                description:
+                    - The amount of data in a data chunk, per stripe.
+                required: false
+                type: str
+            k:
+                description:
+                    - Number of data-chunks the object will be split in
+                required: false
+                type: str
+            m:
+                description:
+                    - Compute coding chunks for each object and store them on
+                      different OSDs.
+                required: false
+                type: str
+            plugin:
+                description:
+                    - Use the erasure code plugin to compute coding chunks and
+                      recover missing chunks.
+                required: false
+                type: str
+            directory:
+                description:
+                    - Set the directory name from which the erasure code
+                      plugin is loaded.
+                required: false
+                type: str
+            crush_root:
+                description:
+                    - Name of the CRUSH root the rule of the profile
+                      starts from.
+                required: false
+                type: str
+            crush_device_class:
+                description:
+                    - Restrict placement to devices of a specific class
+                required: false
+                type: str
+            crush_failure_domain:
+                description:
+                    - Set the failure domain for the CRUSH rule
+                required: false
+                type: str
+    crush_rules:
+        description:
+            - List of CRUSH rules. See the cephadm_crush_rule module for a
+              description of the options.
+        required: false
+        default: []
+        type: list
+        elements: dict
+        suboptions:
+            name:
+                description:
+                    - name of the Ceph Crush rule.
+                required: true
+                type: str
+            state:
+                description:
+                    - Whether the rule should exist or not.
+                required: false
+                choices: ['present', 'absent']
+                default: present
+                type: str
+            rule_type:
+                description:
+                    - The ceph CRUSH rule type.
+                required: false
+                choices: ['replicated', 'erasure']
+                type: str
+            bucket_root:
+                description:
+                    - The ceph bucket root for replicated rule.
+                required: false
+                type: str
+            bucket_type:
+                description:
+                    - The ceph bucket type for replicated rule.
+                required: false
+                choices: ['osd', 'host', 'chassis', 'rack', 'row', 'pdu',
+                          'pod', 'room', 'datacenter', 'zone', 'region',
+                          'root']
+                type: str
+            device_class:
+                description:
+                    - The ceph device class for replicated rule.
+                required: false
+                type: str
+            profile:
+                description:
+                    - The ceph erasure profile for erasure rule.
+                required: false
+                type: str
+    pools:
+        description:
+            - List of pools. See the cephadm_pool module for a description of
+              the options.
+        required: false
+        default: []
+        type: list
+        elements: dict
+        suboptions:
+            name:
+                description:
+                    - name of the Ceph pool
+                required: true
+                type: str
+            state:
+                description:
+                    - Whether the pool should exist or not.
+                required: false
+                choices: ['present', 'absent']
+                default: present
+                type: str
+            size:
+                description:
+                    - set the replica size of the pool.
+                required: false
+                type: str
+            min_size:
+                description:
+                    - set the min_size parameter of the pool.
+                required: false
+                type: str
+            pg_num:
+                description:
+                    - set the pg_num of the pool.
+                required: false
+                type: str
+            pgp_num:
+                description:
+                    - set the pgp_num of the pool.
+                required: false
+                type: str
+            pg_autoscale_mode:
+                description:
+                    - set the pg autoscaler on the pool.
+                required: false
+                default: 'on'
+                type: str
+            target_size_ratio:
+                description:
+                    - set the target_size_ratio on the pool
+                required: false
+                type: str
+            pool_type:
+                description:
+                    - set the pool type, either 'replicated' or 'erasure'
+                required: false
+                default: replicated
+                choices: ['replicated', 'erasure']
+                type: str
+            erasure_profile:
+                description:
+                    - When pool_type = 'erasure', set the erasure profile of
+                      the pool
+                required: false
+                default: default
+                type: str
+            rule_name:
+                description:
+                    - Set the crush rule name assigned to the pool
+                required: false
+                type: str
+            expected_num_objects:
+                description:
+                    - Set the expected_num_objects parameter of the pool.
+                required: false
+                default: "0"
+                type: str
+            application:
+                description:
+                    - Set the pool application on the pool.
+                required: false
+                type: str
+            allow_ec_overwrites:
+                description:
+                    - Set the allow_ec_overwrites parameter of the pool.
+                required: false
+                default: false
+                type: bool
+    keys:
+        description:
+            - List of CephX keys. See the cephadm_key module for a description
+              of the options.
+        required: false
+        default: []
+        type: list
+        elements: dict
+        suboptions:
+            name:
+                description:
+                    - name of the CephX key
+                required: true
+                type: str
+            state:
+                description:
+                    - Whether the key should exist or not.
+                required: false
+                choices: ['present', 'absent']
+                default: present
+                type: str
+            caps:
+                description:
+                    - CephX key capabilities
+                required: false
+                type: dict
+    cluster_snapshot:
+        description:
+            - Read the pools, EC profiles and CRUSH rules from a snapshot of
+              the OSD map cached on the host, keyed by cluster fsid and OSD
+              map epoch. The snapshot is only fetched again once the OSD map
+              has changed.
+        required: false
+        default: false
+        type: bool
+'''
+
+EXAMPLES = r'''
+- name: Ensure Ceph objects are defined
+  cephadm_batch:
+    ec_profiles:
+      - name: ec42
+        k: 4
+        m: 2
+    crush_rules:
+      - name: ec42
+        rule_type: erasure
+        profile: ec42
+    pools:
+      - name: data
+        pool_type: erasure
+        erasure_profile: ec42
+        rule_name: ec42
+        application: rgw
+    keys:
+      - name: client.rgw
+        caps:
+          mon: "allow r"
+          osd: "allow rwx pool=data"
+'''
+
+RETURN = r'''
+ec_profiles:
+    description: Per profile report, in the order of the I(ec_profiles) option.
+    returned: always
+    type: list
+    elements: dict
+crush_rules:
+    description: Per rule report, in the order of the I(crush_rules) option.
+    returned: always
+    type: list
+    elements: dict
+pools:
+    description: Per pool report, in the order of the I(pools) option.
+    returned: always
+    type: list
+    elements: dict
+keys:
+    description: Per key report, in the order of the I(keys) option.
+    returned: always
+    type: list
+    elements: dict
+schedule:
+    description:
+        - Objects changed at each step, as C(kind/name). The objects of a
+          step are changed concurrently, after the previous step.
+    returned: always
+    type: list
+    elements: list
+'''
+
+from ansible.module_utils.basic import AnsibleModule
+from ansible_collections.stackhpc.cephadm.plugins.module_utils.cephadm_common \
+    import build_snapshot, cephadm_argument_spec, exec_command_groups, \
+    exec_commands_batch, generate_ceph_cmd, get_cluster_snapshot, \
+    get_timings
+from ansible_collections.stackhpc.cephadm.plugins.module_utils.cephadm_crush_rule_common \
+    import crush_rule_argument_spec, plan_crush_rule
+from ansible_collections.stackhpc.cephadm.plugins.module_utils.cephadm_ec_profile_common \
+    import ec_profile_argument_spec, plan_ec_profile
+from ansible_collections.stackhpc.cephadm.plugins.module_utils.cephadm_key_common \
+    import index_keys, key_pools, list_keys, plan_key
+from ansible_collections.stackhpc.cephadm.plugins.module_utils.cephadm_pool_common \
+    import index_pools, plan_pool, pool_argument_spec
+
+import datetime
+import json
+
+# Kinds of objects, in the order their reports are returned
+KINDS = ('ec_profiles', 'crush_rules', 'pools', 'keys')
+
+
+def get_cluster_state(module):
+    '''
+    Read the running state of the kinds of objects being managed
+
+    Return the (rc, cmd, out, err) of the first failing read, if any, and
+    a dict of the running objects of each kind, indexed by name.
+    '''
+
+    params = module.params
+    state = dict((kind, {}) for kind in KINDS)
+    cmd_list = []
+
+    snapshot = None
+    read_osdmap = False
+    if params['ec_profiles'] or params['crush_rules'] or params['pools']:
+        if params.get('cluster_snapshot'):
+            snapshot = get_cluster_snapshot(module)
+        if snapshot is None:
+            read_osdmap = True
+            cmd_list.append(generate_ceph_cmd(sub_cmd=['osd', 'dump'],
+                                              args=['-f', 'json']))
+            cmd_list.append(generate_ceph_cmd(sub_cmd=['osd', 'crush', 'rule'],  # noqa: E501
+                                              args=['dump', '-f', 'json']))
+    if params['keys']:
+        cmd_list.extend(list_keys())
+
+    # All the reads share a single container
+    results = exec_commands_batch(module, cmd_list)
+    for result in results:
+        if result[0] != 0:
+            return result, state
+    if len(results) != len(cmd_list):
+        return (1, cmd_list[len(results)], '', 'not executed'), state
+
+    outputs = [json.loads(out) for rc, cmd, out, err in results]
+    if read_osdmap:
+        snapshot = build_snapshot(outputs[0], outputs[1])
+    if snapshot is not None:
+        state['ec_profiles'] = snapshot['erasure_code_profiles']
+        state['crush_rules'] = snapshot['crush_rules']
+        state['pools'] = index_pools(snapshot['pools'].values())
+    if params['keys']:
+        state['keys'] = index_keys(outputs[-1])
+
+    return (0, cmd_list[-1] if cmd_list else [], '', ''), state
+
+
+def plan_objects(params, state):
+    '''
+    Plan the changes of every object of the document
+
+    Return the nodes of the dependency graph, indexed by (kind, name).
+    '''
+
+    planners = dict(ec_profiles=plan_ec_profile,
+                    crush_rules=plan_crush_rule,
+                    pools=plan_pool,
+                    keys=plan_key)
+
+    nodes = {}
+    for kind in KINDS:
+        for obj in params[kind]:
+            cmd_list, report = planners[kind](obj, state[kind])
+            nodes[(kind, obj['name'])] = dict(
+                kind=kind, obj=obj, cmds=cmd_list, report=report, deps=set(),
+                failed_deps=set(), results=None)
+
+    return nodes
+
+
+def dependencies(node, nodes, state):
+    '''
+    Return the keys of the nodes which have to be changed before a node
+    '''
+
+    obj = node['obj']
+    deps = []
+
+    if obj['state'] != 'absent':
+        if node['kind'] == 'crush_rules' and obj.get('rule_type') == 'erasure':
+            deps.append(('ec_profiles', obj.get('profile')))
+        elif node['kind'] == 'pools':
+            deps.append(('crush_rules', obj.get('rule_name')))
+            if obj.get('pool_type') == 'erasure':
+                deps.append(('ec_profiles', obj.get('erasure_profile')))
+        elif node['kind'] == 'keys':
+            deps.extend(('pools', pool) for pool in key_pools(obj.get('caps')))
+        return set(key for key in deps
+                   if key in nodes and nodes[key]['obj']['state'] != 'absent')
+
+    # Objects being removed wait for the removal of their users
+    name = obj['name']
+    running_rule = state['crush_rules'].get(name, {})
+    for key, other in nodes.items():
+        other_obj = other['obj']
+        if other_obj['state'] != 'absent':
+            continue
+        running_pool = state['pools'].get(other_obj['name'], {})
+        if node['kind'] == 'ec_profiles':
+            if key[0] == 'crush_rules' and other_obj.get('profile') == name:
+                deps.append(key)
+            elif key[0] == 'pools' and name in (other_obj.get('erasure_profile') if other_obj.get('pool_type') == 'erasure' else None,  # noqa: E501
+                                                running_pool.get('erasure_code_profile')):  # noqa: E501
+                deps.append(key)
+        elif node['kind'] == 'crush_rules' and key[0] == 'pools':
+            if other_obj.get('rule_name') == name or \
+                    ('rule_id' in running_rule and
+                     running_pool.get('crush_rule') == running_rule['rule_id']):  # noqa: E501
+                deps.append(key)
+
+    return set(deps)
+
+
+def schedule(nodes, state):
+    '''
+    Group the nodes with changes into steps
+
+    A node is in the step following the last step of the nodes it depends
+    on, the nodes of a step are independent from each other.
+    '''
+
+    for node in nodes.values():
+        node['deps'] = set(key for key in dependencies(node, nodes, state)
+                           if nodes[key]['cmds'])
+
+    steps = {}
+
+    def step(key):
+        if key not in steps:
+            steps[key] = 0
+            steps[key] = 1 + max([step(dep) for dep in nodes[key]['deps']] + [-1])  # noqa: E501
+        return steps[key]
+
+    levels = []
+    for key in sorted(nodes):
+        if nodes[key]['cmds']:
+            level = step(key)
+            while len(levels) <= level:
+                levels.append([])
+            levels[level].append(key)
+
+    return levels
+
+
+def node_report(node):
+    '''
+    Report the outcome of a node, return it and whether the node failed
+    '''
+
+    cmd_list = node['cmds']
+    report = dict(name=node['obj']['name'], changed=bool(cmd_list),
+                  cmds=cmd_list or [], rc=0, stdout=node['report'],
+                  stderr='')
+
+    if cmd_list is None:
+        report.update(changed=False, rc=1)
+        return report, True
+
+    results = node['results']
+    if results is None:
+        return report, False
+
+    if not results:
+        report.update(changed=False, rc=1, stdout='Skipped, since {0} failed'.format(  # noqa: E501
+            ', '.join('{0} {1}'.format(kind, name)
+                      for kind, name in sorted(node['failed_deps']))))
+        return report, True
+
+    report['changed'] = results[0][0] == 0
+    rc, cmd, out, err = results[-1]
+    report.update(rc=rc, stderr=err.rstrip("\r\n"))
+    if rc != 0 or len(results) != len(cmd_list):
+        report['stdout'] = out.rstrip("\r\n")
+        return report, True
+
+    return report, False
+
+
+def run_module():
+    module_args = dict(
+        ec_profiles=dict(type='list', elements='dict', required=False,
+                         default=[], options=ec_profile_argument_spec()),
+        crush_rules=dict(type='list', elements='dict', required=False,
+                         default=[], options=crush_rule_argument_spec(),
+                         required_if=[
+                             ('rule_type', 'replicated', ['bucket_root', 'bucket_type']),  # noqa: E501
+                             ('rule_type', 'erasure', ['profile'])
+                         ]),
+        pools=dict(type='list', elements='dict', required=False, default=[],
+                   options=dict(pool_argument_spec(),
+                                state=dict(type='str', required=False,
+                                           default='present',
+                                           choices=['present', 'absent']))),
+        keys=dict(type='list', elements='dict', required=False, default=[],
+                  no_log=False,
+                  options=dict(name=dict(type='str', required=True),
+                               state=dict(type='str', required=False,
+                                          default='present',
+                                          choices=['present', 'absent']),
+                               caps=dict(type='dict', required=False))),
+        cluster_snapshot=dict(type='bool', required=False, default=False)
+    )
+    module_args.update(cephadm_argument_spec())
+
+    module = AnsibleModule(
+        argument_spec=module_args,
+        supports_check_mode=True
+    )
+
+    startd = datetime.datetime.now()
+
+    (rc, cmd, out, err), state = get_cluster_state(module)
+    if rc != 0:
+        module.fail_json(msg="Couldn't read the state of the cluster",
+                         cmd=cmd, rc=rc, stdout=out, stderr=err,
+                         timings=get_timings(module))
+
+    nodes = plan_objects(module.params, state)
+    levels = schedule(nodes, state)
+
+    if not module.check_mode:
+        failed_keys = set(key for key, node in nodes.items()
+                          if node['cmds'] is None)
+        for level in levels:
+            runnable = []
+            for key in level:
+                if nodes[key]['deps'] & failed_keys:
+                    nodes[key]['failed_deps'] = nodes[key]['deps'] & failed_keys  # noqa: E501
+                    nodes[key]['results'] = []
+                    failed_keys.add(key)
+                else:
+                    runnable.append(key)
+            group_results = exec_command_groups(module,
+                                                [nodes[key]['cmds']
+                                                 for key in runnable],
+                                                parallel=True)
+            for key, results in zip(runnable, group_results):
+                nodes[key]['results'] = results
+                rc = results[-1][0] if results else 1
+                if rc != 0 or len(results) != len(nodes[key]['cmds']):
+                    failed_keys.add(key)
+
+    endd = datetime.datetime.now()
+    result = dict(
+        changed=False,
+        schedule=[['{0}/{1}'.format(kind, name) for kind, name in level]
+                  for level in levels],
+        start=str(startd),
+        end=str(endd),
+        delta=str(endd - startd),
+        rc=0,
+    )
+
+    failed = []
+    for kind in KINDS:
+        result[kind] = []
+        for obj in module.params[kind]:
+            report, node_failed = node_report(nodes[(kind, obj['name'])])
+            result[kind].append(report)
+            result['changed'] = result['changed'] or report['changed']
+            if node_failed:
+                failed.append('{0}/{1}'.format(kind, obj['name']))
+
+    result['timings'] = get_timings(module)
+
+    if failed:
+        result['rc'] = 1
+        module.fail_json(msg="Couldn't reconcile: {0}".format(', '.join(failed)), **result)  # noqa: E501
+
+    module.exit_json(**result)
+
+
+def main():
+    run_module()
+
+
+if __name__ == '__main__':
+    main()
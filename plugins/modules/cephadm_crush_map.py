@@ -0,0 +1,524 @@
+#!/usr/bin/python
+
+# Copyright 2026, StackHPC, Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+DOCUMENTATION = r'''
+module: cephadm_crush_map
+author:
+    - StackHPC Ltd. (@stackhpc)
+short_description: Apply CRUSH rule and bucket changes in one CRUSH map edit
+version_added: "1.24.0"
+description:
+    - Create and remove CRUSH rules and buckets, and move buckets, with a
+      single change of the OSD map instead of one per rule or bucket.
+    - The CRUSH map is fetched once with 'ceph osd getcrushmap', all the
+      changes are applied to it with 'crushtool', the placement of every
+      pool and new rule is checked with 'crushtool --test', and the result
+      is injected with a single 'ceph osd setcrushmap'. Everything runs in
+      a single 'cephadm shell' container.
+    - The map is only injected if the CRUSH map wasn't changed since it was
+      read, and if no placement test reports a bad mapping.
+    - Erasure rules are created from their erasure code profile by the
+      monitors, so they are created once the map is injected, each in an
+      OSD map change of its own.
+extends_documentation_fragment:
+    - stackhpc.cephadm.cephadm_common
+options:
+    rules:
+        description:
+            - List of CRUSH rules to manage. See the cephadm_crush_rule
+              module for a description of the rule options.
+        required: false
+        default: []
+        type: list
+        elements: dict
+        suboptions:
+            name:
+                description:
+                    - name of the rule
+                required: true
+                type: str
+            state:
+                description:
+                    - If 'present' is used, the rule is created if it
+                      doesn't exist.
+                      If 'absent' is used, the rule is removed.
+                required: false
+                choices: ['present', 'absent']
+                default: present
+                type: str
+            rule_type:
+                description:
+                    - The ceph CRUSH rule type
+                required: false
+                choices: ['replicated', 'erasure']
+                type: str
+            bucket_root:
+                description:
+                    - The ceph bucket root for replicated rule
+                required: false
+                type: str
+            bucket_type:
+                description:
+                    - The ceph bucket type for replicated rule
+                required: false
+                choices: ['osd', 'host', 'chassis', 'rack', 'row', 'pdu', 'pod',
+                          'room', 'datacenter', 'zone', 'region', 'root']
+                type: str
+            device_class:
+                description:
+                    - The ceph device class for replicated rule
+                required: false
+                type: str
+            profile:
+                description:
+                    - The ceph erasure profile for erasure rule
+                required: false
+                type: str
+    buckets:
+        description:
+            - List of CRUSH buckets to manage.
+        required: false
+        default: []
+        type: list
+        elements: dict
+        suboptions:
+            name:
+                description:
+                    - name of the bucket
+                required: true
+                type: str
+            state:
+                description:
+                    - If 'present' is used, the bucket is created if it
+                      doesn't exist, and moved to I(location) if it isn't
+                      there.
+                      If 'absent' is used, the bucket is removed. It must
+                      be empty.
+                required: false
+                choices: ['present', 'absent']
+                default: present
+                type: str
+            type:
+                description:
+                    - CRUSH type of the bucket, e.g. 'rack'. Required to
+                      create a bucket.
+                required: false
+                type: str
+            location:
+                description:
+                    - Ancestors of the bucket, as a dict of CRUSH type to
+                      bucket name, e.g. the C(root) and C(row) of a rack.
+                required: false
+                default: {}
+                type: dict
+    test_num_rep:
+        description:
+            - Number of replicas the placement of new rules is tested with.
+              Existing pools are tested with their size.
+        required: false
+        default: 3
+        type: int
+    test_max_x:
+        description:
+            - Number of inputs, minus one, placed by each placement test.
+        required: false
+        default: 1023
+        type: int
+'''
+
+EXAMPLES = r'''
+- name: Add a rack level and its rules with one CRUSH map change
+  cephadm_crush_map:
+    buckets:
+      - name: rack1
+        type: rack
+        location:
+          root: default
+      - name: storage-0
+        location:
+          rack: rack1
+    rules:
+      - name: replicated_rack
+        rule_type: replicated
+        bucket_root: default
+        bucket_type: rack
+      - name: old_rule
+        state: absent
+'''
+
+RETURN = r'''
+rules:
+    description: Per rule report, in the order of the I(rules) option.
+    returned: always
+    type: list
+    elements: dict
+buckets:
+    description: Per bucket report, in the order of the I(buckets) option.
+    returned: always
+    type: list
+    elements: dict
+cmds:
+    description: Commands run, or to be run in check mode.
+    returned: always
+    type: list
+    elements: list
+crush_version:
+    description: Version of the CRUSH map the changes were applied to.
+    returned: always
+    type: int
+'''
+
+from ansible.module_utils.basic import AnsibleModule
+from ansible_collections.stackhpc.cephadm.plugins.module_utils.cephadm_common \
+    import CEPHADM_TIMEOUT, CephShell, cephadm_argument_spec, \
+    exec_command_groups, generate_cephadm_shell_cmd, generate_ceph_cmd, \
+    get_timings, parse_json
+from ansible_collections.stackhpc.cephadm.plugins.module_utils.cephadm_crush_rule_common \
+    import RULE_TYPES, create_rule, crush_rule_argument_spec
+
+import datetime
+import json
+
+try:
+    from shlex import quote
+except ImportError:
+    from pipes import quote
+
+# Path of the CRUSH map being edited, in the container
+CRUSHMAP = '/tmp/crushmap'
+
+
+def crushtool(*args):
+    '''
+    Generate a 'crushtool' command editing the CRUSH map in place
+    '''
+
+    return generate_cephadm_shell_cmd() + \
+        ['crushtool', '-i', CRUSHMAP] + list(args) + ['-o', CRUSHMAP]
+
+
+def test_mappings(rule_id, num_rep, max_x):
+    '''
+    Generate a command failing if a rule can't place num_rep replicas
+    '''
+
+    test = ['crushtool', '-i', CRUSHMAP, '--test', '--show-bad-mappings',
+            '--rule', str(rule_id), '--num-rep', str(num_rep),
+            '--min-x', '0', '--max-x', str(max_x)]
+
+    return generate_cephadm_shell_cmd() + [
+        'bash', '-c',
+        'set -o pipefail; {0} 2>&1 | {{ ! grep "bad mapping"; }}'.format(' '.join(quote(a) for a in test))]  # noqa: E501
+
+
+def location_args(location):
+    '''
+    Return the '--loc' arguments of a location
+    '''
+
+    args = []
+    for crush_type, name in sorted(location.items()):
+        args.extend(['--loc', crush_type, name])
+
+    return args
+
+
+def bucket_location(buckets, name):
+    '''
+    Return the ancestors of a bucket, as a dict of CRUSH type to name
+    '''
+
+    parents = {}
+    for bucket in buckets.values():
+        for item in bucket.get('items', []):
+            parents[item['id']] = bucket
+
+    location = {}
+    node = buckets[name]
+    while node['id'] in parents:
+        node = parents[node['id']]
+        location[node['type_name']] = node['name']
+
+    return location
+
+
+def plan_bucket(bucket, buckets):
+    '''
+    Compute the 'crushtool' commands reconciling a bucket
+
+    Return the list of commands and a description of the changes, or None
+    and the reason why the bucket can't be reconciled.
+    '''
+
+    name = bucket['name']
+    running_bucket = buckets.get(name)
+    location = bucket.get('location') or {}
+
+    if bucket['state'] == 'absent':
+        if running_bucket is None:
+            return [], "Bucket {0} doesn't exist".format(name)
+        return [crushtool('--remove-item', name)], 'Bucket {0} removed.'.format(name)  # noqa: E501
+
+    if running_bucket is None:
+        if not bucket.get('type'):
+            return None, "type must be provided to create bucket {0}".format(name)  # noqa: E501
+        return ([crushtool('--add-bucket', name, bucket['type'], *location_args(location))],  # noqa: E501
+                'Bucket {0} created.'.format(name))
+
+    if bucket.get('type') and running_bucket['type_name'] != bucket['type']:
+        return None, 'Can not convert bucket {0} to {1}'.format(name, bucket['type'])  # noqa: E501
+
+    current = bucket_location(buckets, name)
+    if all(current.get(crush_type) == parent
+           for crush_type, parent in location.items()):
+        return [], 'Bucket {0} already exists.'.format(name)
+
+    return ([crushtool('--move', name, *location_args(location))],
+            'Bucket {0} moved.'.format(name))
+
+
+def plan_rule(rule, rules, pools):
+    '''
+    Compute the commands reconciling a rule
+
+    Return the 'crushtool' commands, the commands to run once the map is
+    injected and a description of the changes, or None and the reason why
+    the rule can't be reconciled.
+    '''
+
+    name = rule['name']
+    running_rule = rules.get(name)
+
+    if rule['state'] == 'absent':
+        if running_rule is None:
+            return [], [], "Crush Rule {0} doesn't exist".format(name)
+        users = sorted(pool['pool_name'] for pool in pools
+                       if pool['crush_rule'] == running_rule['rule_id'])
+        if users:
+            return None, None, 'Crush Rule {0} is used by pool(s) {1}'.format(name, ', '.join(users))  # noqa: E501
+        return [crushtool('--remove-rule', name)], [], 'Crush Rule {0} removed.'.format(name)  # noqa: E501
+
+    rule_type = rule.get('rule_type')
+    if running_rule is not None:
+        if rule_type and RULE_TYPES.get(running_rule['type'], rule_type) != rule_type:  # noqa: E501
+            return None, None, 'Can not convert crush rule {0} to {1}'.format(name, rule_type)  # noqa: E501
+        return [], [], 'Crush Rule {0} already exists.'.format(name)
+
+    if rule_type == 'erasure':
+        if not rule.get('profile'):
+            return None, None, 'profile must be provided to create erasure rule {0}'.format(name)  # noqa: E501
+        return [], [create_rule(rule)], 'Crush Rule {0} created.'.format(name)  # noqa: E501
+
+    if rule_type != 'replicated' or not (rule.get('bucket_root') and rule.get('bucket_type')):  # noqa: E501
+        return None, None, "rule_type, bucket_root and bucket_type must be provided to create rule {0}".format(name)  # noqa: E501
+
+    args = ['--create-replicated-rule', name, rule['bucket_root'],
+            rule['bucket_type']]
+    if rule.get('device_class'):
+        args.extend(['--device-class', rule['device_class']])
+
+    return [crushtool(*args)], [], 'Crush Rule {0} created.'.format(name)
+
+
+def plan_report(name, cmd_list, stdout):
+    '''
+    Return the report of a planned bucket or rule
+    '''
+
+    return dict(name=name, changed=bool(cmd_list), cmds=cmd_list or [],
+                rc=0 if cmd_list is not None else 1, stdout=stdout,
+                stderr='')
+
+
+def new_rule_ids(rules, count):
+    '''
+    Return the ids 'crushtool' gives to count new rules, the lowest free ones
+    '''
+
+    used = set(rule['rule_id'] for rule in rules.values())
+    ids = []
+    rule_id = 0
+    while len(ids) < count:
+        if rule_id not in used:
+            ids.append(rule_id)
+        rule_id += 1
+
+    return ids
+
+
+def run_module():
+    rule_options = crush_rule_argument_spec()
+    module_args = dict(
+        rules=dict(type='list', elements='dict', required=False, default=[],
+                   options=rule_options),
+        buckets=dict(type='list', elements='dict', required=False,
+                     default=[],
+                     options=dict(
+                         name=dict(type='str', required=True),
+                         state=dict(type='str', required=False,
+                                    default='present',
+                                    choices=['present', 'absent']),
+                         type=dict(type='str', required=False),
+                         location=dict(type='dict', required=False,
+                                       default={}),
+                     )),
+        test_num_rep=dict(type='int', required=False, default=3),
+        test_max_x=dict(type='int', required=False, default=1023),
+    )
+    module_args.update(cephadm_argument_spec())
+
+    module = AnsibleModule(
+        argument_spec=module_args,
+        supports_check_mode=True
+    )
+
+    startd = datetime.datetime.now()
+
+    crush_results, osd_results = exec_command_groups(module, [
+        [generate_ceph_cmd(sub_cmd=['osd', 'crush', 'dump'],
+                           args=['-f', 'json'])],
+        [generate_ceph_cmd(sub_cmd=['osd', 'dump'], args=['-f', 'json'])],
+    ])
+    for results in (crush_results, osd_results):
+        rc, cmd, out, err = results[0]
+        if rc != 0:
+            module.fail_json(msg="Couldn't read the CRUSH map", cmd=cmd,
+                             rc=rc, stdout=out, stderr=err,
+                             timings=get_timings(module))
+    crush = json.loads(crush_results[0][2])
+    osd_dump = parse_json(osd_results[0][2],
+                          ['crush_version', 'pools.*.pool_name',
+                           'pools.*.crush_rule', 'pools.*.size'])
+    buckets = dict((bucket['name'], bucket) for bucket in crush['buckets'])
+    rules = dict((rule['rule_name'], rule) for rule in crush['rules'])
+
+    report = dict(
+        buckets=[plan_report(bucket['name'], *plan_bucket(bucket, buckets))
+                 for bucket in module.params['buckets']],
+        rules=[],
+    )
+    post_reports = []
+    for rule in module.params['rules']:
+        cmd_list, post_list, stdout = plan_rule(rule, rules,
+                                                osd_dump['pools'])
+        rule_report = plan_report(rule['name'], cmd_list, stdout)
+        if post_list:
+            rule_report.update(changed=True, cmds=post_list)
+            post_reports.append(rule_report)
+        report['rules'].append(rule_report)
+
+    # Buckets are added and moved before the rules taking them are created,
+    # and removed once the rules are. Rules are created before any is
+    # removed, so that new_rule_ids() predicts their ids.
+    def edits_of(kind, state):
+        return [object_report
+                for obj, object_report in zip(module.params[kind], report[kind])  # noqa: E501
+                if obj['state'] == state and object_report['changed'] and
+                object_report not in post_reports]
+    new_rules = edits_of('rules', 'present')
+    edit_reports = edits_of('buckets', 'present') + new_rules + \
+        edits_of('rules', 'absent') + edits_of('buckets', 'absent')
+
+    # (report, command) run in order in the container, a report of None
+    # stands for a step shared by all the edits
+    steps = []
+    crush_version = osd_dump.get('crush_version')
+    inject = None
+    if edit_reports:
+        steps.append((None, generate_ceph_cmd(sub_cmd=['osd', 'getcrushmap'],
+                                              args=['-o', CRUSHMAP])))
+        steps.extend((object_report, cmd) for object_report in edit_reports
+                     for cmd in object_report['cmds'])
+
+        # Every pool must still be placed, and the new rules too
+        tests = set((pool['crush_rule'], pool['size'])
+                    for pool in osd_dump['pools'])
+        tests.update((rule_id, module.params['test_num_rep'])
+                     for rule_id in new_rule_ids(rules, len(new_rules)))
+        steps.extend((None, test_mappings(rule_id, num_rep,
+                                          module.params['test_max_x']))
+                     for rule_id, num_rep in sorted(tests))
+
+        # Fails if the CRUSH map was changed since it was read
+        args = ['-i', CRUSHMAP]
+        if crush_version is not None:
+            args.append(str(crush_version))
+        inject = generate_ceph_cmd(sub_cmd=['osd', 'setcrushmap'], args=args)
+        steps.append((None, inject))
+    steps.extend((rule_report, cmd) for rule_report in post_reports
+                 for cmd in rule_report['cmds'])
+
+    failed = [object_report['name']
+              for kind in ('buckets', 'rules')
+              for object_report in report[kind] if object_report['rc'] != 0]
+
+    if not module.check_mode and steps:
+        # The edits only take effect once the map is injected
+        for object_report in edit_reports + post_reports:
+            object_report['changed'] = False
+
+        with CephShell(module, timeout=CEPHADM_TIMEOUT * len(steps)) as shell:  # noqa: E501
+            for object_report, step in steps:
+                rc, cmd, out, err = shell.run(step)
+                if rc == 0:
+                    for owner in (edit_reports if step is inject else
+                                  [object_report] if object_report in post_reports else []):  # noqa: E501
+                        owner['changed'] = True
+                    continue
+
+                # A failure until the map is injected fails all the edits,
+                # and the erasure rules aren't created.
+                owners = [object_report]
+                if object_report not in post_reports:
+                    owners = edit_reports + post_reports
+                for owner in owners:
+                    owner.update(rc=rc, stderr=err.rstrip("\r\n"),
+                                 stdout=out.rstrip("\r\n") or 'Not applied')
+                    failed.append(owner['name'])
+                if object_report not in post_reports:
+                    break
+
+    endd = datetime.datetime.now()
+    result = dict(
+        changed=any(object_report['changed']
+                    for kind in ('buckets', 'rules')
+                    for object_report in report[kind]),
+        cmds=[cmd for object_report, cmd in steps],
+        crush_version=crush_version,
+        start=str(startd),
+        end=str(endd),
+        delta=str(endd - startd),
+        rc=0,
+        timings=get_timings(module),
+        **report
+    )
+
+    if failed:
+        result['rc'] = 1
+        module.fail_json(msg="Couldn't reconcile: {0}".format(', '.join(failed)), **result)  # noqa: E501
+
+    module.exit_json(**result)
+
+
+def main():
+    run_module()
+
+
+if __name__ == '__main__':
+    main()
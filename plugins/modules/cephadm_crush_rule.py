@@ -27,9 +27,14 @@ short_description: Manage Ceph Crush Replicated/Erasure Rule
 version_added: "1.4.0"
 description:
     - Manage Ceph Crush rule(s) creation, deletion and updates.
+    - In check mode, the rule is read once and the commands which would
+      run are reported in C(cmds), along with a diff of its settings.
 author:
     - Dimitri Savineau <dsavinea@redhat.com>
     - Michal Nasiadka <michal@stackhpc.com>
+extends_documentation_fragment:
+    - stackhpc.cephadm.cephadm_common
+    - stackhpc.cephadm.cephadm_common.fingerprint
 options:
     name:
         description:
@@ -75,6 +80,14 @@ options:
             - The ceph erasure profile for erasure rule.
         required: false
         type: str
+    cluster_snapshot:
+        description:
+            - Read the existing rule from a snapshot of the OSD map cached
+              on the host, keyed by cluster fsid and OSD map epoch. The
+              snapshot is only fetched again once the OSD map has changed.
+        required: false
+        default: false
+        type: bool
 '''
 
 EXAMPLES = '''
@@ -108,81 +121,47 @@ RETURN = '''#  '''
 
 from ansible.module_utils.basic import AnsibleModule
 from ansible_collections.stackhpc.cephadm.plugins.module_utils.cephadm_common \
-    import generate_ceph_cmd, exec_command, exit_module
+    import cephadm_argument_spec, check_fingerprint, exec_command, \
+    exit_check_mode, exit_module, fingerprint_argument_spec, \
+    get_cluster_snapshot, get_timings, store_fingerprint
+from ansible_collections.stackhpc.cephadm.plugins.module_utils.cephadm_crush_rule_common \
+    import create_rule, crush_rule_argument_spec, get_rule, plan_crush_rule, \
+    remove_rule, rule_diff
 
 import datetime
 import json
 
 
-def create_rule(module, container_image=None):
+def get_running_rule(module):
     '''
-    Create a new crush replicated/erasure rule
+    Get existing crush rule, from the cluster snapshot if enabled
     '''
 
-    name = module.params.get('name')
-    rule_type = module.params.get('rule_type')
-    bucket_root = module.params.get('bucket_root')
-    bucket_type = module.params.get('bucket_type')
-    device_class = module.params.get('device_class')
-    profile = module.params.get('profile')
-
-    if rule_type == 'replicated':
-        args = ['create-replicated', name, bucket_root, bucket_type]
-        if device_class:
-            args.append(device_class)
-    else:
-        args = ['create-erasure', name]
-        if profile:
-            args.append(profile)
-
-    cmd = generate_ceph_cmd(['osd', 'crush', 'rule'],
-                            args)
+    cmd = get_rule(module.params.get('name'))
 
-    return cmd
+    if module.params.get('cluster_snapshot'):
+        snapshot = get_cluster_snapshot(module)
+        if snapshot is not None:
+            name = module.params.get('name')
+            rule = snapshot['crush_rules'].get(name)
+            if rule is None:
+                return 2, cmd, '', "Error ENOENT: unknown crush rule '{0}'".format(name)  # noqa: E501
+            return 0, cmd, json.dumps(rule), ''
 
-
-def get_rule(module, container_image=None):
-    '''
-    Get existing crush rule
-    '''
-
-    name = module.params.get('name')
-
-    args = ['dump', name, '--format=json']
-
-    cmd = generate_ceph_cmd(['osd', 'crush', 'rule'],
-                            args)
-
-    return cmd
-
-
-def remove_rule(module, container_image=None):
-    '''
-    Remove a crush rule
-    '''
-
-    name = module.params.get('name')
-
-    args = ['rm', name]
-
-    cmd = generate_ceph_cmd(['osd', 'crush', 'rule'],
-                            args)
-
-    return cmd
+    return exec_command(module, cmd)
 
 
 def main():
+    argument_spec = crush_rule_argument_spec()
+    argument_spec.update(
+        state=dict(type='str', required=False, choices=['present', 'absent', 'info'], default='present'),  # noqa: E501
+        cluster_snapshot=dict(type='bool', required=False, default=False)
+    )
+    argument_spec.update(cephadm_argument_spec())
+    argument_spec.update(fingerprint_argument_spec())
+
     module = AnsibleModule(
-        argument_spec=dict(
-            name=dict(type='str', required=True),
-            state=dict(type='str', required=False, choices=['present', 'absent', 'info'], default='present'),  # noqa: E501
-            rule_type=dict(type='str', required=False, choices=['replicated', 'erasure']),  # noqa: E501
-            bucket_root=dict(type='str', required=False),
-            bucket_type=dict(type='str', required=False, choices=['osd', 'host', 'chassis', 'rack', 'row', 'pdu', 'pod',  # noqa: E501
-                                                                  'room', 'datacenter', 'zone', 'region', 'root']),  # noqa: E501
-            device_class=dict(type='str', required=False),
-            profile=dict(type='str', required=False)
-        ),
+        argument_spec=argument_spec,
         supports_check_mode=True,
         required_if=[
             ('state', 'present', ['rule_type']),
@@ -196,41 +175,54 @@ def main():
     state = module.params.get('state')
     rule_type = module.params.get('rule_type')
 
-    if module.check_mode:
-        module.exit_json(
-            changed=False,
-            stdout='',
-            stderr='',
-            rc=0,
-            start='',
-            end='',
-            delta='',
-        )
-
     startd = datetime.datetime.now()
     changed = False
 
+    # In check mode, the changes are computed from a single read of the
+    # running rule, without running any command changing the cluster.
+    if module.check_mode and state in ('present', 'absent'):
+        rc, cmd, out, err = get_running_rule(module)
+        running_rules = {}
+        if rc == 0:
+            running_rules[name] = json.loads(out)
+        cmd_list, out = plan_crush_rule(module.params, running_rules)
+        before, after = rule_diff(module.params, running_rules.get(name))
+        exit_check_mode(module, cmd_list, out, before, after, startd)
+
+    fingerprint, epoch = None, None
+    if state in ('present', 'absent'):
+        fingerprint, epoch, unchanged = check_fingerprint(
+            module, 'crush_rule', name, list(crush_rule_argument_spec()))
+        if unchanged:
+            exit_module(module=module,
+                        out="Crush Rule {0} is unchanged since it was last applied.".format(name),  # noqa: E501
+                        rc=0, cmd=[], err='', startd=startd)
+
     if state == "present":
-        rc, cmd, out, err = exec_command(module, get_rule(module))  # noqa: E501
+        rc, cmd, out, err = get_running_rule(module)
         if rc != 0:
-            rc, cmd, out, err = exec_command(module, create_rule(module))  # noqa: E501
+            rc, cmd, out, err = exec_command(module, create_rule(module.params))  # noqa: E501
             changed = True
         else:
             rule = json.loads(out)
             if (rule['type'] == 1 and rule_type == 'erasure') or (rule['type'] == 3 and rule_type == 'replicated'):  # noqa: E501
-                module.fail_json(msg="Can not convert crush rule {0} to {1}".format(str(name), str(rule_type)), changed=False, rc=1)  # noqa: E501
+                module.fail_json(msg="Can not convert crush rule {0} to {1}".format(str(name), str(rule_type)), changed=False, rc=1, timings=get_timings(module))  # noqa: E501
 
     elif state == "absent":
-        rc, cmd, out, err = exec_command(module, get_rule(module))  # noqa: E501
+        rc, cmd, out, err = get_running_rule(module)
         if rc == 0:
-            rc, cmd, out, err = exec_command(module, remove_rule(module))  # noqa: E501
+            rc, cmd, out, err = exec_command(module, remove_rule(name))  # noqa: E501
             changed = True
         else:
             rc = 0
             out = "Crush Rule {0} doesn't exist".format(name)
 
     elif state == "info":
-        rc, cmd, out, err = exec_command(module, get_rule(module))  # noqa: E501
+        rc, cmd, out, err = get_running_rule(module)
+
+    if rc == 0:
+        store_fingerprint(module, 'crush_rule', name, fingerprint,
+                          None if changed else epoch)
 
     exit_module(module=module, out=out, rc=rc, cmd=cmd, err=err, startd=startd, changed=changed)  # noqa: E501
 
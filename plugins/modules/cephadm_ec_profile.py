@@ -30,6 +30,12 @@ version_added: "1.4.0"
 
 description:
     - Manage Ceph Erasure Code profile
+    - In check mode, the profile is read once and the commands which would
+      run are reported in C(cmds), along with a diff of its settings.
+
+extends_documentation_fragment:
+    - stackhpc.cephadm.cephadm_common
+    - stackhpc.cephadm.cephadm_common.fingerprint
 options:
     name:
         description:
@@ -72,6 +78,11 @@ options:
               loaded.
         required: false
         type: str
+    crush_root:
+        description:
+            - Name of the CRUSH root the rule of the profile starts from.
+        required: false
+        type: str
     crush_device_class:
         description:
             - Restrict placement to devices of a specific class (hdd/ssd)
@@ -82,6 +93,14 @@ options:
             - Set the failure domain for the CRUSH rule (e.g., 'rack', 'host', 'osd')
         required: false
         type: str
+    cluster_snapshot:
+        description:
+            - Read the existing profile from a snapshot of the OSD map cached
+              on the host, keyed by cluster fsid and OSD map epoch. The
+              snapshot is only fetched again once the OSD map has changed.
+        required: false
+        default: false
+        type: bool
 
 author:
     - Guillaume Abrioux <gabrioux@redhat.com>
@@ -110,7 +129,13 @@ EXAMPLES = '''
 
 from ansible.module_utils.basic import AnsibleModule
 from ansible_collections.stackhpc.cephadm.plugins.module_utils.cephadm_common \
-    import generate_ceph_cmd, exec_command, exit_module
+    import cephadm_argument_spec, check_fingerprint, exec_command, \
+    exit_check_mode, exit_module, fingerprint_argument_spec, \
+    get_cluster_snapshot, store_fingerprint
+from ansible_collections.stackhpc.cephadm.plugins.module_utils.cephadm_ec_profile_common \
+    import create_profile_from_params, delete_profile, \
+    ec_profile_argument_spec, get_profile, plan_ec_profile, profile_diff, \
+    profile_needs_update
 
 import datetime
 import json
@@ -119,70 +144,31 @@ import json
 RETURN = '''#  '''
 
 
-def get_profile(module, name):
-    '''
-    Get existing profile
-    '''
-
-    args = ['get', name, '--format=json']
-
-    cmd = generate_ceph_cmd(sub_cmd=['osd', 'erasure-code-profile'],
-                            args=args)
-
-    return cmd
-
-
-def create_profile(module, name, k, m, stripe_unit, crush_device_class, crush_failure_domain, directory, plugin, force=False):  # noqa: E501
+def get_running_profile(module, name):
     '''
-    Create a profile
+    Get existing profile, from the cluster snapshot if enabled
     '''
 
-    args = ['set', name, 'k={0}'.format(k), 'm={0}'.format(m)]
-    if stripe_unit:
-        args.append('stripe_unit={0}'.format(stripe_unit))
-    if crush_device_class:
-        args.append('crush-device-class={0}'.format(crush_device_class))
-    if crush_failure_domain:
-        args.append('crush-failure-domain={0}'.format(crush_failure_domain))
-    if directory:
-        args.append('directory={0}'.format(plugin))
-    if plugin:
-        args.append('plugin={0}'.format(plugin))
-    if force:
-        args.append('--force')
+    cmd = get_profile(name)
 
-    cmd = generate_ceph_cmd(sub_cmd=['osd', 'erasure-code-profile'],
-                            args=args)
+    if module.params.get('cluster_snapshot'):
+        snapshot = get_cluster_snapshot(module)
+        if snapshot is not None:
+            profile = snapshot['erasure_code_profiles'].get(name)
+            if profile is None:
+                return 2, cmd, '', "Error ENOENT: unknown erasure code profile '{0}'".format(name)  # noqa: E501
+            return 0, cmd, json.dumps(profile), ''
 
-    return cmd
-
-
-def delete_profile(module, name):
-    '''
-    Delete a profile
-    '''
-
-    args = ['rm', name]
-
-    cmd = generate_ceph_cmd(sub_cmd=['osd', 'erasure-code-profile'],
-                            args=args)
-
-    return cmd
+    return exec_command(module, cmd)
 
 
 def run_module():
-    module_args = dict(
-        name=dict(type='str', required=True),
-        state=dict(type='str', required=False,
-                   choices=['present', 'absent'], default='present'),
-        stripe_unit=dict(type='str', required=False),
-        k=dict(type='str', required=False),
-        m=dict(type='str', required=False),
-        crush_device_class=dict(type='str', required=False),
-        crush_failure_domain=dict(type='str', required=False),
-        directory=dict(type='str', required=False),
-        plugin=dict(type='str', required=False),
+    module_args = ec_profile_argument_spec()
+    module_args.update(
+        cluster_snapshot=dict(type='bool', required=False, default=False),
     )
+    module_args.update(cephadm_argument_spec())
+    module_args.update(fingerprint_argument_spec())
 
     module = AnsibleModule(
         argument_spec=module_args,
@@ -193,69 +179,50 @@ def run_module():
     # Gather module parameters in variables
     name = module.params.get('name')
     state = module.params.get('state')
-    stripe_unit = module.params.get('stripe_unit')
-    k = module.params.get('k')
-    m = module.params.get('m')
-    crush_device_class = module.params.get('crush_device_class')
-    crush_failure_domain = module.params.get('crush_failure_domain')
-    directory = module.params.get('directory')
-    plugin = module.params.get('plugin')
-
-    if module.check_mode:
-        module.exit_json(
-            changed=False,
-            stdout='',
-            stderr='',
-            rc=0,
-            start='',
-            end='',
-            delta='',
-        )
 
     startd = datetime.datetime.now()
     changed = False
 
+    # In check mode, the changes are computed from a single read of the
+    # running profile, without running any command changing the cluster.
+    if module.check_mode:
+        rc, cmd, out, err = get_running_profile(module, name)
+        running_profiles = {}
+        if rc == 0:
+            running_profiles[name] = json.loads(out)
+        cmd_list, out = plan_ec_profile(module.params, running_profiles)
+        before, after = profile_diff(module.params, running_profiles.get(name))  # noqa: E501
+        exit_check_mode(module, cmd_list, out, before, after, startd)
+
+    fingerprint, epoch = None, None
+    if state in ('present', 'absent'):
+        fingerprint, epoch, unchanged = check_fingerprint(
+            module, 'ec_profile', name, list(ec_profile_argument_spec()))
+        if unchanged:
+            exit_module(module=module,
+                        out="Profile {0} is unchanged since it was last applied.".format(name),  # noqa: E501
+                        rc=0, cmd=[], err='', startd=startd)
+
     if state == "present":
-        rc, cmd, out, err = exec_command(module, get_profile(module, name))  # noqa: E501
+        rc, cmd, out, err = get_running_profile(module, name)
         if rc == 0:
             # the profile already exists, let's check whether we have to
             # update it
             current_profile = json.loads(out)
-            if current_profile['k'] != k or \
-               current_profile['m'] != m or \
-               current_profile.get('stripe_unit', stripe_unit) != stripe_unit or \
-               current_profile.get('crush-device-class', crush_device_class) != crush_device_class or \
-               current_profile.get('crush-failure-domain', crush_failure_domain) != crush_failure_domain or \
-               current_profile.get('directory', directory) != directory or \
-               current_profile.get('plugin', plugin) != plugin:  # noqa: E501
+            if profile_needs_update(current_profile, module.params):
                 rc, cmd, out, err = exec_command(module,
-                                                 create_profile(module,
-                                                                name,
-                                                                k,
-                                                                m,
-                                                                stripe_unit,
-                                                                crush_device_class,  # noqa: E501
-                                                                crush_failure_domain,
-                                                                directory,
-                                                                plugin,
-                                                                force=True))  # noqa: E501
+                                                 create_profile_from_params(module.params,  # noqa: E501
+                                                                            force=True))  # noqa: E501
                 changed = True
         else:
             # the profile doesn't exist, it has to be created
-            rc, cmd, out, err = exec_command(module, create_profile(module,
-                                                                    name,
-                                                                    k,
-                                                                    m,
-                                                                    stripe_unit,  # noqa: E501
-                                                                    crush_device_class,  # noqa: E501
-                                                                    crush_failure_domain,
-                                                                    directory,
-                                                                    plugin))
+            rc, cmd, out, err = exec_command(module,
+                                             create_profile_from_params(module.params))  # noqa: E501
             if rc == 0:
                 changed = True
 
     elif state == "absent":
-        rc, cmd, out, err = exec_command(module, delete_profile(module, name))  # noqa: E501
+        rc, cmd, out, err = exec_command(module, delete_profile(name))  # noqa: E501
         if not err:
             out = 'Profile {0} removed.'.format(name)
             changed = True
@@ -263,6 +230,10 @@ def run_module():
             rc = 0
             out = "Skipping, the profile {0} doesn't exist".format(name)
 
+    if rc == 0:
+        store_fingerprint(module, 'ec_profile', name, fingerprint,
+                          None if changed else epoch)
+
     exit_module(module=module, out=out, rc=rc, cmd=cmd, err=err, startd=startd, changed=changed)  # noqa: E501
 
 
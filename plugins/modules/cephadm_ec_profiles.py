@@ -0,0 +1,247 @@
+#!/usr/bin/python
+
+# Copyright 2026, StackHPC, Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+DOCUMENTATION = r'''
+module: cephadm_ec_profiles
+author:
+    - StackHPC Ltd. (@stackhpc)
+short_description: Manage a list of Ceph Erasure Code profiles
+version_added: "1.24.0"
+description:
+    - Manage the creation, deletion and updates of a list of erasure code
+      profiles in a single invocation.
+    - All the profiles are read in a single 'cephadm shell' container, and
+      only the profiles which really differ are set again, in another one.
+    - Both the running and the desired profiles are compared once
+      normalised, e.g. numbers and sizes in canonical form, and only on the
+      settings given for the profile. Settings left out keep whatever
+      default the cluster or the erasure code plugin gave them.
+extends_documentation_fragment:
+    - stackhpc.cephadm.cephadm_common
+options:
+    ec_profiles:
+        description:
+            - List of erasure code profiles to manage. See the
+              cephadm_ec_profile module for a description of the profile
+              options.
+        required: true
+        type: list
+        elements: dict
+        suboptions:
+            name:
+                description:
+                    - name of the profile.
+                required: true
+                type: str
+            state:
+                description:
+                    - If 'present' is used, the profile is created, or set
+                      again if it differs.
+                      If 'absent' is used, the profile is deleted.
+                required: false
+                choices: ['present', 'absent']
+                default: present
+                type: str
+            stripe_unit:
+                description:
+                    - The amount of data in a data chunk, per stripe.
+                required: false
+                type: str
+            k:
+                description:
+                    - Number of data-chunks the object will be split in
+                required: false
+                type: str
+            m:
+                description:
+                    - Number of coding chunks computed for each object.
+                required: false
+                type: str
+            plugin:
+                description:
+                    - Erasure code plugin computing the coding chunks.
+                required: false
+                type: str
+            directory:
+                description:
+                    - Set the directory name from which the erasure code
+                      plugin is loaded.
+                required: false
+                type: str
+            crush_root:
+                description:
+                    - Name of the CRUSH root the rule of the profile
+                      starts from.
+                required: false
+                type: str
+            crush_device_class:
+                description:
+                    - Restrict placement to devices of a specific class
+                required: false
+                type: str
+            crush_failure_domain:
+                description:
+                    - Set the failure domain for the CRUSH rule
+                required: false
+                type: str
+    cluster_snapshot:
+        description:
+            - Read the profiles from a snapshot of the OSD map cached on the
+              host, keyed by cluster fsid and OSD map epoch. The snapshot is
+              only fetched again once the OSD map has changed.
+        required: false
+        default: false
+        type: bool
+'''
+
+EXAMPLES = r'''
+- name: Ensure erasure code profiles are defined
+  cephadm_ec_profiles:
+    ec_profiles:
+      - name: ec42
+        k: 4
+        m: 2
+        crush_device_class: hdd
+      - name: old
+        state: absent
+'''
+
+RETURN = r'''
+ec_profiles:
+    description: Per profile report, in the order of the I(ec_profiles) option.
+    returned: always
+    type: list
+    elements: dict
+    contains:
+        name:
+            description: Name of the profile.
+            type: str
+        changed:
+            description: Whether the profile has been changed.
+            type: bool
+        cmds:
+            description: Commands run, or to be run in check mode.
+            type: list
+            elements: list
+        rc:
+            description: Return code of the last command run.
+            type: int
+        stdout:
+            description: Description of the changes, or of the failure.
+            type: str
+        stderr:
+            description: Error output of the last command run.
+            type: str
+'''
+
+from ansible.module_utils.basic import AnsibleModule
+from ansible_collections.stackhpc.cephadm.plugins.module_utils.cephadm_common \
+    import cephadm_argument_spec, exec_command_groups, get_timings
+from ansible_collections.stackhpc.cephadm.plugins.module_utils.cephadm_ec_profile_common \
+    import ec_profile_argument_spec, get_running_profiles, plan_ec_profile
+
+import datetime
+
+
+def run_module():
+    module_args = dict(
+        ec_profiles=dict(type='list', elements='dict', required=True,
+                         options=ec_profile_argument_spec()),
+        cluster_snapshot=dict(type='bool', required=False, default=False)
+    )
+    module_args.update(cephadm_argument_spec())
+
+    module = AnsibleModule(
+        argument_spec=module_args,
+        supports_check_mode=True
+    )
+
+    profiles = module.params.get('ec_profiles')
+
+    startd = datetime.datetime.now()
+
+    (rc, cmd, out, err), running_profiles = get_running_profiles(
+        module, [profile['name'] for profile in profiles])
+    if rc != 0:
+        module.fail_json(msg="Couldn't read the erasure code profiles",
+                         cmd=cmd, rc=rc, stdout=out, stderr=err,
+                         timings=get_timings(module))
+
+    plans = [plan_ec_profile(profile, running_profiles)
+             for profile in profiles]
+
+    if module.check_mode:
+        group_results = [None for plan in plans]
+    else:
+        # Profiles are independent from each other, their commands can run
+        # concurrently.
+        group_results = iter(exec_command_groups(module,
+                                                 [cmd_list for cmd_list, report in plans if cmd_list],  # noqa: E501
+                                                 parallel=True))
+        group_results = [next(group_results, []) if cmd_list else None
+                         for cmd_list, report in plans]
+
+    report = []
+    failed = []
+    for profile, (cmd_list, stdout), results in zip(profiles, plans, group_results):  # noqa: E501
+        profile_report = dict(name=profile['name'],
+                              changed=bool(cmd_list), cmds=cmd_list or [],
+                              rc=0, stdout=stdout, stderr='')
+        if cmd_list is None:
+            profile_report['rc'] = 1
+            failed.append(profile['name'])
+        elif results is None:
+            pass
+        elif not results:
+            # The commands didn't run, e.g. the container couldn't start
+            profile_report.update(changed=False, rc=1, stdout='Not applied')
+            failed.append(profile['name'])
+        else:
+            rc, cmd, out, err = results[-1]
+            profile_report.update(changed=results[0][0] == 0, rc=rc,
+                                  stderr=err.rstrip("\r\n"))
+            if rc != 0 or len(results) != len(cmd_list):
+                profile_report['stdout'] = out.rstrip("\r\n")
+                failed.append(profile['name'])
+        report.append(profile_report)
+
+    endd = datetime.datetime.now()
+    result = dict(
+        changed=any(profile_report['changed'] for profile_report in report),
+        ec_profiles=report,
+        start=str(startd),
+        end=str(endd),
+        delta=str(endd - startd),
+        rc=0,
+        timings=get_timings(module),
+    )
+
+    if failed:
+        result['rc'] = 1
+        module.fail_json(msg="Couldn't reconcile profile(s): {0}".format(', '.join(failed)), **result)  # noqa: E501
+
+    module.exit_json(**result)
+
+
+def main():
+    run_module()
+
+
+if __name__ == '__main__':
+    main()
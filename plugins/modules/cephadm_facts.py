@@ -0,0 +1,228 @@
+#!/usr/bin/python
+
+# Copyright 2026, StackHPC, Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+DOCUMENTATION = r'''
+module: cephadm_facts
+author:
+    - StackHPC Ltd. (@stackhpc)
+short_description: Gather facts about a Ceph cluster
+version_added: "1.24.0"
+description:
+    - Gather the fsid, versions, health, monitor and manager maps, OSD
+      tree, pools, device classes and usage of the cluster, in a single
+      'cephadm shell' container.
+    - The facts are returned under C(ansible_facts.cephadm), along with the
+      time the oldest of them was gathered in C(collected_at).
+    - With I(cache_ttl), the subsets are cached on the host, in the
+      /var/run/ceph directory of the cluster, and only the subsets older
+      than I(cache_ttl) seconds are gathered again. The module runs on the
+      host, it doesn't use the fact cache of the controller.
+extends_documentation_fragment:
+    - stackhpc.cephadm.cephadm_common
+options:
+    gather_subset:
+        description:
+            - Facts to gather, 'all' gathers all of them.
+        required: false
+        default: ['all']
+        type: list
+        elements: str
+        choices: ['all', 'fsid', 'versions', 'health', 'mon_map', 'mgr_map',
+                  'osd_tree', 'pools', 'device_classes', 'df']
+    cache_ttl:
+        description:
+            - Number of seconds the subsets gathered are reused for, 0
+              disables the cache. The cache is only used if /etc/ceph/ceph.conf
+              holds the fsid of the cluster and its /var/run/ceph directory
+              exists.
+        required: false
+        default: 0
+        type: int
+'''
+
+EXAMPLES = r'''
+- name: Gather cluster facts
+  cephadm_facts:
+
+- name: Gather the fsid unless it is known
+  cephadm_facts:
+    gather_subset:
+      - fsid
+  when: ansible_facts.cephadm.fsid is not defined
+
+- name: Gather the OSD tree and pools, at most every 10 minutes
+  cephadm_facts:
+    gather_subset:
+      - osd_tree
+      - pools
+    cache_ttl: 600
+'''
+
+RETURN = r'''
+ansible_facts:
+    description: Facts about the cluster.
+    returned: always
+    type: dict
+    contains:
+        cephadm:
+            description: The subsets gathered, keyed by name, and
+              C(collected_at), the time the oldest of them was gathered as
+              seconds since the epoch.
+            type: dict
+cached:
+    description: Subsets read from the cache instead of the cluster.
+    returned: always
+    type: list
+    elements: str
+'''
+
+from ansible.module_utils.basic import AnsibleModule
+from ansible_collections.stackhpc.cephadm.plugins.module_utils.cephadm_common \
+    import SNAPSHOT_DIR, cephadm_argument_spec, exec_command_groups, \
+    generate_ceph_cmd, get_local_fsid, get_timings, read_snapshot, \
+    write_snapshot
+
+import json
+import os
+import time
+
+FACTS_CACHE_FILE = 'ansible_facts_cache.json'
+
+
+def mgr_map(data):
+    '''
+    Drop the descriptions of the modules every manager can run, which make
+    most of the manager map
+    '''
+
+    data.pop('available_modules', None)
+    for standby in data.get('standbys', []):
+        standby.pop('available_modules', None)
+
+    return data
+
+
+# subset: ('ceph' sub command, post-processing of its JSON output)
+SUBSETS = {
+    'fsid': (['fsid'], lambda data: data['fsid']),
+    'versions': (['versions'], None),
+    'health': (['health'], None),
+    'mon_map': (['mon', 'dump'], None),
+    'mgr_map': (['mgr', 'dump'], mgr_map),
+    'osd_tree': (['osd', 'tree'], None),
+    'pools': (['osd', 'pool', 'ls', 'detail'], None),
+    'device_classes': (['osd', 'crush', 'class', 'ls'], None),
+    'df': (['df'], None),
+}
+
+
+def facts_cache_path():
+    '''
+    Return the path of the facts cache of the local cluster, or None
+    '''
+
+    fsid = get_local_fsid()
+    if not fsid or not os.path.isdir(os.path.join(SNAPSHOT_DIR, fsid)):
+        return None
+
+    return os.path.join(SNAPSHOT_DIR, fsid, FACTS_CACHE_FILE)
+
+
+def read_facts_cache(path, ttl, now):
+    '''
+    Return the cached subsets gathered less than ttl seconds ago, as
+    {subset: {'collected_at': time, 'data': facts}}
+    '''
+
+    cache = read_snapshot(path) if path else None
+    if not isinstance(cache, dict):
+        return {}
+
+    return dict((subset, entry)
+                for subset, entry in cache.items()
+                if subset in SUBSETS and isinstance(entry, dict) and
+                0 <= now - entry.get('collected_at', 0) < ttl)
+
+
+def run_module():
+    module_args = dict(
+        gather_subset=dict(type='list', elements='str', required=False,
+                           default=['all'],
+                           choices=['all'] + sorted(SUBSETS)),
+        cache_ttl=dict(type='int', required=False, default=0),
+    )
+    module_args.update(cephadm_argument_spec())
+
+    module = AnsibleModule(
+        argument_spec=module_args,
+        supports_check_mode=True
+    )
+
+    subsets = sorted(SUBSETS)
+    if 'all' not in module.params['gather_subset']:
+        subsets = sorted(set(module.params['gather_subset']))
+
+    collected_at = round(time.time(), 3)
+    cache_path = None
+    cache = {}
+    if module.params['cache_ttl'] > 0:
+        cache_path = facts_cache_path()
+        cache = read_facts_cache(cache_path, module.params['cache_ttl'],
+                                 collected_at)
+    cached = [subset for subset in subsets if subset in cache]
+    gather = [subset for subset in subsets if subset not in cache]
+
+    results = exec_command_groups(
+        module,
+        [[generate_ceph_cmd(sub_cmd=SUBSETS[subset][0], args=['-f', 'json'])]  # noqa: E501
+         for subset in gather],
+        parallel=True)
+    results = iter(results)
+
+    for subset in gather:
+        group = next(results, [])
+        cmd = generate_ceph_cmd(sub_cmd=SUBSETS[subset][0],
+                                args=['-f', 'json'])
+        rc, cmd, out, err = group[0] if group else (1, cmd, '', 'Not run')
+        if rc != 0:
+            module.fail_json(msg="Couldn't gather {0}".format(subset),
+                             cmd=cmd, rc=rc, stdout=out, stderr=err,
+                             timings=get_timings(module))
+        data = json.loads(out)
+        process = SUBSETS[subset][1]
+        cache[subset] = dict(collected_at=collected_at,
+                             data=process(data) if process else data)
+
+    if cache_path and gather:
+        write_snapshot(cache_path, cache)
+
+    facts = dict((subset, cache[subset]['data']) for subset in subsets)
+    facts['collected_at'] = min(cache[subset]['collected_at']
+                                for subset in subsets)
+
+    module.exit_json(changed=False, ansible_facts=dict(cephadm=facts),
+                     cached=cached, timings=get_timings(module))
+
+
+def main():
+    run_module()
+
+
+if __name__ == '__main__':
+    main()
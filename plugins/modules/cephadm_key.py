@@ -31,6 +31,11 @@ short_description: Manage Cephx key(s)
 description:
     - Manage CephX creation, deletion and updates.
       It can also list and get information about keyring(s).
+    - In check mode, the key is read once and the commands which would
+      run are reported in C(cmds), along with a diff of its settings.
+
+extends_documentation_fragment:
+    - stackhpc.cephadm.cephadm_common
 
 options:
     name:
@@ -47,10 +52,27 @@ options:
               return a json output.
               If 'info' is used, the module will return in a json format the
               description of a given keyring.
+              If 'export' is used, the module will return a keyring for each
+              of I(names), each read with 'ceph auth get' in a single
+              'cephadm shell', and write them to I(dest) if set.
         required: false
-        choices: ['present', 'absent', 'list', 'info']
+        choices: ['present', 'absent', 'list', 'info', 'export']
         default: present
         type: str
+    names:
+        description:
+            - Names of the CephX keys to export when I(state=export), in
+              addition to I(name).
+        required: false
+        type: list
+        elements: str
+    dest:
+        description:
+            - Directory to write the exported keyrings to when
+              I(state=export), as C(ceph.<name>.keyring) files readable by
+              their owner only.
+        required: false
+        type: path
     caps:
         description:
             - CephX key capabilities
@@ -95,15 +117,47 @@ EXAMPLES = '''
 - name: list cephx keys
   cephadm_key:
     state: list
+
+- name: export the keyrings of the OpenStack clients
+  cephadm_key:
+    names:
+      - client.glance
+      - client.cinder
+      - client.nova
+    state: export
+  register: openstack_keyrings
+  no_log: true
+
+- name: copy the keyrings to the compute hosts
+  copy:
+    content: "{{ openstack_keyrings.keyrings[item] }}"
+    dest: "/etc/ceph/ceph.{{ item }}.keyring"
+    mode: "0600"
+  loop:
+    - client.cinder
+    - client.nova
+  no_log: true
 '''
 
-RETURN = r''' # '''
+RETURN = r'''
+keyrings:
+    description: Keyring of each exported key, by name, when I(state=export).
+      They hold the secrets of the keys, the task should set C(no_log).
+    returned: when I(state=export)
+    type: dict
+'''
 
 from ansible.module_utils.basic import AnsibleModule
 from ansible_collections.stackhpc.cephadm.plugins.module_utils.cephadm_common \
-    import fatal, generate_ceph_cmd
+    import cephadm_argument_spec, exec_command, exec_command_groups, \
+    exit_check_mode, exit_module, fatal, get_timings
+from ansible_collections.stackhpc.cephadm.plugins.module_utils.cephadm_key_common \
+    import create_key, delete_key, export_keyrings, index_keys, \
+    info_key, key_diff, list_keys, plan_key, update_key
 import datetime
+import errno
 import json
+import os
 
 
 def str_to_bool(val):
@@ -119,153 +173,114 @@ def str_to_bool(val):
         raise ValueError("Invalid input value: %s" % val)
 
 
-def generate_caps(caps):
-    '''
-    Generate CephX capabilities list
-    '''
-
-    caps_cli = []
-
-    for k, v in caps.items():
-        caps_cli.extend([k, v])
-
-    return caps_cli
-
-
-def create_key(name, caps):  # noqa: E501
-    '''
-    Create a CephX key
-    '''
-    cmd = []
-
-    args = [
-        'get-or-create',
-        name
-    ]
-
-    args.extend(generate_caps(caps))
-    cmd.append(generate_ceph_cmd(sub_cmd=['auth'],
-                                 args=args))
-
-    return cmd
-
-
-def update_key(name, caps):
-    '''
-    Update the caps of a CephX key
-    '''
-
-    cmd = []
-
-    args = [
-        'caps',
-        name,
-    ]
-    args.extend(generate_caps(caps))
-    cmd.append(generate_ceph_cmd(sub_cmd=['auth'],
-                                 args=args))
-
-    return cmd
-
-
-def delete_key(name):
+def exec_commands(module, cmd_list):
     '''
-    Delete a CephX key
+    Execute command(s)
     '''
 
-    cmd = []
-
-    args = [
-        'del',
-        name,
-    ]
-
-    cmd.append(generate_ceph_cmd(sub_cmd=['auth'],
-                                 args=args))
+    for cmd in cmd_list:
+        rc, cmd, out, err = exec_command(module, cmd)
+        if rc != 0:
+            return rc, cmd, out, err
 
-    return cmd
+    return rc, cmd, out, err
 
 
-def get_key(name, dest):
-    '''
-    Get a CephX key (write on the filesystem)
+def write_keyring(path, content):
     '''
+    Atomically write a keyring readable by its owner only
 
-    cmd = []
-
-    args = [
-        'get',
-        name,
-        '-o',
-        dest,
-    ]
-
-    cmd.append(generate_ceph_cmd(sub_cmd=['auth'],
-                                 args=args))
-
-    return cmd
-
-
-def info_key(name, output_format):
-    '''
-    Get information about a CephX key
+    Return whether the file changed.
     '''
 
-    cmd_list = []
-
-    args = [
-        'get',
-        name,
-        '-f',
-        output_format,
-    ]
+    try:
+        with open(path) as f:
+            if f.read() == content:
+                return False
+    except (IOError, OSError):
+        pass
 
-    cmd_list.append(generate_ceph_cmd(sub_cmd=['auth'],
-                                      args=args))
+    tmp_path = '{0}.{1}'.format(path, os.getpid())
+    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, 'w') as f:
+        f.write(content)
+    os.rename(tmp_path, path)
 
-    return cmd_list
+    return True
 
 
-def list_keys():
+def export(module, startd):
     '''
-    List all CephX keys
-    '''
-
-    cmd = []
+    Export the keyrings of the named keys, with an 'auth get' for each
 
-    args = [
-        'ls',
-        '-f',
-        'json',
-    ]
-
-    cmd.append(generate_ceph_cmd(sub_cmd=['auth'],
-                                 args=args))
-
-    return cmd
-
-
-def exec_commands(module, cmd_list):
-    '''
-    Execute command(s)
+    The secrets of the keys are marked no_log as soon as they are read, so
+    that they can't leak through a failure or the logs of the module.
     '''
 
-    for cmd in cmd_list:
-        rc, out, err = module.run_command(cmd)
-        if rc != 0:
-            return rc, cmd, out, err
+    names = list(dict.fromkeys(([module.params['name']] if module.params['name'] else []) +  # noqa: E501
+                               (module.params['names'] or [])))
+    if not names:
+        fatal("name or names must be provided when state is 'export'", module)  # noqa: E501
+
+    cmd_groups = [info_key(name, 'json') for name in names]
+    results = exec_command_groups(module, cmd_groups)
+    results += [[]] * (len(cmd_groups) - len(results))
+
+    exported = []
+    for group in results:
+        if group and group[0][0] == 0:
+            exported.extend(json.loads(group[0][2]))
+    secrets = set(entity['key'] for entity in exported)
+    module.no_log_values.update(secrets)
+
+    for cmd_list, group in zip(cmd_groups, results):
+        rc, cmd, out, err = group[0] if group else (1, cmd_list[0], '', 'Not run')  # noqa: E501
+        if rc not in (0, errno.ENOENT):
+            module.fail_json(msg="Couldn't export the keys", cmd=cmd, rc=rc,
+                             stdout=out, stderr=err,
+                             timings=get_timings(module))
+
+    keyrings, missing = export_keyrings(names, exported)
+    if missing:
+        module.fail_json(msg="Couldn't find key(s): {0}".format(', '.join(missing)),  # noqa: E501
+                         cmd=cmd, rc=1, timings=get_timings(module))
 
-    return rc, cmd, out, err
+    changed = False
+    dest = module.params['dest']
+    if dest:
+        for name in names:
+            path = os.path.join(dest, 'ceph.{0}.keyring'.format(name))
+            if module.check_mode:
+                try:
+                    with open(path) as f:
+                        changed |= f.read() != keyrings[name]
+                except (IOError, OSError):
+                    changed = True
+                continue
+            try:
+                changed |= write_keyring(path, keyrings[name])
+            except (IOError, OSError) as e:
+                module.fail_json(msg="Couldn't write {0}: {1}".format(path, e),  # noqa: E501
+                                 rc=1, timings=get_timings(module))
+
+    # Returning the keyrings is the point of the export, the task hides them
+    # with its own no_log.
+    module.no_log_values.difference_update(secrets)
+    exit_module(module=module, out='', rc=0, cmd=cmd, err='',
+                startd=startd, changed=changed, keyrings=keyrings)
 
 
 def run_module():
     module_args = dict(
         name=dict(type='str', required=False),
         state=dict(type='str', required=False, default='present', choices=['present', 'absent',  # noqa: E501
-                                                                           'list', 'info']),  # noqa: E501
+                                                                           'list', 'info', 'export']),  # noqa: E501
         caps=dict(type='dict', required=False, default={}),
-        output_format=dict(type='str', required=False, default='json', choices=['json', 'plain', 'xml', 'yaml'])  # noqa: E501
+        output_format=dict(type='str', required=False, default='json', choices=['json', 'plain', 'xml', 'yaml']),  # noqa: E501
+        names=dict(type='list', elements='str', required=False),
+        dest=dict(type='path', required=False),
     )
+    module_args.update(cephadm_argument_spec())
 
     module = AnsibleModule(
         argument_spec=module_args,
@@ -290,11 +305,22 @@ def run_module():
         delta='',
     )
 
-    if module.check_mode:
-        module.exit_json(**result)
-
     startd = datetime.datetime.now()
 
+    if state == 'export':
+        export(module, startd)
+
+    # In check mode, the changes are computed from a single read of the
+    # running key, without running any command changing the cluster.
+    if module.check_mode and state in ('present', 'absent'):
+        rc, cmd, out, err = exec_command(module, info_key(name, 'json')[0])
+        running_keys = {}
+        if rc == 0:
+            running_keys = index_keys(dict(auth_dump=json.loads(out)))
+        cmd_list, out = plan_key(module.params, running_keys)
+        before, after = key_diff(module.params, running_keys.get(name))
+        exit_check_mode(module, cmd_list, out, before, after, startd)
+
     # Test if the key exists, if it does we skip its creation
     # We only want to run this check when a key needs to be added
     # There is no guarantee that any cluster is running and we don't need one
@@ -316,12 +342,14 @@ def run_module():
             if caps == _caps:
                 result["stdout"] = "{0} already exists and doesn't need to be updated.".format(name)  # noqa: E501
                 result["rc"] = 0
+                result["timings"] = get_timings(module)
                 module.exit_json(**result)
             else:
                 rc, cmd, out, err = exec_commands(module, update_key(name, caps))  # noqa: E501
                 if rc != 0:
                     result["msg"] = "Couldn't update caps for {0}".format(name)
                     result["stderr"] = err
+                    result["timings"] = get_timings(module)
                     module.fail_json(**result)
                 changed = True
 
@@ -330,6 +358,7 @@ def run_module():
             if rc != 0:
                 result["msg"] = "Couldn't create {0}".format(name)
                 result["stderr"] = err
+                result["timings"] = get_timings(module)
                 module.fail_json(**result)
             changed = True
 
@@ -366,6 +395,7 @@ def run_module():
         stderr=err.rstrip("\r\n"),
         name=name,
         changed=changed,
+        timings=get_timings(module),
     )
 
     if rc != 0:
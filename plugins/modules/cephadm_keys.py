@@ -0,0 +1,231 @@
+#!/usr/bin/python
+
+# Copyright 2026, StackHPC, Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+DOCUMENTATION = r'''
+module: cephadm_keys
+author:
+    - StackHPC Ltd. (@stackhpc)
+short_description: Manage a list of CephX keys
+version_added: "1.24.0"
+description:
+    - Manage the creation, deletion and updates of a list of CephX keys in
+      a single invocation.
+    - All the keys are read at once with 'ceph auth ls'. Every creation and
+      update is applied by importing a single generated keyring with
+      'ceph auth import', and all the deletions run in a single
+      'cephadm shell' container.
+extends_documentation_fragment:
+    - stackhpc.cephadm.cephadm_common
+options:
+    keys:
+        description:
+            - List of keys to manage. See the cephadm_key module for a
+              description of the key options.
+        required: true
+        type: list
+        elements: dict
+        suboptions:
+            name:
+                description:
+                    - name of the CephX key
+                required: true
+                type: str
+            state:
+                description:
+                    - If 'present' is used, the key is created if it doesn't
+                      exist or its capabilities are updated if it already
+                      exists.
+                      If 'absent' is used, the key is deleted.
+                required: false
+                choices: ['present', 'absent']
+                default: present
+                type: str
+            caps:
+                description:
+                    - CephX key capabilities. Required to create a key, the
+                      capabilities of an existing key are left unchanged
+                      when omitted.
+                required: false
+                type: dict
+            secret:
+                description:
+                    - Secret of the CephX key. A secret is generated for new
+                      keys when omitted, and the secret of existing keys is
+                      left unchanged.
+                required: false
+                type: str
+                aliases: ['key']
+'''
+
+EXAMPLES = r'''
+- name: Ensure CephX keys are defined
+  cephadm_keys:
+    keys:
+      - name: client.glance
+        caps:
+          mon: "profile rbd"
+          osd: "profile rbd pool=images"
+      - name: client.old
+        state: absent
+'''
+
+RETURN = r'''
+keys:
+    description: Per key report, in the order of the I(keys) option.
+    returned: always
+    type: list
+    elements: dict
+    contains:
+        name:
+            description: Name of the key.
+            type: str
+        changed:
+            description: Whether the key has been changed.
+            type: bool
+        cmds:
+            description: Commands run, or to be run in check mode.
+            type: list
+            elements: list
+        rc:
+            description: Return code of the last command run.
+            type: int
+        stdout:
+            description: Description of the changes, or of the failure.
+            type: str
+        stderr:
+            description: Error output of the last command run.
+            type: str
+'''
+
+from ansible.module_utils.basic import AnsibleModule
+from ansible_collections.stackhpc.cephadm.plugins.module_utils.cephadm_common \
+    import cephadm_argument_spec, exec_command, exec_command_groups, \
+    get_timings
+from ansible_collections.stackhpc.cephadm.plugins.module_utils.cephadm_key_common \
+    import generate_keyring, import_keys, index_keys, list_keys, plan_key, \
+    plan_key_import
+
+import datetime
+import json
+
+
+def run_module():
+    module_args = dict(
+        keys=dict(type='list', elements='dict', required=True, no_log=False,
+                  options=dict(
+                      name=dict(type='str', required=True),
+                      state=dict(type='str', required=False,
+                                 default='present',
+                                 choices=['present', 'absent']),
+                      caps=dict(type='dict', required=False),
+                      secret=dict(type='str', required=False, no_log=True,
+                                  aliases=['key']),
+                  )),
+    )
+    module_args.update(cephadm_argument_spec())
+
+    module = AnsibleModule(
+        argument_spec=module_args,
+        supports_check_mode=True
+    )
+
+    keys = module.params.get('keys')
+
+    startd = datetime.datetime.now()
+
+    rc, cmd, out, err = exec_command(module, list_keys()[0])
+    if rc != 0:
+        module.fail_json(msg="Couldn't list the keys present on the cluster",
+                         cmd=cmd, rc=rc, stdout=out, stderr=err,
+                         timings=get_timings(module))
+    running_keys = index_keys(json.loads(out))
+
+    # Keys to create or update are gathered in a single keyring, keys to
+    # delete each get their own 'auth del'.
+    imports = []
+    imported = []
+    deletions = []
+    report = []
+    for key in keys:
+        if key['state'] == 'absent':
+            cmd_list, stdout = plan_key(key, running_keys)
+            pending = deletions
+        else:
+            entities, stdout = plan_key_import(key, running_keys)
+            cmd_list = import_keys() if entities else entities
+            imports.extend(entities or [])
+            pending = imported
+        key_report = dict(name=key['name'], changed=bool(cmd_list),
+                          cmds=cmd_list or [], rc=0, stdout=stdout,
+                          stderr='')
+        if cmd_list is None:
+            key_report.update(changed=False, rc=1)
+        elif cmd_list:
+            pending.append(key_report)
+        report.append(key_report)
+
+    if not module.check_mode:
+        results = []
+        if imports:
+            rc, cmd, out, err = exec_command(module, import_keys()[0],
+                                             stdin=generate_keyring(imports))  # noqa: E501
+            results.extend((key_report, (rc, cmd, out, err))
+                           for key_report in imported)
+        if deletions:
+            group_results = exec_command_groups(module,
+                                                [key_report['cmds']
+                                                 for key_report in deletions],
+                                                parallel=True)
+            for key_report, group in zip(deletions, group_results):
+                results.append((key_report, group[-1] if group else
+                                (1, key_report['cmds'][0], 'Not applied', '')))  # noqa: E501
+
+        for key_report, (rc, cmd, out, err) in results:
+            key_report.update(changed=rc == 0, rc=rc,
+                              stderr=err.rstrip("\r\n"))
+            if rc != 0:
+                key_report['stdout'] = out.rstrip("\r\n")
+
+    failed = [key_report['name'] for key_report in report
+              if key_report['rc'] != 0]
+
+    endd = datetime.datetime.now()
+    result = dict(
+        changed=any(key_report['changed'] for key_report in report),
+        keys=report,
+        start=str(startd),
+        end=str(endd),
+        delta=str(endd - startd),
+        rc=0,
+        timings=get_timings(module),
+    )
+
+    if failed:
+        result['rc'] = 1
+        module.fail_json(msg="Couldn't reconcile key(s): {0}".format(', '.join(failed)), **result)  # noqa: E501
+
+    module.exit_json(**result)
+
+
+def main():
+    run_module()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,262 @@
+#!/usr/bin/python
+
+# Copyright 2026, StackHPC, Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+DOCUMENTATION = r'''
+module: cephadm_maintenance_plan
+author:
+    - StackHPC Ltd. (@stackhpc)
+short_description: Plan waves of hosts to place into maintenance together
+version_added: "1.24.0"
+description:
+    - Read the OSD tree, the CRUSH rules, the pools and the monitor map in a
+      single 'cephadm shell' container, and split hosts into waves which
+      can be in maintenance at the same time.
+    - The failure domain of a pool is the bucket type of the last choose
+      step of its CRUSH rule, of which each bucket holds at most one copy of
+      a PG. A wave takes down at most I(size - min_size) failure domains of
+      each pool, so that its PGs stay active, and keeps a quorum of
+      monitors. Hosts in the same failure domain, e.g. the same rack, go
+      into the same wave.
+    - A host is always allowed in a wave of its own, 'ceph osd ok-to-stop'
+      should still be checked for each wave before it enters maintenance.
+    - The module doesn't change anything.
+extends_documentation_fragment:
+    - stackhpc.cephadm.cephadm_common
+options:
+    hosts:
+        description:
+            - Names of the hosts to plan, as known to the orchestrator.
+        required: true
+        type: list
+        elements: str
+    max_hosts_per_wave:
+        description:
+            - Maximum number of hosts in a wave, 0 for no limit.
+        required: false
+        default: 0
+        type: int
+'''
+
+EXAMPLES = r'''
+- name: Plan maintenance waves
+  cephadm_maintenance_plan:
+    hosts: "{{ groups['osds'] }}"
+    max_hosts_per_wave: 10
+  register: plan
+
+- name: Print the waves
+  ansible.builtin.debug:
+    msg: "{{ plan.waves }}"
+'''
+
+RETURN = r'''
+waves:
+    description: Hosts of each wave, in the order they should go through
+      maintenance.
+    returned: always
+    type: list
+    elements: list
+osds:
+    description: IDs of the OSDs of each host, for checking a whole wave
+      with 'ceph osd ok-to-stop'.
+    returned: always
+    type: dict
+pools:
+    description: Failure domain types and number of failure domains which
+      can be down at the same time, by pool name.
+    returned: always
+    type: dict
+'''
+
+from ansible.module_utils.basic import AnsibleModule
+from ansible_collections.stackhpc.cephadm.plugins.module_utils.cephadm_common \
+    import cephadm_argument_spec, exec_command_groups, generate_ceph_cmd, \
+    get_timings, parse_json
+
+
+def rule_domains(rule):
+    '''
+    Return the (root, device class, failure domain type) of each take step
+    of a CRUSH rule
+    '''
+
+    domains = []
+    take = None
+    domain_type = None
+    for step in rule.get('steps', []):
+        if step['op'] == 'take':
+            take = step.get('item_name', '')
+            domain_type = None
+        elif step['op'].startswith('choose'):
+            domain_type = step.get('type')
+        elif step['op'] == 'emit' and take is not None and domain_type:
+            root, _sep, device_class = take.partition('~')
+            domains.append((root, device_class, domain_type))
+
+    return domains
+
+
+def host_domains(nodes, root, device_class, domain_type):
+    '''
+    Return the failure domains holding the OSDs of each host under a root
+
+    Each host maps to the set of IDs of the buckets of domain_type its OSDs
+    of device_class are in, or of the OSDs themselves.
+    '''
+
+    by_id = dict((node['id'], node) for node in nodes)
+    by_name = dict((node['name'], node) for node in nodes)
+    domains = {}
+
+    # (node, host, failure domain) of the nodes left to visit
+    pending = [(by_name[root], None, None)] if root in by_name else []
+    while pending:
+        node, host, domain = pending.pop()
+        if node.get('type') == 'host':
+            host = node['name']
+        if node.get('type') == domain_type:
+            domain = node['id']
+        if node.get('type') == 'osd':
+            if host and (not device_class or node.get('device_class') == device_class):  # noqa: E501
+                domains.setdefault(host, set()).add(
+                    node['id'] if domain is None else domain)
+            continue
+        pending.extend((by_id[child], host, domain)
+                       for child in node.get('children', [])
+                       if child in by_id)
+
+    return domains
+
+
+def plan_waves(hosts, constraints, max_mons_down, mons, max_hosts):
+    '''
+    Split hosts into waves
+
+    constraints is a list of (tolerance, failure domains by host): a wave
+    may hold hosts from at most tolerance failure domains of each. Hosts
+    are placed in the first wave with room for them, hosts sharing failure
+    domains being placed one after the other, in the order of their names.
+    '''
+
+    def signature(host):
+        return tuple(tuple(sorted(domains.get(host, [])))
+                     for _tolerance, domains in constraints)
+
+    groups = {}
+    for host in sorted(hosts):
+        groups.setdefault(signature(host), len(groups))
+
+    waves = []
+    for host in sorted(hosts, key=lambda host: (groups[signature(host)], host)):  # noqa: E501
+        for wave in waves:
+            if max_hosts and len(wave['hosts']) >= max_hosts:
+                continue
+            if host in mons and wave['mons'] >= max_mons_down:
+                continue
+            down = [used | domains.get(host, set())
+                    for used, (_tolerance, domains) in zip(wave['down'], constraints)]  # noqa: E501
+            if all(len(used) <= max(tolerance, 1)
+                   for used, (tolerance, _domains) in zip(down, constraints)):  # noqa: E501
+                break
+        else:
+            wave = dict(hosts=[], mons=0,
+                        down=[set() for _constraint in constraints])
+            waves.append(wave)
+            down = [domains.get(host, set()) for _tolerance, domains in constraints]  # noqa: E501
+        wave['hosts'].append(host)
+        wave['mons'] += host in mons
+        wave['down'] = down
+
+    return [sorted(wave['hosts']) for wave in waves]
+
+
+def run_module():
+    module_args = dict(
+        hosts=dict(type='list', elements='str', required=True),
+        max_hosts_per_wave=dict(type='int', required=False, default=0),
+    )
+    module_args.update(cephadm_argument_spec())
+
+    module = AnsibleModule(
+        argument_spec=module_args,
+        supports_check_mode=True
+    )
+
+    results = exec_command_groups(module, [
+        [generate_ceph_cmd(sub_cmd=['osd', 'tree'], args=['-f', 'json'])],
+        [generate_ceph_cmd(sub_cmd=['osd', 'crush', 'rule', 'dump'],
+                           args=['-f', 'json'])],
+        [generate_ceph_cmd(sub_cmd=['osd', 'pool', 'ls', 'detail'],
+                           args=['-f', 'json'])],
+        [generate_ceph_cmd(sub_cmd=['mon', 'dump'], args=['-f', 'json'])],
+    ])
+    for group in results:
+        rc, cmd, out, err = group[0]
+        if rc != 0:
+            module.fail_json(msg="Couldn't read the cluster maps", cmd=cmd,
+                             rc=rc, stdout=out, stderr=err,
+                             timings=get_timings(module))
+
+    nodes = parse_json(results[0][0][2], ['nodes.*.id', 'nodes.*.name',
+                                          'nodes.*.type', 'nodes.*.device_class',  # noqa: E501
+                                          'nodes.*.children'])['nodes']
+    rules = dict((rule['rule_id'], rule)
+                 for rule in parse_json(results[1][0][2]))
+    pools = parse_json(results[2][0][2], ['*.pool_name', '*.crush_rule',
+                                          '*.size', '*.min_size'])
+    mons = set(mon['name'] for mon in
+               parse_json(results[3][0][2], ['mons.*.name'])['mons'])
+
+    constraints = []
+    pool_report = {}
+    for pool in pools:
+        tolerance = pool['size'] - pool['min_size']
+        domain_types = []
+        for root, device_class, domain_type in rule_domains(rules.get(pool['crush_rule'], {})):  # noqa: E501
+            constraints.append((tolerance, host_domains(nodes, root,
+                                                        device_class,
+                                                        domain_type)))
+            domain_types.append(domain_type)
+        pool_report[pool['pool_name']] = dict(failure_domains=domain_types,
+                                              tolerance=tolerance)
+
+    # Keep a majority of the monitors up
+    max_mons_down = max(len(mons) - (len(mons) // 2 + 1), 1)
+    hosts = list(dict.fromkeys(module.params['hosts']))
+    waves = plan_waves(hosts, constraints, max_mons_down, mons,
+                       module.params['max_hosts_per_wave'])
+
+    osds = dict((host, []) for host in hosts)
+    by_id = dict((node['id'], node) for node in nodes)
+    for node in nodes:
+        if node.get('type') == 'host' and node['name'] in osds:
+            osds[node['name']] = sorted(
+                child for child in node.get('children', [])
+                if by_id.get(child, {}).get('type') == 'osd')
+
+    module.exit_json(changed=False, waves=waves, osds=osds,
+                     pools=pool_report, timings=get_timings(module))
+
+
+def main():
+    run_module()
+
+
+if __name__ == '__main__':
+    main()
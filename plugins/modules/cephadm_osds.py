@@ -0,0 +1,309 @@
+#!/usr/bin/python
+
+# Copyright 2026, StackHPC, Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+DOCUMENTATION = r'''
+module: cephadm_osds
+author:
+    - StackHPC Ltd. (@stackhpc)
+short_description: Add OSDs on explicit devices of many hosts at once
+version_added: "1.24.0"
+description:
+    - Create OSDs on a list of devices for each host, with a single
+      'ceph orch apply' instead of one 'ceph orch daemon add osd' per
+      device.
+    - Hosts with the same devices share an OSD service spec, placed on
+      these hosts with the devices as data devices. Specs already applied
+      with the same hosts and devices are left untouched.
+    - Once applied, the module waits for the orchestrator to create an OSD
+      on every device it reported as available, polling the OSD services
+      from a single 'cephadm shell' container.
+    - The specs are managed by the orchestrator, which creates OSDs again on
+      these devices if they are replaced.
+extends_documentation_fragment:
+    - stackhpc.cephadm.cephadm_common
+options:
+    hosts:
+        description:
+            - List of hosts and their devices.
+        required: true
+        type: list
+        elements: dict
+        suboptions:
+            hostname:
+                description:
+                    - Name of the host in the orchestrator.
+                required: true
+                type: str
+            devices:
+                description:
+                    - Paths of the devices to create OSDs on.
+                required: true
+                type: list
+                elements: str
+    service_id:
+        description:
+            - Prefix of the id of the OSD service specs, followed by a hash
+              of their devices.
+        required: false
+        default: osd_devices
+        type: str
+    wait:
+        description:
+            - Wait for the OSDs to be created and running.
+        required: false
+        default: true
+        type: bool
+    timeout:
+        description:
+            - Time in seconds to wait for the OSDs.
+        required: false
+        default: 600
+        type: int
+'''
+
+EXAMPLES = r'''
+- name: Add OSDs
+  cephadm_osds:
+    hosts:
+      - hostname: storage-0
+        devices:
+          - /dev/sdb
+          - /dev/sdc
+      - hostname: storage-1
+        devices:
+          - /dev/sdb
+          - /dev/sdc
+'''
+
+RETURN = r'''
+specs:
+    description: OSD service specs covering the hosts.
+    returned: always
+    type: list
+    elements: dict
+expected:
+    description: Number of OSDs waited for, by OSD service.
+    returned: always
+    type: dict
+attempts:
+    description: Number of times the OSD services were polled.
+    returned: always
+    type: int
+stdout:
+    description: State of the OSD services at the last poll.
+    returned: always
+    type: str
+'''
+
+from ansible.module_utils.basic import AnsibleModule
+from ansible_collections.stackhpc.cephadm.plugins.module_utils.cephadm_common \
+    import cephadm_argument_spec, exec_command, exec_command_groups, \
+    generate_ceph_cmd, get_timings, wait_for
+
+import datetime
+import hashlib
+import json
+
+
+def osd_specs(hosts, service_id):
+    '''
+    Build the OSD service specs of a list of hosts
+
+    Hosts with the same devices share a spec, named after a hash of its
+    devices so that it keeps its name as hosts are added.
+    '''
+
+    groups = {}
+    for host in hosts:
+        paths = tuple(sorted(set(host['devices'])))
+        if paths:
+            groups.setdefault(paths, set()).add(host['hostname'])
+
+    specs = []
+    for paths, hostnames in sorted(groups.items()):
+        digest = hashlib.sha1(json.dumps(paths).encode('utf-8')).hexdigest()[:8]  # noqa: E501
+        specs.append(dict(
+            service_type='osd',
+            service_id='{0}_{1}'.format(service_id, digest),
+            placement=dict(hosts=sorted(hostnames)),
+            spec=dict(data_devices=dict(paths=list(paths))),
+        ))
+
+    return specs
+
+
+def _names(items, key):
+    '''
+    Return the names of a list of hosts or paths, as strings or dicts
+    '''
+
+    return set(item[key] if isinstance(item, dict) else item
+               for item in items or [])
+
+
+def spec_applied(spec, services):
+    '''
+    Return whether a spec is applied with the same hosts and devices
+    '''
+
+    service = services.get('osd.' + spec['service_id'])
+    if service is None:
+        return False
+
+    data_devices = service.get('spec', {}).get('data_devices', {})
+    return (_names(service.get('placement', {}).get('hosts'), 'hostname') ==
+            set(spec['placement']['hosts']) and
+            _names(data_devices.get('paths'), 'path') ==
+            set(spec['spec']['data_devices']['paths']))
+
+
+def expected_osds(specs, inventory, services):
+    '''
+    Count the OSDs each spec should have once its available devices are used
+    '''
+
+    available = set()
+    for host in inventory:
+        for device in host.get('devices', []):
+            if device.get('available'):
+                available.add((host.get('name'), device.get('path')))
+
+    expected = {}
+    for spec in specs:
+        name = 'osd.' + spec['service_id']
+        size = services.get(name, {}).get('status', {}).get('size', 0)
+        new = sum(1 for host in spec['placement']['hosts']
+                  for path in spec['spec']['data_devices']['paths']
+                  if (host, path) in available)
+        expected[name] = size + new
+
+    return expected
+
+
+def osds_created(expected):
+    '''
+    Return the evaluation of 'orch ls osd' output by wait_for()
+    '''
+
+    def evaluate(data):
+        counts = dict((service.get('service_name'),
+                       (service.get('status', {}).get('running', 0),
+                        service.get('status', {}).get('size', 0)))
+                      for service in data)
+        states = []
+        met = True
+        for name, size in sorted(expected.items()):
+            running, current = counts.get(name, (0, 0))
+            met = met and current >= size and running == current
+            states.append('{0}: {1}/{2} running, {3} expected'.format(name, running, current, size))  # noqa: E501
+        return met, sorted(counts.items()), ', '.join(states)
+
+    return evaluate
+
+
+def run_module():
+    module_args = dict(
+        hosts=dict(type='list', elements='dict', required=True,
+                   options=dict(
+                       hostname=dict(type='str', required=True),
+                       devices=dict(type='list', elements='str',
+                                    required=True),
+                   )),
+        service_id=dict(type='str', required=False, default='osd_devices'),
+        wait=dict(type='bool', required=False, default=True),
+        timeout=dict(type='int', required=False, default=600),
+    )
+    module_args.update(cephadm_argument_spec())
+
+    module = AnsibleModule(
+        argument_spec=module_args,
+        supports_check_mode=True
+    )
+
+    startd = datetime.datetime.now()
+
+    ls_osd = generate_ceph_cmd(sub_cmd=['orch', 'ls'],
+                               args=['osd', '-f', 'json'])
+    inventory_results, services_results = exec_command_groups(
+        module,
+        [[generate_ceph_cmd(sub_cmd=['orch', 'device', 'ls'],
+                            args=['-f', 'json'])],
+         [ls_osd]])
+    for results in (inventory_results, services_results):
+        rc, cmd, out, err = results[0] if results else (1, None, '', '')
+        if rc != 0:
+            module.fail_json(msg="Couldn't read the OSD services and devices",
+                             cmd=cmd, rc=rc, stdout=out, stderr=err,
+                             timings=get_timings(module))
+    inventory = json.loads(inventory_results[0][2])
+    services = dict((service['service_name'], service)
+                    for service in json.loads(services_results[0][2]))
+
+    specs = osd_specs(module.params['hosts'], module.params['service_id'])
+    pending = [spec for spec in specs if not spec_applied(spec, services)]
+    expected = expected_osds(specs, inventory, services)
+
+    result = dict(
+        changed=bool(pending),
+        specs=specs,
+        expected=expected,
+        attempts=0,
+        stdout='',
+        rc=0,
+    )
+
+    if pending and not module.check_mode:
+        rc, cmd, out, err = exec_command(module,
+                                         generate_ceph_cmd(sub_cmd=['orch', 'apply'],  # noqa: E501
+                                                           args=['-i', '-']),
+                                         stdin='\n---\n'.join(json.dumps(spec) for spec in pending))  # noqa: E501
+        if rc != 0:
+            module.fail_json(msg="Couldn't apply the OSD specs",
+                             **dict(result, cmd=cmd, rc=rc, stdout=out,
+                                    stderr=err, timings=get_timings(module)))
+
+    if module.params['wait'] and not module.check_mode and \
+            any(size > services.get(name, {}).get('status', {}).get('running', 0)  # noqa: E501
+                for name, size in expected.items()):
+        met, attempts, elapsed, status = wait_for(module, ls_osd,
+                                                  osds_created(expected),
+                                                  module.params['timeout'])
+        result.update(attempts=attempts, stdout=status)
+        if not met:
+            result['rc'] = 1
+            module.fail_json(msg="Timed out after {0} seconds waiting for OSDs: {1}".format(module.params['timeout'], status),  # noqa: E501
+                             timings=get_timings(module), **result)
+
+    endd = datetime.datetime.now()
+    result.update(
+        start=str(startd),
+        end=str(endd),
+        delta=str(endd - startd),
+        timings=get_timings(module),
+    )
+
+    module.exit_json(**result)
+
+
+def main():
+    run_module()
+
+
+if __name__ == '__main__':
+    main()
@@ -28,6 +28,11 @@ short_description: Manage Ceph Pools
 version_added: "1.4.0"
 description:
     - Manage Ceph pool(s) creation, deletion and updates.
+    - In check mode, the pool is read once and the commands which would
+      run are reported in C(cmds), along with a diff of its settings.
+extends_documentation_fragment:
+    - stackhpc.cephadm.cephadm_common
+    - stackhpc.cephadm.cephadm_common.fingerprint
 options:
     name:
         description:
@@ -73,6 +78,30 @@ options:
         required: false
         default: default to `osd_pool_default_pgp_num` (ceph)
         type: str
+    pg_num_step:
+        description:
+            - Change the pg_num and pgp_num of an existing pool by at most
+              this number of PGs at a time, instead of setting them at once.
+              After each step, the module waits for the PGs of the pool to
+              be split or merged and for misplaced objects to fall to
+              I(pg_num_max_misplaced).
+            - The progress is returned in C(pg_num_progress). If a step times
+              out, running the module again resumes from that step.
+        required: false
+        type: int
+    pg_num_max_misplaced:
+        description:
+            - Ratio of misplaced object copies across all the pools below
+              which the next I(pg_num_step) is taken.
+        required: false
+        default: 0.05
+        type: float
+    pg_num_step_timeout:
+        description:
+            - Time in seconds to wait for each I(pg_num_step).
+        required: false
+        default: 3600
+        type: int
     pg_autoscale_mode:
         description:
             - set the pg autoscaler on the pool.
@@ -120,6 +149,14 @@ options:
         required: false
         default: false
         type: bool
+    cluster_snapshot:
+        description:
+            - Read the pool state from a snapshot of the OSD map cached on
+              the host, keyed by cluster fsid and OSD map epoch. The
+              snapshot is only fetched again once the OSD map has changed.
+        required: false
+        default: false
+        type: bool
 '''
 
 EXAMPLES = r'''
@@ -136,325 +173,43 @@ EXAMPLES = r'''
         pool_type: "{{ item.pool_type }}"
         pg_autoscale_mode: "{{ item.pg_autoscale_mode }}"
       with_items: "{{ pools }}"
+
+- name: Grow the PGs of a pool by 128 at a time
+  cephadm_pool:
+    name: rbd
+    pg_num: "2048"
+    pg_autoscale_mode: "off"
+    pg_num_step: 128
 '''
 
 RETURN = r'''#  '''
 
 from ansible.module_utils.basic import AnsibleModule
 from ansible_collections.stackhpc.cephadm.plugins.module_utils.cephadm_common \
-    import generate_ceph_cmd, exec_command, exit_module
+    import cephadm_argument_spec, check_fingerprint, exec_command, \
+    exec_commands_batch, exit_check_mode, exit_module, \
+    fingerprint_argument_spec, get_timings, store_fingerprint
+from ansible_collections.stackhpc.cephadm.plugins.module_utils.cephadm_pool_common \
+    import compare_pool_config, disable_ec_overwrites, \
+    enable_ec_overwrites, generate_create_pool_cmds, \
+    generate_user_pool_config, get_running_pool, get_running_pools, \
+    list_pools, pg_num_step_argument_spec, plan_pool, pool_argument_spec, \
+    pool_diff, prune_pool_delta, remove_pool, step_pg_num, update_pool
 
 import datetime
-import json
-
-
-def check_pool_exist(name,
-                     output_format='json'):
-    '''
-    Check if a given pool exists
-    '''
-
-    args = ['stats', name, '-f', output_format]
-
-    cmd = generate_ceph_cmd(sub_cmd=['osd', 'pool'],
-                            args=args)
-
-    return cmd
-
-
-def get_application_pool(name,
-                         output_format='json'):
-    '''
-    Get application type enabled on a given pool
-    '''
-
-    args = ['application', 'get', name, '-f', output_format]
-
-    cmd = generate_ceph_cmd(sub_cmd=['osd', 'pool'],
-                            args=args)
-
-    return cmd
-
-
-def enable_application_pool(name,
-                            application):
-    '''
-    Enable application on a given pool
-    '''
-
-    args = ['application', 'enable', name, application]
-
-    cmd = generate_ceph_cmd(sub_cmd=['osd', 'pool'],
-                            args=args)
-
-    return cmd
-
-
-def disable_application_pool(name,
-                             application):
-    '''
-    Disable application on a given pool
-    '''
-
-    args = ['application', 'disable', name,
-            application, '--yes-i-really-mean-it']
-
-    cmd = generate_ceph_cmd(sub_cmd=['osd', 'pool'],
-                            args=args)
-
-    return cmd
-
-
-def get_pool_ec_overwrites(name, output_format='json'):
-    '''
-    Get EC overwrites on a given pool
-    '''
-
-    args = ['get', name, 'allow_ec_overwrites',
-            '-f', output_format]
-
-    cmd = generate_ceph_cmd(sub_cmd=['osd', 'pool'],
-                            args=args)
-
-    return cmd
-
-
-def enable_ec_overwrites(name):
-    '''
-    Enable EC overwrites on a given pool
-    '''
-
-    args = ['set', name, 'allow_ec_overwrites',
-            'true']
-
-    cmd = generate_ceph_cmd(sub_cmd=['osd', 'pool'],
-                            args=args)
-
-    return cmd
-
-
-def disable_ec_overwrites(name):
-    '''
-    Disable EC overwrites on a given pool
-    '''
-
-    args = ['set', name, 'allow_ec_overwrites',
-            'false']
-
-    cmd = generate_ceph_cmd(sub_cmd=['osd', 'pool'],
-                            args=args)
-
-    return cmd
-
-
-def get_pool_details(module,
-                     name,
-                     output_format='json'):
-    '''
-    Get details about a given pool
-    '''
-
-    args = ['ls', 'detail', '-f', output_format]
-
-    cmd = generate_ceph_cmd(sub_cmd=['osd', 'pool'],
-                            args=args)
-
-    rc, cmd, out, err = exec_command(module, cmd)
-
-    if rc == 0:
-        out = [p for p in json.loads(out.strip()) if p['pool_name'] == name][0]
-
-    _rc, _cmd, application_pool, _err = exec_command(module,
-                                                     get_application_pool(name)
-                                                     )
-
-    # This is a trick because "target_size_ratio" isn't present at the same
-    # level in the dict
-    # ie:
-    # {
-    # 'pg_num': 8,
-    # 'pgp_num': 8,
-    # 'pg_autoscale_mode': 'on',
-    #     'options': {
-    #          'target_size_ratio': 0.1
-    #     }
-    # }
-    # If 'target_size_ratio' is present in 'options', we set it, this way we
-    # end up with a dict containing all needed keys at the same level.
-    if 'target_size_ratio' in out['options'].keys():
-        out['target_size_ratio'] = out['options']['target_size_ratio']
-    else:
-        out['target_size_ratio'] = None
-
-    application = list(json.loads(application_pool.strip()).keys())
-
-    if len(application) == 0:
-        out['application'] = ''
-    else:
-        out['application'] = application[0]
-
-    return rc, cmd, out, err
-
-
-def compare_pool_config(user_pool_config, running_pool_details):
-    '''
-    Compare user input config pool details with current running pool details
-    '''
-
-    delta = {}
-    filter_keys = ['pg_num', 'pg_placement_num', 'size',
-                   'pg_autoscale_mode', 'target_size_ratio']
-    for key in filter_keys:
-        if (str(running_pool_details[key]) != user_pool_config[key]['value'] and  # noqa: E501
-                user_pool_config[key]['value']):
-            delta[key] = user_pool_config[key]
-
-    if (running_pool_details['application'] !=
-            user_pool_config['application']['value'] and
-            user_pool_config['application']['value']):
-        delta['application'] = {}
-        delta['application']['new_application'] = user_pool_config['application']['value']  # noqa: E501
-        # to be improved (for update_pools()...)
-        delta['application']['value'] = delta['application']['new_application']
-        delta['application']['old_application'] = running_pool_details['application']  # noqa: E501
-
-    return delta
-
-
-def list_pools(details,
-               output_format='json'):
-    '''
-    List existing pools
-    '''
-
-    args = ['ls']
-
-    if details:
-        args.append('detail')
-
-    args.extend(['-f', output_format])
-
-    cmd = generate_ceph_cmd(sub_cmd=['osd', 'pool'],
-                            args=args)
-
-    return cmd
-
-
-def create_pool(name,
-                user_pool_config):
-    '''
-    Create a new pool
-    '''
-
-    args = ['create', user_pool_config['pool_name']['value'],
-            user_pool_config['type']['value']]
-
-    if user_pool_config['pg_autoscale_mode']['value'] != 'on':
-        args.extend(['--pg_num',
-                     user_pool_config['pg_num']['value'],
-                     '--pgp_num',
-                     user_pool_config['pgp_num']['value']])
-    elif user_pool_config['target_size_ratio']['value']:
-        args.extend(['--target_size_ratio',
-                     user_pool_config['target_size_ratio']['value']])
-
-    if user_pool_config['type']['value'] == 'replicated':
-        args.extend([user_pool_config['crush_rule']['value'],
-                     '--expected_num_objects',
-                     user_pool_config['expected_num_objects']['value'],
-                     '--autoscale-mode',
-                     user_pool_config['pg_autoscale_mode']['value']])
-
-    if (user_pool_config['size']['value'] and
-            user_pool_config['type']['value'] == "replicated"):
-        args.extend(['--size', user_pool_config['size']['value']])
-
-    elif user_pool_config['type']['value'] == 'erasure':
-        args.extend([user_pool_config['erasure_profile']['value']])
-
-        if user_pool_config['crush_rule']['value']:
-            args.extend([user_pool_config['crush_rule']['value']])
-
-        args.extend(['--expected_num_objects',
-                     user_pool_config['expected_num_objects']['value'],
-                     '--autoscale-mode',
-                     user_pool_config['pg_autoscale_mode']['value']])
-
-    cmd = generate_ceph_cmd(sub_cmd=['osd', 'pool'],
-                            args=args)
-
-    return cmd
-
-
-def remove_pool(name):
-    '''
-    Remove a pool
-    '''
-
-    args = ['rm', name, name, '--yes-i-really-really-mean-it']
-
-    cmd = generate_ceph_cmd(sub_cmd=['osd', 'pool'],
-                            args=args)
-
-    return cmd
-
-
-def update_pool(module, name, delta):
-    '''
-    Update an existing pool
-    '''
-
-    report = ""
-
-    for key in delta.keys():
-        if key != 'application':
-            args = ['set',
-                    name,
-                    delta[key]['cli_set_opt'],
-                    delta[key]['value']]
-
-            cmd = generate_ceph_cmd(sub_cmd=['osd', 'pool'],
-                                    args=args)
-
-            rc, cmd, out, err = exec_command(module, cmd)
-            if rc != 0:
-                return rc, cmd, out, err
-
-        else:
-            rc, cmd, out, err = exec_command(module, disable_application_pool(name, delta['application']['old_application']))  # noqa: E501
-            if rc != 0:
-                return rc, cmd, out, err
-
-            rc, cmd, out, err = exec_command(module, enable_application_pool(name, delta['application']['new_application']))  # noqa: E501
-            if rc != 0:
-                return rc, cmd, out, err
-
-        report = report + "\n" + "{0} has been updated: {1} is now {2}".format(name, key, delta[key]['value'])  # noqa: E501
-
-    out = report
-    return rc, cmd, out, err
 
 
 def run_module():
-    module_args = dict(
-        name=dict(type='str', required=True),
+    module_args = pool_argument_spec()
+    module_args.update(
         state=dict(type='str', required=False, default='present',
                    choices=['present', 'absent', 'list']),
         details=dict(type='bool', required=False, default=False),
-        size=dict(type='str', required=False),
-        min_size=dict(type='str', required=False),
-        pg_num=dict(type='str', required=False),
-        pgp_num=dict(type='str', required=False),
-        pg_autoscale_mode=dict(type='str', required=False, default='on'),
-        target_size_ratio=dict(type='str', required=False, default=None),
-        pool_type=dict(type='str', required=False, default='replicated',
-                       choices=['replicated', 'erasure']),
-        erasure_profile=dict(type='str', required=False, default='default'),
-        rule_name=dict(type='str', required=False, default=None),
-        expected_num_objects=dict(type='str', required=False, default="0"),
-        application=dict(type='str', required=False, default=None),
-        allow_ec_overwrites=dict(type='bool', required=False, default=False)
+        cluster_snapshot=dict(type='bool', required=False, default=False)
     )
+    module_args.update(pg_num_step_argument_spec())
+    module_args.update(cephadm_argument_spec())
+    module_args.update(fingerprint_argument_spec())
 
     module = AnsibleModule(
         argument_spec=module_args,
@@ -465,83 +220,42 @@ def run_module():
     name = module.params.get('name')
     state = module.params.get('state')
     details = module.params.get('details')
-    size = module.params.get('size')
-    min_size = module.params.get('min_size')
-    pg_num = module.params.get('pg_num')
-    pgp_num = module.params.get('pgp_num')
-    pg_autoscale_mode = module.params.get('pg_autoscale_mode')
-    target_size_ratio = module.params.get('target_size_ratio')
-    application = module.params.get('application')
-    allow_ec_overwrites = module.params.get('allow_ec_overwrites')
-
-    if (module.params.get('pg_autoscale_mode').lower() in
-            ['true', 'on', 'yes']):
-        pg_autoscale_mode = 'on'
-    elif (module.params.get('pg_autoscale_mode').lower() in
-          ['false', 'off', 'no']):
-        pg_autoscale_mode = 'off'
-    else:
-        pg_autoscale_mode = 'warn'
-
-    if module.params.get('pool_type') == '1':
-        pool_type = 'replicated'
-    elif module.params.get('pool_type') == '3':
-        pool_type = 'erasure'
-    else:
-        pool_type = module.params.get('pool_type')
-
-    if not module.params.get('rule_name'):
-        rule_name = 'replicated_rule' if pool_type == 'replicated' else None
-    else:
-        rule_name = module.params.get('rule_name')
-
-    erasure_profile = module.params.get('erasure_profile')
-    expected_num_objects = module.params.get('expected_num_objects')
-    user_pool_config = {
-        'pool_name': {'value': name},
-        'pg_num': {'value': pg_num, 'cli_set_opt': 'pg_num'},
-        'pgp_num': {'value': pgp_num, 'cli_set_opt': 'pgp_num'},
-        'pg_autoscale_mode': {'value': pg_autoscale_mode,
-                              'cli_set_opt': 'pg_autoscale_mode'},
-        'target_size_ratio': {'value': target_size_ratio,
-                              'cli_set_opt': 'target_size_ratio'},
-        'application': {'value': application},
-        'type': {'value': pool_type},
-        'erasure_profile': {'value': erasure_profile},
-        'crush_rule': {'value': rule_name, 'cli_set_opt': 'crush_rule'},
-        'expected_num_objects': {'value': expected_num_objects},
-        'size': {'value': size, 'cli_set_opt': 'size'},
-        'min_size': {'value': min_size},
-        'allow_ec_overwrites': {'value': allow_ec_overwrites}
-    }
-
-    if module.check_mode:
-        module.exit_json(
-            changed=False,
-            stdout='',
-            stderr='',
-            rc=0,
-            start='',
-            end='',
-            delta='',
-        )
+    user_pool_config = generate_user_pool_config(module.params)
 
     startd = datetime.datetime.now()
     changed = False
+    extra = {}
+
+    # In check mode, the changes are computed from a single read of the
+    # running pools, without running any command changing the cluster.
+    if module.check_mode and state in ('present', 'absent'):
+        (rc, cmd, out, err), running_pools = get_running_pools(module)
+        if rc != 0:
+            module.fail_json(msg="Couldn't list pool(s) present on the cluster",  # noqa: E501
+                             cmd=cmd, rc=rc, stdout=out, stderr=err,
+                             timings=get_timings(module))
+        cmd_list, out = plan_pool(module.params, running_pools)
+        before, after = pool_diff(module.params, running_pools.get(name))
+        exit_check_mode(module, cmd_list, out, before, after, startd)
+
+    fingerprint, epoch = None, None
+    if state in ('present', 'absent'):
+        fingerprint, epoch, unchanged = check_fingerprint(
+            module, 'pool', name, list(pool_argument_spec()) + ['state'])
+        if unchanged:
+            exit_module(module=module,
+                        out="Pool {0} is unchanged since it was last applied.".format(name),  # noqa: E501
+                        rc=0, cmd=[], err='', startd=startd)
 
     if state == "present":
-        rc, cmd, out, err = exec_command(module,
-                                         check_pool_exist(name))
+        is_erasure = user_pool_config['type']['value'] == 'erasure'
+        (rc, cmd, out, err), running_pool_details, running_pool_ec_overwrites = get_running_pool(module, name, is_erasure)  # noqa: E501
         if rc == 0:
-            running_pool_details = get_pool_details(module,
-                                                    name)
-            user_pool_config['pg_placement_num'] = {'value': str(running_pool_details[2]['pg_placement_num']), 'cli_set_opt': 'pgp_num'}  # noqa: E501
+            user_pool_config['pg_placement_num'] = {'value': str(running_pool_details['pg_placement_num']), 'cli_set_opt': 'pgp_num'}  # noqa: E501
             delta = compare_pool_config(user_pool_config,
-                                        running_pool_details[2])
+                                        running_pool_details)
 
-            if user_pool_config['type']['value'] == 'erasure':
-                rc, cmd, ec_overwrites, err = exec_command(module, get_pool_ec_overwrites(name))  # noqa: E501
-                running_pool_ec_overwrites = json.loads(ec_overwrites.strip()).get('allow_ec_overwrites')  # noqa: E501
+            if is_erasure:
                 if running_pool_ec_overwrites != user_pool_config['allow_ec_overwrites']['value']:  # noqa: E501
                     if user_pool_config['allow_ec_overwrites']['value']:
                         rc, cmd, out, err = exec_command(module, enable_ec_overwrites(name))  # noqa: E501
@@ -551,41 +265,49 @@ def run_module():
                         changed = True
 
             if len(delta) > 0:
-                keys = list(delta.keys())
-                details = running_pool_details[2]
-                if details['erasure_code_profile'] and 'size' in keys:
-                    del delta['size']
-                if details['pg_autoscale_mode'] == 'on':
-                    delta.pop('pg_num', None)
-                    delta.pop('pgp_num', None)
+                delta = prune_pool_delta(delta, running_pool_details)
 
                 if len(delta) == 0:
                     out = "Skipping pool {0}.\nUpdating either 'size' on an erasure-coded pool or 'pg_num'/'pgp_num' on a pg autoscaled pool is incompatible".format(name)  # noqa: E501
                 else:
-                    rc, cmd, out, err = update_pool(module,
-                                                    name,
-                                                    delta)
-                    if rc == 0:
-                        changed = True
+                    pg_num = None
+                    if module.params.get('pg_num_step') and 'pg_num' in delta:  # noqa: E501
+                        pg_num = int(delta.pop('pg_num')['value'])
+                        delta.pop('pgp_num', None)
+                    rc, out = 0, ''
+                    if delta:
+                        rc, cmd, out, err = update_pool(module,
+                                                        name,
+                                                        delta)
+                        if rc == 0:
+                            changed = True
+                    if rc == 0 and pg_num is not None:
+                        # Resume from the pg_num set by an interrupted run
+                        (rc, cmd, step_out, err), progress = step_pg_num(
+                            module, name, running_pool_details['pool_id'],
+                            running_pool_details.get('pg_num_target',
+                                                     running_pool_details['pg_num']),  # noqa: E501
+                            pg_num)
+                        out += "\n" + step_out
+                        extra['pg_num_progress'] = progress
+                        changed = changed or bool(progress['steps'])
 
             else:
                 out = "Pool {0} already exists and there is nothing to update.".format(name)  # noqa: E501
         else:
-            rc, cmd, out, err = exec_command(module,
-                                             create_pool(name,
-                                                         user_pool_config=user_pool_config))  # noqa: E501
-            if user_pool_config['application']['value']:
-                rc, _, _, _ = exec_command(module,
-                                           enable_application_pool(name,
-                                                                   user_pool_config['application']['value']))  # noqa: E501
-            if user_pool_config['min_size']['value']:
-                # not implemented yet
-                pass
-            if user_pool_config['allow_ec_overwrites']['value']:
-                rc, _, _, _ = exec_command(module,
-                                           enable_ec_overwrites(name))
+            create_cmds = generate_create_pool_cmds(name, user_pool_config)
+            create_results = exec_commands_batch(module, create_cmds,
+                                                 stop_on_error=True)
+            # Report the first failed command, or the last one
+            failed = [result for result in create_results if result[0] != 0]
+            if failed:
+                rc, cmd, out, err = failed[0]
+            elif len(create_results) == len(create_cmds):
+                rc, cmd, out, err = create_results[-1]
+            else:
+                rc, cmd, out, err = 1, create_cmds[len(create_results)], '', 'Not run'  # noqa: E501
 
-            changed = True
+            changed = bool(create_results) and create_results[0][0] == 0
 
     elif state == "list":
         rc, cmd, out, err = exec_command(module,
@@ -595,8 +317,7 @@ def run_module():
             out = "Couldn't list pool(s) present on the cluster"
 
     elif state == "absent":
-        rc, cmd, out, err = exec_command(module,
-                                         check_pool_exist(name))
+        (rc, cmd, out, err), running_pool_details, _ = get_running_pool(module, name)  # noqa: E501
         if rc == 0:
             rc, cmd, out, err = exec_command(module,
                                              remove_pool(name))
@@ -605,8 +326,12 @@ def run_module():
             rc = 0
             out = "Skipped, since pool {0} doesn't exist".format(name)
 
+    if rc == 0:
+        store_fingerprint(module, 'pool', name, fingerprint,
+                          None if changed else epoch)
+
     exit_module(module=module, out=out, rc=rc, cmd=cmd, err=err, startd=startd,
-                changed=changed)
+                changed=changed, **extra)
 
 
 def main():
@@ -0,0 +1,304 @@
+#!/usr/bin/python
+
+# Copyright 2026, StackHPC, Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+DOCUMENTATION = r'''
+module: cephadm_pools
+author:
+    - StackHPC Ltd. (@stackhpc)
+short_description: Manage a list of Ceph Pools
+version_added: "1.24.0"
+description:
+    - Manage the creation, deletion and updates of a list of Ceph pools in
+      a single invocation.
+    - The state of all the pools is read once, and only the commands needed
+      to reconcile each pool are run, in a single 'cephadm shell' container.
+    - The commands of different pools are independent and run concurrently.
+extends_documentation_fragment:
+    - stackhpc.cephadm.cephadm_common
+options:
+    pools:
+        description:
+            - List of pools to manage. See the cephadm_pool module for a
+              description of the pool options.
+        required: true
+        type: list
+        elements: dict
+        suboptions:
+            name:
+                description:
+                    - name of the Ceph pool
+                required: true
+                type: str
+            state:
+                description:
+                    - If 'present' is used, the pool is created if it doesn't
+                      exist or updated if it already exists.
+                      If 'absent' is used, the pool is deleted.
+                required: false
+                choices: ['present', 'absent']
+                default: present
+                type: str
+            size:
+                description:
+                    - set the replica size of the pool.
+                required: false
+                type: str
+            min_size:
+                description:
+                    - set the min_size parameter of the pool.
+                required: false
+                type: str
+            pg_num:
+                description:
+                    - set the pg_num of the pool.
+                required: false
+                type: str
+            pgp_num:
+                description:
+                    - set the pgp_num of the pool.
+                required: false
+                type: str
+            pg_autoscale_mode:
+                description:
+                    - set the pg autoscaler on the pool.
+                required: false
+                default: 'on'
+                type: str
+            target_size_ratio:
+                description:
+                    - set the target_size_ratio on the pool
+                required: false
+                type: str
+            pool_type:
+                description:
+                    - set the pool type, either 'replicated' or 'erasure'
+                required: false
+                default: replicated
+                choices: ['replicated', 'erasure']
+                type: str
+            erasure_profile:
+                description:
+                    - When pool_type = 'erasure', set the erasure profile of
+                      the pool
+                required: false
+                default: default
+                type: str
+            rule_name:
+                description:
+                    - Set the crush rule name assigned to the pool
+                required: false
+                type: str
+            expected_num_objects:
+                description:
+                    - Set the expected_num_objects parameter of the pool.
+                required: false
+                default: "0"
+                type: str
+            application:
+                description:
+                    - Set the pool application on the pool.
+                required: false
+                type: str
+            allow_ec_overwrites:
+                description:
+                    - Set the allow_ec_overwrites parameter of the pool.
+                required: false
+                default: false
+                type: bool
+    cluster_snapshot:
+        description:
+            - Read the pools state from a snapshot of the OSD map cached on
+              the host, keyed by cluster fsid and OSD map epoch. The
+              snapshot is only fetched again once the OSD map has changed.
+        required: false
+        default: false
+        type: bool
+    plan_pg_num:
+        description:
+            - Create the pools at the pg_num the PG autoscaler would settle
+              on, instead of growing them once they are created.
+            - The pg_num is computed for all the pools at once, from the
+              OSDs under the CRUSH root of each pool, its size or erasure
+              code k+m and its share of the target_size_ratio of the pools
+              on the same root. Only pools to create with a
+              target_size_ratio and no pg_num are planned.
+        required: false
+        default: false
+        type: bool
+    target_pg_per_osd:
+        description:
+            - Number of PGs per OSD targeted by I(plan_pg_num), as set by
+              the mon_target_pg_per_osd option of Ceph.
+        required: false
+        default: 100
+        type: int
+'''
+
+EXAMPLES = r'''
+- name: Ensure Ceph pools are defined
+  cephadm_pools:
+    pools:
+      - name: images
+        application: rbd
+      - name: volumes
+        application: rbd
+        target_size_ratio: "0.4"
+      - name: old
+        state: absent
+'''
+
+RETURN = r'''
+pg_nums:
+    description: pg_num planned for new pools, by pool name.
+    returned: when I(plan_pg_num) is set
+    type: dict
+pools:
+    description: Per pool report, in the order of the I(pools) option.
+    returned: always
+    type: list
+    elements: dict
+    contains:
+        name:
+            description: Name of the pool.
+            type: str
+        changed:
+            description: Whether the pool has been changed.
+            type: bool
+        cmds:
+            description: Commands run, or to be run in check mode.
+            type: list
+            elements: list
+        rc:
+            description: Return code of the last command run.
+            type: int
+        stdout:
+            description: Description of the changes, or of the failure.
+            type: str
+        stderr:
+            description: Error output of the last command run.
+            type: str
+'''
+
+from ansible.module_utils.basic import AnsibleModule
+from ansible_collections.stackhpc.cephadm.plugins.module_utils.cephadm_common \
+    import cephadm_argument_spec, exec_command_groups, get_timings
+from ansible_collections.stackhpc.cephadm.plugins.module_utils.cephadm_pool_common \
+    import get_running_pools, plan_new_pools_pg_num, plan_pool, \
+    pool_argument_spec
+
+import datetime
+
+
+def run_module():
+    pool_options = pool_argument_spec()
+    pool_options.update(
+        state=dict(type='str', required=False, default='present',
+                   choices=['present', 'absent']),
+    )
+    module_args = dict(
+        pools=dict(type='list', elements='dict', required=True,
+                   options=pool_options),
+        cluster_snapshot=dict(type='bool', required=False, default=False),
+        plan_pg_num=dict(type='bool', required=False, default=False),
+        target_pg_per_osd=dict(type='int', required=False, default=100),
+    )
+    module_args.update(cephadm_argument_spec())
+
+    module = AnsibleModule(
+        argument_spec=module_args,
+        supports_check_mode=True
+    )
+
+    pools = module.params.get('pools')
+
+    startd = datetime.datetime.now()
+
+    (rc, cmd, out, err), running_pools = get_running_pools(module)
+    if rc != 0:
+        module.fail_json(msg="Couldn't list pool(s) present on the cluster",
+                         cmd=cmd, rc=rc, stdout=out, stderr=err,
+                         timings=get_timings(module))
+
+    extra = {}
+    if module.params.get('plan_pg_num'):
+        (rc, cmd, out, err), pools, extra['pg_nums'] = plan_new_pools_pg_num(
+            module, pools, running_pools)
+        if rc != 0:
+            module.fail_json(msg="Couldn't read the CRUSH map to plan pg_num",  # noqa: E501
+                             cmd=cmd, rc=rc, stdout=out, stderr=err,
+                             timings=get_timings(module))
+
+    plans = [plan_pool(pool, running_pools) for pool in pools]
+
+    if module.check_mode:
+        group_results = [None for plan in plans]
+    else:
+        # Pools are independent from each other, their commands can run
+        # concurrently.
+        group_results = iter(exec_command_groups(module,
+                                                 [cmd_list for cmd_list, report in plans],  # noqa: E501
+                                                 parallel=True))
+        group_results = [next(group_results, []) if cmd_list else None
+                         for cmd_list, report in plans]
+
+    report = []
+    failed = []
+    for pool, (cmd_list, stdout), results in zip(pools, plans, group_results):
+        pool_report = dict(name=pool['name'], changed=bool(cmd_list),
+                           cmds=cmd_list, rc=0, stdout=stdout, stderr='')
+        if results is None:
+            pass
+        elif not results:
+            # The commands didn't run, e.g. the container couldn't start
+            pool_report.update(changed=False, rc=1, stdout='Not applied')
+            failed.append(pool['name'])
+        else:
+            pool_report['changed'] = results[0][0] == 0
+            rc, cmd, out, err = results[-1]
+            pool_report.update(rc=rc, stderr=err.rstrip("\r\n"))
+            if rc != 0 or len(results) != len(cmd_list):
+                pool_report['stdout'] = out.rstrip("\r\n")
+                failed.append(pool['name'])
+        report.append(pool_report)
+
+    endd = datetime.datetime.now()
+    result = dict(
+        changed=any(pool_report['changed'] for pool_report in report),
+        pools=report,
+        start=str(startd),
+        end=str(endd),
+        delta=str(endd - startd),
+        rc=0,
+        timings=get_timings(module),
+        **extra
+    )
+
+    if failed:
+        result['rc'] = 1
+        module.fail_json(msg="Couldn't reconcile pool(s): {0}".format(', '.join(failed)), **result)  # noqa: E501
+
+    module.exit_json(**result)
+
+
+def main():
+    run_module()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,241 @@
+#!/usr/bin/python
+
+# Copyright 2026, StackHPC, Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+DOCUMENTATION = r'''
+module: cephadm_spec
+author:
+    - StackHPC Ltd. (@stackhpc)
+short_description: Apply the orchestrator service and host specs which differ
+version_added: "1.24.0"
+description:
+    - Compare a list of service and host specs with the specs exported by
+      'ceph orch ls --export' and the hosts listed by 'ceph orch host ls',
+      and apply only the ones which differ, with a single
+      'ceph orch apply'.
+    - Applying a spec makes the orchestrator evaluate its service again, so
+      services whose spec is unchanged are left alone.
+    - Settings absent from a service I(spec) section are left to the
+      orchestrator, which fills them with its defaults. Labels of a host
+      are only compared with the ones it has, labels added since are kept.
+extends_documentation_fragment:
+    - stackhpc.cephadm.cephadm_common
+options:
+    specs:
+        description:
+            - List of service and host specs, as dicts. A multi-document
+              YAML spec file can be passed with the from_yaml_all filter.
+        required: true
+        type: list
+        elements: dict
+'''
+
+EXAMPLES = r'''
+- name: Apply the cluster specs
+  cephadm_spec:
+    specs: "{{ lookup('template', 'cluster.yml.j2') | from_yaml_all | list }}"
+
+- name: Apply an OSD spec
+  cephadm_spec:
+    specs:
+      - service_type: osd
+        service_id: osd_spec_default
+        placement:
+          host_pattern: "*"
+        spec:
+          data_devices:
+            all: true
+'''
+
+RETURN = r'''
+applied:
+    description: Names of the services and hosts applied, or to be applied
+      in check mode.
+    returned: always
+    type: list
+    elements: str
+'''
+
+from ansible.module_utils.basic import AnsibleModule
+from ansible_collections.stackhpc.cephadm.plugins.module_utils.cephadm_common \
+    import cephadm_argument_spec, exec_command, exec_command_groups, \
+    exit_module, generate_ceph_cmd, get_timings
+
+import datetime
+import json
+
+
+def spec_name(spec):
+    '''
+    Return the name of the service or host a spec applies to
+    '''
+
+    if spec.get('service_type') == 'host':
+        return 'host.{0}'.format(spec.get('hostname'))
+    if spec.get('service_id'):
+        return '{0}.{1}'.format(spec['service_type'], spec['service_id'])
+    return spec.get('service_type')
+
+
+def normalize(value):
+    '''
+    Return a value with its scalars as strings, as YAML and JSON specs
+    don't type them the same way
+    '''
+
+    if isinstance(value, dict):
+        return dict((key, normalize(item)) for key, item in value.items()
+                    if item is not None)
+    if isinstance(value, list):
+        return [normalize(item) for item in value]
+    if isinstance(value, bool):
+        return str(value).lower()
+    return str(value)
+
+
+def contains(running, desired):
+    '''
+    Return whether every setting of desired is set to the same value in
+    running
+    '''
+
+    if isinstance(desired, dict):
+        return isinstance(running, dict) and \
+            all(contains(running.get(key), item)
+                for key, item in desired.items())
+    return running == desired
+
+
+def service_matches(spec, running):
+    '''
+    Return whether a service spec is applied
+    '''
+
+    desired = normalize(spec)
+    running = normalize(running)
+    for key, value in desired.items():
+        if key in ('service_name', 'unmanaged'):
+            continue
+        # The orchestrator fills the spec section with defaults
+        if key == 'spec':
+            if not contains(running.get(key, {}), value):
+                return False
+        elif running.get(key) != value:
+            return False
+
+    return desired.get('unmanaged', 'false') == running.get('unmanaged', 'false')  # noqa: E501
+
+
+def host_matches(spec, running):
+    '''
+    Return whether a host spec is applied
+    '''
+
+    addr = spec.get('addr')
+    return ((addr is None or str(addr) == running.get('addr')) and
+            set(spec.get('labels') or []) <= set(running.get('labels') or []))  # noqa: E501
+
+
+def pending_specs(specs, services, hosts):
+    '''
+    Return the specs which differ from the services and hosts
+    '''
+
+    pending = []
+    for spec in specs:
+        if spec.get('service_type') == 'host':
+            running = hosts.get(spec.get('hostname'))
+            matches = host_matches
+        else:
+            running = services.get(spec_name(spec))
+            matches = service_matches
+        if running is None or not matches(spec, running):
+            pending.append(spec)
+
+    return pending
+
+
+def run_module():
+    module_args = dict(
+        specs=dict(type='list', elements='dict', required=True),
+    )
+    module_args.update(cephadm_argument_spec())
+
+    module = AnsibleModule(
+        argument_spec=module_args,
+        supports_check_mode=True
+    )
+
+    startd = datetime.datetime.now()
+
+    specs = [spec for spec in module.params['specs'] if spec]
+    for spec in specs:
+        if not spec.get('service_type'):
+            module.fail_json(msg='service_type must be provided in every spec',
+                             spec=spec, timings=get_timings(module))
+
+    services_results, hosts_results = exec_command_groups(module, [
+        [generate_ceph_cmd(sub_cmd=['orch', 'ls'],
+                           args=['--export', '-f', 'json'])],
+        [generate_ceph_cmd(sub_cmd=['orch', 'host', 'ls'],
+                           args=['-f', 'json'])],
+    ])
+    for results in (services_results, hosts_results):
+        rc, cmd, out, err = results[0]
+        if rc != 0:
+            module.fail_json(msg="Couldn't read the orchestrator specs",
+                             cmd=cmd, rc=rc, stdout=out, stderr=err,
+                             timings=get_timings(module))
+    services = dict((spec_name(service), service)
+                    for service in json.loads(services_results[0][2] or '[]'))  # noqa: E501
+    hosts = dict((host['hostname'], host)
+                 for host in json.loads(hosts_results[0][2] or '[]'))
+
+    # Hosts are applied first, so that the services can be placed on them
+    pending = sorted(pending_specs(specs, services, hosts),
+                     key=lambda spec: spec['service_type'] != 'host')
+    applied = [spec_name(spec) for spec in pending]
+    diff = dict(
+        before=[services.get(name, hosts.get(spec.get('hostname')))
+                for name, spec in zip(applied, pending)],
+        after=pending,
+    )
+
+    cmd = generate_ceph_cmd(sub_cmd=['orch', 'apply'], args=['-i', '-'])
+    if not pending or module.check_mode:
+        exit_module(module=module, out='', rc=0, cmd=cmd if pending else [],
+                    err='', startd=startd, changed=bool(pending),
+                    applied=applied, diff=diff)
+
+    rc, cmd, out, err = exec_command(module, cmd,
+                                     stdin='\n---\n'.join(json.dumps(spec) for spec in pending))  # noqa: E501
+    if rc != 0:
+        module.fail_json(msg="Couldn't apply the specs", cmd=cmd, rc=rc,
+                         stdout=out, stderr=err, applied=[],
+                         timings=get_timings(module))
+
+    exit_module(module=module, out=out, rc=rc, cmd=cmd, err=err,
+                startd=startd, changed=True, applied=applied, diff=diff)
+
+
+def main():
+    run_module()
+
+
+if __name__ == '__main__':
+    main()
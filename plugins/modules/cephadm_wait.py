@@ -0,0 +1,254 @@
+#!/usr/bin/python
+
+# Copyright 2026, StackHPC, Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+DOCUMENTATION = r'''
+module: cephadm_wait
+author:
+    - StackHPC Ltd. (@stackhpc)
+short_description: Wait for a condition on the state of a Ceph cluster
+version_added: "1.24.0"
+description:
+    - Poll the cluster until a condition holds, and return as soon as it
+      does.
+    - The JSON output of the 'ceph' command backing the condition is
+      evaluated in the module. All the polls run in a single 'cephadm shell'
+      container, or over a single librados connection.
+    - The delay between polls starts at I(delay) and doubles, up to
+      I(max_delay), as long as the cluster doesn't progress towards the
+      condition. It is reset to I(delay) whenever it does.
+extends_documentation_fragment:
+    - stackhpc.cephadm.cephadm_common
+options:
+    condition:
+        description:
+            - If 'service_running' is used, wait for all the daemons of the
+              orchestrator services matching I(service) to be running.
+              If 'osds_up' is used, wait for all the OSDs in the cluster to
+              be up.
+              If 'pgs_clean' is used, wait for all the placement groups to
+              be active+clean. Scrubbing, snap trimming and remapped PGs
+              count as clean, degraded, recovering, backfilling, peering,
+              down, incomplete, undersized and stale ones don't.
+              If 'health' is used, wait for the health status of the
+              cluster to be one of I(health_status).
+        required: true
+        choices: ['service_running', 'osds_up', 'pgs_clean', 'health']
+        type: str
+    service:
+        description:
+            - Service type or name passed to 'ceph orch ls', e.g. 'rgw'.
+              Required when I(condition=service_running).
+        required: false
+        type: str
+    health_status:
+        description:
+            - Health statuses satisfying I(condition=health).
+        required: false
+        default: ['HEALTH_OK']
+        type: list
+        elements: str
+    timeout:
+        description:
+            - Time in seconds after which the module fails if the condition
+              doesn't hold.
+        required: false
+        default: 300
+        type: int
+    delay:
+        description:
+            - Initial delay in seconds between polls.
+        required: false
+        default: 1
+        type: float
+    max_delay:
+        description:
+            - Maximum delay in seconds between polls.
+        required: false
+        default: 30
+        type: float
+'''
+
+EXAMPLES = r'''
+- name: Wait for RADOS Gateway services to converge
+  cephadm_wait:
+    condition: service_running
+    service: rgw
+    timeout: 300
+
+- name: Wait for all placement groups to be active+clean
+  cephadm_wait:
+    condition: pgs_clean
+    timeout: 1800
+
+- name: Wait for the cluster to be healthy
+  cephadm_wait:
+    condition: health
+    health_status:
+      - HEALTH_OK
+      - HEALTH_WARN
+'''
+
+RETURN = r'''
+attempts:
+    description: Number of times the cluster was polled.
+    returned: always
+    type: int
+elapsed:
+    description: Time in seconds spent waiting.
+    returned: always
+    type: float
+stdout:
+    description: State of the cluster at the last poll.
+    returned: always
+    type: str
+'''
+
+from ansible.module_utils.basic import AnsibleModule
+from ansible_collections.stackhpc.cephadm.plugins.module_utils.cephadm_common \
+    import cephadm_argument_spec, generate_ceph_cmd, get_timings, wait_for
+
+
+def service_running(data, params):
+    '''
+    Evaluate 'orch ls' output, return whether the condition holds, a
+    measure of the progress towards it and a description of the state
+    '''
+
+    counts = [(service.get('service_name'),
+               service.get('status', {}).get('running', 0),
+               service.get('status', {}).get('size', 0))
+              for service in data]
+
+    return (all(running == size for name, running, size in counts), counts,
+            ', '.join('{0}: {1}/{2} running'.format(*count) for count in counts)  # noqa: E501
+            or 'No service found')
+
+
+def osds_up(data, params):
+    '''
+    Evaluate 'osd stat' output
+    '''
+
+    # Before Octopus, the counts are nested in 'osdmap'
+    data = data.get('osdmap', data)
+    up = data.get('num_up_osds', 0)
+    in_ = data.get('num_in_osds', 0)
+
+    return up >= in_, up, '{0} of {1} in OSDs up'.format(up, in_)
+
+
+# Prefixes of the PG states keeping a PG from counting as clean, e.g.
+# 'backfill' for 'backfilling', 'backfill_wait' and 'backfill_toofull'
+UNCLEAN_PG_STATES = ('degraded', 'recover', 'backfill', 'peer', 'down',
+                     'incomplete', 'undersized', 'stale')
+
+
+def pg_state_clean(name):
+    '''
+    Return whether PGs in a state, e.g. 'active+clean+scrubbing', are clean
+    '''
+
+    states = name.split('+')
+    return ('active' in states and 'clean' in states and
+            not any(state.startswith(UNCLEAN_PG_STATES) for state in states))
+
+
+def pgs_clean(data, params):
+    '''
+    Evaluate 'pg stat' output
+    '''
+
+    data = data.get('pg_summary', data)
+    total = data.get('num_pgs', 0)
+    clean = sum(state.get('num', 0)
+                for state in data.get('num_pg_by_state', [])
+                if pg_state_clean(state.get('name', '')))
+
+    return clean == total, clean, '{0} of {1} PGs active+clean'.format(clean, total)  # noqa: E501
+
+
+def health(data, params):
+    '''
+    Evaluate 'health' output
+    '''
+
+    status = data.get('status')
+    checks = sorted(data.get('checks', {}))
+
+    return (status in params['health_status'], (status, checks),
+            ' '.join([status or 'unknown'] + checks))
+
+
+# condition: ('ceph' sub command, evaluation of its JSON output)
+CONDITIONS = {
+    'service_running': (['orch', 'ls'], service_running),
+    'osds_up': (['osd', 'stat'], osds_up),
+    'pgs_clean': (['pg', 'stat'], pgs_clean),
+    'health': (['health'], health),
+}
+
+
+def run_module():
+    module_args = dict(
+        condition=dict(type='str', required=True,
+                       choices=['service_running', 'osds_up', 'pgs_clean',
+                                'health']),
+        service=dict(type='str', required=False),
+        health_status=dict(type='list', elements='str', required=False,
+                           default=['HEALTH_OK']),
+        timeout=dict(type='int', required=False, default=300),
+        delay=dict(type='float', required=False, default=1),
+        max_delay=dict(type='float', required=False, default=30),
+    )
+    module_args.update(cephadm_argument_spec())
+
+    module = AnsibleModule(
+        argument_spec=module_args,
+        supports_check_mode=True,
+        required_if=[('condition', 'service_running', ['service'])],
+    )
+
+    condition = module.params['condition']
+    timeout = module.params['timeout']
+
+    sub_cmd, evaluate = CONDITIONS[condition]
+    args = ['-f', 'json']
+    if condition == 'service_running':
+        args.insert(0, module.params['service'])
+    cmd = generate_ceph_cmd(sub_cmd=sub_cmd, args=args)
+
+    met, attempts, elapsed, status = wait_for(
+        module, cmd, lambda data: evaluate(data, module.params), timeout,
+        module.params['delay'], module.params['max_delay'])
+
+    if not met:
+        module.fail_json(msg="Timed out after {0} seconds waiting for {1}: {2}".format(timeout, condition, status),  # noqa: E501
+                         attempts=attempts, elapsed=elapsed, stdout=status,
+                         timings=get_timings(module))
+
+    module.exit_json(changed=False, attempts=attempts, elapsed=elapsed,
+                     stdout=status, timings=get_timings(module))
+
+
+def main():
+    run_module()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,326 @@
+# Copyright 2026, StackHPC, Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+'''
+Benchmark the round trips made by the cephadm modules
+
+Each scenario runs a module against a fake cluster (see fake_cephadm.py)
+seeded with N pools, erasure code profiles, CRUSH rules and keys, for
+each of the requested sizes. For every run, the number of 'cephadm shell'
+containers started, the number of 'ceph' commands executed and the wall
+time are reported, so that changes in how many round trips a module makes,
+or in how it scales with the size of the cluster, show up.
+
+Example:
+
+    python3 tests/benchmark/benchmark.py --sizes 1,10,100,500 \\
+        --container-latency 0.5 --mon-latency 0.01 --json results.json
+'''
+
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import fake_cephadm
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+COLLECTION_ROOT = os.path.dirname(os.path.dirname(HERE))
+MODULES = 'ansible_collections.stackhpc.cephadm.plugins.modules'
+
+# Name of the object each scenario works on, one of the seeded objects
+# for the scenarios updating an existing object.
+EXISTING = 'bench0'
+NEW = 'bench-new'
+
+
+def all_pools(size):
+    return dict(pools=[dict(name='bench{0}'.format(i), application='rbd')
+                       for i in range(size)] + [dict(name=NEW)])
+
+
+def all_keys(size):
+    return dict(keys=[dict(name='client.bench{0}'.format(i),
+                           caps=dict(mon='allow r', osd='allow rwx'))
+                      for i in range(size)] + [dict(name='client.' + NEW,
+                                                    caps=dict(mon='allow r'))])  # noqa: E501
+
+
+def all_ec_profiles(size):
+    return dict(ec_profiles=[dict(name='bench{0}'.format(i), k='4', m='2')
+                             for i in range(size)] + [dict(name=NEW, k='4',
+                                                           m='2')])
+
+
+def export_keys(size):
+    return dict(names=['client.bench{0}'.format(i) for i in range(size)],
+                state='export')
+
+
+def batch_all(size):
+    names = ['bench{0}'.format(i) for i in range(size)]
+    return dict(
+        ec_profiles=[dict(name=name, k='4', m='2', plugin='jerasure')
+                     for name in names],
+        pools=[dict(name=name, application='rbd') for name in names] +
+        [dict(name=NEW)],
+        keys=[dict(name='client.' + name,
+                   caps=dict(mon='allow r', osd='allow rw'))
+              for name in names],
+    )
+
+
+# (module, scenario, module args), the args may be a function of the size
+SCENARIOS = [
+    ('cephadm_pool', 'noop', dict(name=EXISTING, application='rbd')),
+    ('cephadm_pool', 'update', dict(name=EXISTING, application='rgw',
+                                    size='2', target_size_ratio='0.2')),
+    ('cephadm_pool', 'create', dict(name=NEW, application='rbd')),
+    ('cephadm_pool', 'absent', dict(name=EXISTING, state='absent')),
+    ('cephadm_pools', 'all', all_pools),
+    ('cephadm_batch', 'all', batch_all),
+    ('cephadm_keys', 'all', all_keys),
+    ('cephadm_ec_profiles', 'all', all_ec_profiles),
+    ('cephadm_facts', 'all', dict()),
+    ('cephadm_wait', 'health', dict(condition='health')),
+    ('cephadm_wait', 'pgs_clean', dict(condition='pgs_clean')),
+    ('cephadm_ec_profile', 'noop', dict(name=EXISTING, k='4', m='2',
+                                        plugin='jerasure')),
+    ('cephadm_ec_profile', 'create', dict(name=NEW, k='4', m='2')),
+    ('cephadm_crush_rule', 'noop', dict(name=EXISTING, rule_type='replicated',
+                                        bucket_root='default',
+                                        bucket_type='host')),
+    ('cephadm_crush_rule', 'create', dict(name=NEW, rule_type='replicated',
+                                          bucket_root='default',
+                                          bucket_type='host')),
+    ('cephadm_key', 'noop', dict(name='client.' + EXISTING,
+                                 caps=dict(mon='allow r', osd='allow rw'))),
+    ('cephadm_key', 'create', dict(name='client.' + NEW,
+                                   caps=dict(mon='allow r', osd='allow rw'))),
+    ('cephadm_key', 'export', export_keys),
+]
+
+
+def seed_state(size):
+    '''
+    Return the state of a fake cluster with size objects of each kind
+    '''
+
+    state = fake_cephadm.empty_state()
+    for i in range(size):
+        name = 'bench{0}'.format(i)
+        pool = fake_cephadm.make_pool(state, name)
+        pool['application_metadata'] = {'rbd': {}}
+        state['pools'][name] = pool
+        state['erasure_code_profiles'][name] = {'k': '4', 'm': '2',
+                                                'plugin': 'jerasure'}
+        state['crush_rules'][name] = dict(rule_id=i + 1, rule_name=name,
+                                          type=1, steps=[])
+        state['auth']['client.' + name] = dict(
+            key=fake_cephadm.make_key('client.' + name),
+            caps=dict(mon='allow r', osd='allow rw'))
+
+    return state
+
+
+class Bench(object):
+    '''
+    Environment running modules against the fake cluster
+    '''
+
+    def __init__(self, container_latency, mon_latency, transport='cli'):
+        self.tmpdir = tempfile.mkdtemp(prefix='cephadm-bench-')
+        self.transport_args = dict(ceph_transport=transport)
+        if transport == 'host':
+            # The fake 'ceph' on the PATH stands for the host CLI
+            for option, name in (('cephadm_config', 'ceph.conf'),
+                                 ('cephadm_keyring', 'keyring')):
+                path = os.path.join(self.tmpdir, name)
+                open(path, 'w').close()
+                self.transport_args[option] = path
+
+        # Modules are imported from an ansible_collections tree pointing at
+        # this checkout, wherever it lives.
+        collections = os.path.join(self.tmpdir, 'collections')
+        os.makedirs(os.path.join(collections, 'ansible_collections',
+                                 'stackhpc'))
+        os.symlink(COLLECTION_ROOT,
+                   os.path.join(collections, 'ansible_collections',
+                                'stackhpc', 'cephadm'))
+
+        bindir = os.path.join(self.tmpdir, 'bin')
+        os.makedirs(bindir)
+        for tool in ('cephadm', 'ceph'):
+            path = os.path.join(bindir, tool)
+            with open(path, 'w') as f:
+                f.write('#!/bin/sh\nexec {0} {1} {2} "$@"\n'.format(
+                    sys.executable, os.path.join(HERE, 'fake_cephadm.py'),
+                    tool))
+            os.chmod(path, 0o755)
+
+        self.state_path = os.path.join(self.tmpdir, 'state.json')
+        self.env = dict(os.environ)
+        self.env.update({
+            'PATH': bindir + os.pathsep + self.env.get('PATH', ''),
+            'PYTHONPATH': collections,
+            fake_cephadm.STATE_ENV: self.state_path,
+            fake_cephadm.CONTAINER_LATENCY_ENV: str(container_latency),
+            fake_cephadm.MON_LATENCY_ENV: str(mon_latency),
+        })
+
+    def cleanup(self):
+        shutil.rmtree(self.tmpdir)
+
+    def run(self, module, args, state):
+        '''
+        Run a module against the given cluster state
+
+        Return the module result and the state of the cluster afterwards.
+        '''
+
+        with open(self.state_path, 'w') as f:
+            json.dump(state, f)
+
+        args = dict(args, **self.transport_args)
+        start = time.time()
+        proc = subprocess.run(
+            [sys.executable, '-m', '{0}.{1}'.format(MODULES, module)],
+            input=json.dumps(dict(ANSIBLE_MODULE_ARGS=args)),
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+            universal_newlines=True, env=self.env, check=False)
+        wall = time.time() - start
+
+        try:
+            result = json.loads(proc.stdout)
+        except ValueError:
+            raise RuntimeError('{0} failed: {1}{2}'.format(module, proc.stdout,
+                                                           proc.stderr))
+        result['wall'] = wall
+
+        with open(self.state_path) as f:
+            return result, json.load(f)
+
+
+def run_benchmark(bench, sizes, scenarios):
+    rows = []
+    for module, scenario, args in scenarios:
+        for size in sizes:
+            module_args = args(size) if callable(args) else args
+            result, state = bench.run(module, module_args, seed_state(size))
+            rows.append(dict(
+                module=module,
+                scenario=scenario,
+                size=size,
+                failed=bool(result.get('failed')),
+                changed=result.get('changed'),
+                containers=state['stats']['containers'],
+                commands=state['stats']['commands'],
+                module_time=sum(t['duration'] or 0
+                                for t in result.get('timings', [])
+                                if not t.get('batched')),
+                wall=result['wall'],
+            ))
+    return rows
+
+
+def print_rows(rows):
+    columns = ('module', 'scenario', 'size', 'containers', 'commands',
+               'module_time', 'wall')
+    print('{0:<20} {1:<9} {2:>6} {3:>10} {4:>8} {5:>11} {6:>8}'.format(*columns))  # noqa: E501
+    for row in rows:
+        flag = ' FAILED' if row['failed'] else ''
+        print('{module:<20} {scenario:<9} {size:>6} {containers:>10} '
+              '{commands:>8} {module_time:>11.3f} {wall:>8.3f}'.format(**row)
+              + flag)
+
+
+def scaling(rows):
+    '''
+    Summarise how each scenario grows from the smallest to the largest size
+    '''
+
+    curves = {}
+    for row in rows:
+        curves.setdefault((row['module'], row['scenario']), []).append(row)
+
+    summary = []
+    for (module, scenario), points in curves.items():
+        first, last = points[0], points[-1]
+        summary.append(dict(
+            module=module,
+            scenario=scenario,
+            sizes=[p['size'] for p in points],
+            containers=[p['containers'] for p in points],
+            commands=[p['commands'] for p in points],
+            flat=first['containers'] == last['containers'] and
+            first['commands'] == last['commands'],
+        ))
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--sizes', default='1,10,100,500',
+                        help='comma separated numbers of objects of each '
+                             'kind in the fake cluster')
+    parser.add_argument('--container-latency', type=float, default=0.1,
+                        help="seconds added to each 'cephadm shell'")
+    parser.add_argument('--mon-latency', type=float, default=0.005,
+                        help="seconds added to each 'ceph' command")
+    parser.add_argument('--transport', default='cli', choices=['cli', 'host'],
+                        help="ceph_transport of the modules, 'host' runs the "
+                             "fake 'ceph' without container")
+    parser.add_argument('--module', action='append',
+                        help='only run the scenarios of this module')
+    parser.add_argument('--json', help='write the results to this file')
+    parser.add_argument('--check-flat', action='store_true',
+                        help='fail if the number of containers or commands '
+                             'of a scenario depends on the cluster size')
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(',')]
+    scenarios = [s for s in SCENARIOS
+                 if not args.module or s[0] in args.module]
+
+    bench = Bench(args.container_latency, args.mon_latency, args.transport)
+    try:
+        rows = run_benchmark(bench, sizes, scenarios)
+    finally:
+        bench.cleanup()
+
+    print_rows(rows)
+    summary = scaling(rows)
+    print()
+    for curve in summary:
+        print('{0:<20} {1:<9} containers {2} commands {3}{4}'.format(
+            curve['module'], curve['scenario'], curve['containers'],
+            curve['commands'], '' if curve['flat'] else ' (grows with size)'))
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(dict(rows=rows, scaling=summary), f, indent=2)
+
+    if any(row['failed'] for row in rows):
+        return 1
+    if args.check_flat and not all(curve['flat'] for curve in summary):
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
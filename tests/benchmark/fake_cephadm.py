@@ -0,0 +1,526 @@
+# Copyright 2026, StackHPC, Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+'''
+Fake 'cephadm' and 'ceph' executables used by the benchmark suite
+
+Installed under both names in a directory on the PATH, as wrappers running
+'python fake_cephadm.py <name> <args>'. As 'cephadm', only 'shell' is
+supported: the command after '--' is executed after sleeping
+FAKE_CEPH_CONTAINER_LATENCY seconds, standing for the container startup.
+As 'ceph', the command is applied to the cluster state kept in the
+FAKE_CEPH_STATE JSON file after sleeping FAKE_CEPH_MON_LATENCY seconds,
+standing for the monitor round trip.
+
+Every invocation is counted in the 'stats' of the state file.
+'''
+
+import base64
+import errno
+import fcntl
+import json
+import os
+import sys
+import time
+
+STATE_ENV = 'FAKE_CEPH_STATE'
+CONTAINER_LATENCY_ENV = 'FAKE_CEPH_CONTAINER_LATENCY'
+MON_LATENCY_ENV = 'FAKE_CEPH_MON_LATENCY'
+FSID = '7a9d3b5e-0000-4000-8000-0123456789ab'
+
+
+class CephError(Exception):
+
+    def __init__(self, code, message):
+        super(CephError, self).__init__(message)
+        self.code = code
+
+    def __str__(self):
+        return 'Error {0}: {1}'.format(errno.errorcode[self.code],
+                                       self.args[0])
+
+
+def empty_state():
+    '''
+    Return the state of a cluster with no pool, profile, rule or key
+    '''
+
+    return dict(
+        fsid=FSID,
+        epoch=1,
+        pools={},
+        erasure_code_profiles={
+            'default': {'k': '2', 'm': '2', 'plugin': 'jerasure',
+                        'technique': 'reed_sol_van'},
+        },
+        crush_rules={
+            'replicated_rule': {'rule_id': 0, 'rule_name': 'replicated_rule',
+                                'type': 1, 'steps': []},
+        },
+        auth={
+            'client.admin': {'key': make_key('client.admin'),
+                             'caps': {'mon': 'allow *', 'osd': 'allow *',
+                                      'mgr': 'allow *', 'mds': 'allow *'}},
+        },
+        config_key={},
+        stats=dict(containers=0, commands=0),
+    )
+
+
+def make_key(entity):
+    return base64.b64encode(entity.encode().ljust(28, b'\0')[:28]).decode()
+
+
+def make_pool(state, name, pool_type='replicated', rule='replicated_rule',
+              profile=''):
+    return dict(
+        pool_name=name,
+        pool_id=max([p['pool_id'] for p in state['pools'].values()] + [0]) + 1,  # noqa: E501
+        type=3 if pool_type == 'erasure' else 1,
+        size=3,
+        min_size=2,
+        crush_rule=state['crush_rules'][rule]['rule_id'] if rule in state['crush_rules'] else 0,  # noqa: E501
+        pg_num=32,
+        pg_placement_num=32,
+        pg_autoscale_mode='on',
+        erasure_code_profile=profile,
+        flags_names='hashpspool',
+        application_metadata={},
+        options={},
+    )
+
+
+def pop_options(args, names):
+    '''
+    Remove '--name value' options from args, return them as a dict
+    '''
+
+    options = {}
+    rest = []
+    while args:
+        arg = args.pop(0)
+        if arg in names and args:
+            options[arg.lstrip('-')] = args.pop(0)
+        else:
+            rest.append(arg)
+    args.extend(rest)
+
+    return options
+
+
+def get_pool(state, name):
+    if name not in state['pools']:
+        raise CephError(errno.ENOENT, "unrecognized pool '{0}'".format(name))
+    return state['pools'][name]
+
+
+def osd_pool(state, args):
+    sub = args.pop(0)
+    if sub == 'ls':
+        if args[:1] == ['detail']:
+            return list(state['pools'].values())
+        return list(state['pools'])
+    if sub == 'stats':
+        pool = get_pool(state, args[0])
+        return [dict(pool_name=pool['pool_name'], pool_id=pool['pool_id'])]
+    if sub == 'create':
+        options = pop_options(args, ('--pg_num', '--pgp_num', '--size',
+                                     '--target_size_ratio',
+                                     '--expected_num_objects',
+                                     '--autoscale-mode'))
+        name = args.pop(0)
+        if name in state['pools']:
+            return "pool '{0}' already exists".format(name), True
+        pool_type = 'replicated'
+        if args[:1] in (['replicated'], ['erasure']):
+            pool_type = args.pop(0)
+        if pool_type == 'erasure':
+            profile = args.pop(0) if args else 'default'
+            pool = make_pool(state, name, pool_type, args[0] if args else name,  # noqa: E501
+                             profile)
+        else:
+            pool = make_pool(state, name, pool_type,
+                             args[0] if args else 'replicated_rule')
+        for option, key in (('pg_num', 'pg_num'),
+                            ('pgp_num', 'pg_placement_num'),
+                            ('size', 'size')):
+            if option in options:
+                pool[key] = int(options[option])
+        if 'autoscale-mode' in options:
+            pool['pg_autoscale_mode'] = options['autoscale-mode']
+        if 'target_size_ratio' in options:
+            pool['options']['target_size_ratio'] = float(options['target_size_ratio'])  # noqa: E501
+        state['pools'][name] = pool
+        state['epoch'] += 1
+        return "pool '{0}' created".format(name), True
+    if sub == 'rm':
+        if len(args) < 3 or args[0] != args[1]:
+            raise CephError(errno.EPERM, 'pool name must be given twice')
+        if state['pools'].pop(args[0], None) is None:
+            return "pool '{0}' does not exist".format(args[0]), True
+        state['epoch'] += 1
+        return "pool '{0}' removed".format(args[0]), True
+    if sub in ('set', 'get'):
+        pool = get_pool(state, args[0])
+        key = args[1]
+        if sub == 'get':
+            if key == 'allow_ec_overwrites':
+                value = 'ec_overwrites' in pool['flags_names'].split(',')
+            elif key == 'pgp_num':
+                value = pool['pg_placement_num']
+            elif key in pool['options']:
+                value = pool['options'][key]
+            elif key in pool:
+                value = pool[key]
+            else:
+                raise CephError(errno.ENOENT, "option '{0}' is not set on pool '{1}'".format(key, args[0]))  # noqa: E501
+            return {'pool': args[0], key: value}
+        value = args[2]
+        if key in ('size', 'min_size', 'pg_num'):
+            pool[key] = int(value)
+        elif key == 'pgp_num':
+            pool['pg_placement_num'] = int(value)
+        elif key == 'pg_autoscale_mode':
+            pool[key] = value
+        elif key == 'target_size_ratio':
+            pool['options'][key] = float(value)
+        elif key == 'crush_rule':
+            pool[key] = state['crush_rules'][value]['rule_id']
+        elif key == 'allow_ec_overwrites':
+            flags = [f for f in pool['flags_names'].split(',')
+                     if f != 'ec_overwrites']
+            if value == 'true':
+                flags.append('ec_overwrites')
+            pool['flags_names'] = ','.join(flags)
+        else:
+            raise CephError(errno.EINVAL, "unrecognized variable '{0}'".format(key))  # noqa: E501
+        state['epoch'] += 1
+        return 'set pool {0} {1} to {2}'.format(pool['pool_id'], key, value), True  # noqa: E501
+    if sub == 'application':
+        action = args.pop(0)
+        pool = get_pool(state, args[0])
+        if action == 'get':
+            return pool['application_metadata']
+        if action == 'enable':
+            pool['application_metadata'].setdefault(args[1], {})
+        elif action == 'disable':
+            pool['application_metadata'].pop(args[1], None)
+        state['epoch'] += 1
+        return "{0}d application '{1}' on pool '{2}'".format(action, args[1], args[0]), True  # noqa: E501
+
+    raise CephError(errno.EINVAL, 'invalid command')
+
+
+def osd_erasure_code_profile(state, args):
+    sub = args.pop(0)
+    profiles = state['erasure_code_profiles']
+    if sub == 'ls':
+        return list(profiles)
+    if sub == 'get':
+        if args[0] not in profiles:
+            raise CephError(errno.ENOENT, "unknown erasure code profile '{0}'".format(args[0]))  # noqa: E501
+        return profiles[args[0]]
+    if sub == 'set':
+        name = args.pop(0)
+        force = '--force' in args
+        profile = dict(arg.split('=', 1) for arg in args if '=' in arg)
+        profile.setdefault('plugin', 'jerasure')
+        if name in profiles and profiles[name] != profile and not force:
+            raise CephError(errno.EPERM, 'will not override erasure code profile {0}'.format(name))  # noqa: E501
+        profiles[name] = profile
+        state['epoch'] += 1
+        return '', True
+    if sub == 'rm':
+        if profiles.pop(args[0], None) is None:
+            return 'erasure-code-profile {0} does not exist'.format(args[0]), True  # noqa: E501
+        state['epoch'] += 1
+        return '', True
+
+    raise CephError(errno.EINVAL, 'invalid command')
+
+
+def osd_crush_rule(state, args):
+    sub = args.pop(0)
+    rules = state['crush_rules']
+    if sub == 'ls':
+        return list(rules)
+    if sub == 'dump':
+        if not args:
+            return list(rules.values())
+        if args[0] not in rules:
+            raise CephError(errno.ENOENT, "unknown crush rule '{0}'".format(args[0]))  # noqa: E501
+        return rules[args[0]]
+    if sub in ('create-replicated', 'create-erasure'):
+        name = args[0]
+        if name in rules:
+            return 'rule {0} already exists'.format(name), True
+        rules[name] = dict(
+            rule_id=max(r['rule_id'] for r in rules.values()) + 1,
+            rule_name=name,
+            type=1 if sub == 'create-replicated' else 3,
+            steps=[],
+        )
+        state['epoch'] += 1
+        return '', True
+    if sub == 'rm':
+        rules.pop(args[0], None)
+        state['epoch'] += 1
+        return '', True
+
+    raise CephError(errno.EINVAL, 'invalid command')
+
+
+def keyring(entities):
+    lines = []
+    for entity, auth in entities:
+        lines.append('[{0}]'.format(entity))
+        lines.append('\tkey = {0}'.format(auth['key']))
+        for service, cap in sorted(auth['caps'].items()):
+            lines.append('\tcaps {0} = "{1}"'.format(service, cap))
+    return '\n'.join(lines) + '\n'
+
+
+def parse_keyring(data):
+    entities = {}
+    entity = None
+    for line in data.splitlines():
+        line = line.strip()
+        if line.startswith('[') and line.endswith(']'):
+            entity = line[1:-1]
+            entities[entity] = dict(key='', caps={})
+        elif entity and '=' in line:
+            key, value = [s.strip() for s in line.split('=', 1)]
+            if key == 'key':
+                entities[entity]['key'] = value
+            elif key.startswith('caps '):
+                entities[entity]['caps'][key[5:].strip()] = value.strip('"')
+    return entities
+
+
+def auth(state, args, output_format, stdin):
+    sub = args.pop(0)
+    keys = state['auth']
+    options = pop_options(args, ('-o', '--out-file', '-i', '--in-file'))
+    out_file = options.get('o', options.get('out-file'))
+
+    if sub in ('get', 'export') and args:
+        if args[0] not in keys:
+            raise CephError(errno.ENOENT, "failed to find {0} in keyring".format(args[0]))  # noqa: E501
+    if sub == 'ls':
+        return dict(auth_dump=[dict(entity=entity, **auth)
+                               for entity, auth in keys.items()])
+    if sub in ('get', 'export'):
+        entities = [(entity, keys[entity]) for entity in (args or keys)]
+        if out_file:
+            with open(out_file, 'w') as f:
+                f.write(keyring(entities))
+            return 'exported keyring for {0}'.format(' '.join(args)), True
+        if output_format:
+            return [dict(entity=entity, **auth) for entity, auth in entities]
+        return keyring(entities), False
+    if sub in ('get-or-create', 'add'):
+        name = args.pop(0)
+        caps = dict(zip(args[::2], args[1::2]))
+        if name in keys:
+            if sub == 'get-or-create' and caps and keys[name]['caps'] != caps:
+                raise CephError(errno.EINVAL, 'key for {0} exists but cap {1} does not match'.format(name, sorted(caps)[0]))  # noqa: E501
+        else:
+            keys[name] = dict(key=make_key(name), caps=caps)
+        return keyring([(name, keys[name])]), False
+    if sub == 'caps':
+        name = args.pop(0)
+        if name not in keys:
+            raise CephError(errno.ENOENT, "couldn't find entity {0}".format(name))  # noqa: E501
+        keys[name]['caps'] = dict(zip(args[::2], args[1::2]))
+        return 'updated caps for {0}'.format(name), True
+    if sub in ('del', 'rm'):
+        if keys.pop(args[0], None) is None:
+            raise CephError(errno.ENOENT, "failed to find {0} in keyring".format(args[0]))  # noqa: E501
+        return 'updated', True
+    if sub == 'import':
+        in_file = options.get('i', options.get('in-file'))
+        if in_file and in_file != '-':
+            with open(in_file) as f:
+                data = f.read()
+        else:
+            data = stdin
+        keys.update(parse_keyring(data))
+        return 'imported keyring', True
+
+    raise CephError(errno.EINVAL, 'invalid command')
+
+
+def config_key(state, args):
+    sub = args.pop(0)
+    store = state['config_key']
+    if sub in ('get', 'exists'):
+        if args[0] not in store:
+            raise CephError(errno.ENOENT, 'key {0} doesn\'t exist'.format(args[0]))  # noqa: E501
+        if sub == 'get':
+            return store[args[0]], False
+        return 'key {0} exists'.format(args[0]), True
+    if sub == 'set':
+        store[args[0]] = args[1] if len(args) > 1 else ''
+        return 'set {0}'.format(args[0]), True
+    if sub in ('rm', 'del'):
+        store.pop(args[0], None)
+        return 'key deleted', True
+    if sub in ('ls', 'list'):
+        return sorted(store)
+
+    raise CephError(errno.EINVAL, 'invalid command')
+
+
+def ceph(state, args, stdin=''):
+    '''
+    Apply a 'ceph' command to the state
+
+    Return the rc, stdout and stderr of the command.
+    '''
+
+    output_format = None
+    rest = []
+    while args:
+        arg = args.pop(0)
+        if arg in ('-f', '--format') and args:
+            output_format = args.pop(0)
+        elif arg.startswith('--format='):
+            output_format = arg.split('=', 1)[1]
+        elif arg in ('-c', '--conf', '-k', '--keyring') and args:
+            args.pop(0)
+        else:
+            rest.append(arg)
+    args = rest
+
+    try:
+        if args[:2] == ['osd', 'pool']:
+            result = osd_pool(state, args[2:])
+        elif args[:2] == ['osd', 'erasure-code-profile']:
+            result = osd_erasure_code_profile(state, args[2:])
+        elif args[:3] == ['osd', 'crush', 'rule']:
+            result = osd_crush_rule(state, args[3:])
+        elif args[:2] == ['osd', 'stat']:
+            result = dict(epoch=state['epoch'], num_osds=3, num_up_osds=3,
+                          num_in_osds=3)
+        elif args[:2] == ['pg', 'stat']:
+            num_pgs = sum(pool['pg_num'] for pool in state['pools'].values())
+            result = dict(num_pgs=num_pgs,
+                          num_pg_by_state=[dict(name='active+clean',
+                                                num=num_pgs)])
+        elif args[:1] == ['health']:
+            result = dict(status='HEALTH_OK', checks={})
+        elif args[:2] == ['osd', 'dump']:
+            result = dict(fsid=state['fsid'], epoch=state['epoch'],
+                          pools=list(state['pools'].values()),
+                          erasure_code_profiles=state['erasure_code_profiles'])  # noqa: E501
+        elif args[:1] == ['auth']:
+            result = auth(state, args[1:], output_format, stdin)
+        elif args[:1] == ['config-key']:
+            result = config_key(state, args[1:])
+        elif args[:1] == ['fsid']:
+            result = dict(fsid=state['fsid'])
+            if not output_format:
+                result = state['fsid'], False
+        elif args[:1] == ['versions']:
+            result = dict(overall={'ceph version 19.2.0 squid (stable)': 3})
+        elif args[:2] == ['mon', 'dump']:
+            result = dict(epoch=1, fsid=state['fsid'],
+                          mons=[dict(rank=0, name='a')])
+        elif args[:2] == ['mgr', 'dump']:
+            result = dict(epoch=1, active_name='a', available=True,
+                          standbys=[], available_modules=[])
+        elif args[:2] == ['osd', 'tree']:
+            result = dict(nodes=[dict(id=i, name='osd.{0}'.format(i),
+                                      type='osd', device_class='hdd')
+                                 for i in range(3)], stray=[])
+        elif args[:3] == ['osd', 'crush', 'class']:
+            result = ['hdd']
+        elif args[:1] == ['df']:
+            result = dict(stats=dict(total_bytes=3 << 40),
+                          pools=[dict(name=name, stats=dict(stored=0))
+                                 for name in sorted(state['pools'])])
+        else:
+            raise CephError(errno.EINVAL, 'invalid command')
+    except (CephError, IndexError, KeyError, ValueError) as e:
+        if not isinstance(e, CephError):
+            e = CephError(errno.EINVAL, 'invalid command')
+        return e.code, '', str(e) + '\n'
+
+    # Commands which don't produce data return a message on stderr
+    if isinstance(result, tuple):
+        message, on_stderr = result
+        if on_stderr:
+            return 0, '', message + '\n' if message else ''
+        return 0, message, ''
+
+    return 0, json.dumps(result) + '\n', ''
+
+
+class State(object):
+    '''
+    Exclusive access to the state file, shared by concurrent invocations
+    '''
+
+    def __init__(self, path):
+        self.path = path
+
+    def __enter__(self):
+        self.f = open(self.path, 'r+')
+        fcntl.flock(self.f, fcntl.LOCK_EX)
+        self.state = json.load(self.f)
+        return self.state
+
+    def __exit__(self, *exc):
+        self.f.seek(0)
+        self.f.truncate()
+        json.dump(self.state, self.f)
+        self.f.close()
+
+
+def latency(env):
+    time.sleep(float(os.environ.get(env) or 0))
+
+
+def main(argv):
+    tool = argv.pop(1)
+    state_path = os.environ[STATE_ENV]
+
+    if tool == 'cephadm':
+        args = argv[1:]
+        if 'shell' not in args or '--' not in args:
+            sys.stderr.write('fake cephadm only supports shell -- <cmd>\n')
+            return errno.EINVAL
+        latency(CONTAINER_LATENCY_ENV)
+        with State(state_path) as state:
+            state['stats']['containers'] += 1
+        cmd = args[args.index('--') + 1:]
+        os.execvp(cmd[0], cmd)
+
+    stdin = ''
+    if '-i' in argv or '--in-file' in argv:
+        stdin = sys.stdin.read()
+
+    latency(MON_LATENCY_ENV)
+    with State(state_path) as state:
+        state['stats']['commands'] += 1
+        rc, out, err = ceph(state, argv[1:], stdin)
+
+    sys.stdout.write(out)
+    sys.stderr.write(err)
+
+    return rc
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
@@ -0,0 +1,550 @@
+# Make coding more python3-ish
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import base64
+import json
+import os
+import subprocess
+
+from ansible_collections.stackhpc.cephadm.plugins.module_utils import cephadm_common
+from mock.mock import MagicMock, patch
+
+fake_pool = 'foo'
+fake_fsid = '7a9d3b5e-0000-4000-8000-0123456789ab'
+fake_osd_dump = {
+    'fsid': fake_fsid,
+    'epoch': 42,
+    'pools': [{'pool_name': fake_pool, 'pg_num': 32}],
+    'erasure_code_profiles': {'default': {'k': '2', 'm': '1'}},
+}
+fake_crush_rules = [{'rule_name': 'replicated_rule', 'type': 1}]
+
+
+def batch_line(index, rc, out, err):
+    return '{0} {1} {2} {3} {4}'.format(cephadm_common.BATCH_MARKER, index, rc,
+                                        base64.b64encode(out.encode()).decode(),
+                                        base64.b64encode(err.encode()).decode())
+
+
+def run_script(cmd_groups, parallelism=0):
+    cmd_list = [cmd for group in cmd_groups for cmd in group]
+    script = cephadm_common.generate_batch_script(cmd_groups, parallelism)
+    proc = subprocess.run(['bash'], input=script, stdout=subprocess.PIPE,
+                          stderr=subprocess.PIPE, universal_newlines=True)
+
+    return cephadm_common.parse_batch_output(cmd_list, proc.returncode,
+                                             proc.stdout, proc.stderr)
+
+
+class TestCephadmCommonBatch(object):
+
+    def test_container_cmd(self):
+        cmd = cephadm_common.generate_ceph_cmd(['osd', 'pool'], ['ls'])
+        assert cephadm_common.container_cmd(cmd) == ['ceph', 'osd', 'pool', 'ls']
+
+    def test_batch_script_runs_each_command(self):
+        cmd_list = [['cephadm', 'shell', '--', 'echo', 'a b'],
+                    ['cephadm', 'shell', '--', 'sh', '-c', 'echo oops >&2; exit 3'],
+                    ['cephadm', 'shell', '--', 'echo', 'c']]
+
+        results = run_script([[cmd] for cmd in cmd_list])
+
+        assert results == {0: (0, cmd_list[0], 'a b\n', ''),
+                           1: (3, cmd_list[1], '', 'oops\n'),
+                           2: (0, cmd_list[2], 'c\n', '')}
+
+    def test_batch_script_groups_stop_on_error(self):
+        cmd_list = [['cephadm', 'shell', '--', 'false'],
+                    ['cephadm', 'shell', '--', 'echo', 'never'],
+                    ['cephadm', 'shell', '--', 'echo', 'next group']]
+
+        results = run_script([cmd_list[:2], cmd_list[2:]])
+
+        assert results == {0: (1, cmd_list[0], '', ''),
+                           2: (0, cmd_list[2], 'next group\n', '')}
+
+    def test_batch_script_on_stdin(self):
+        # Longer than a single argument can be, commands reading stdin don't
+        # read the rest of the script
+        cmd_list = [['cephadm', 'shell', '--', 'cat']] + \
+            [['cephadm', 'shell', '--', 'echo', str(i), 'x' * 1024] for i in range(200)]
+
+        results = run_script([[cmd] for cmd in cmd_list])
+
+        assert len(results) == 201
+        assert results[0] == (0, cmd_list[0], '', '')
+        assert results[200] == (0, cmd_list[200], '199 ' + 'x' * 1024 + '\n', '')
+
+    def test_parallel_batch_script(self):
+        cmd_list = [['cephadm', 'shell', '--', 'sh', '-c', 'sleep 0.2; echo a'],
+                    ['cephadm', 'shell', '--', 'false'],
+                    ['cephadm', 'shell', '--', 'echo', 'never'],
+                    ['cephadm', 'shell', '--', 'echo', 'c'],
+                    ['cephadm', 'shell', '--', 'echo', 'd']]
+
+        results = run_script([cmd_list[:1], cmd_list[1:3], cmd_list[3:4], cmd_list[4:]], parallelism=2)
+
+        assert results == {0: (0, cmd_list[0], 'a\n', ''),
+                           1: (1, cmd_list[1], '', ''),
+                           3: (0, cmd_list[3], 'c\n', ''),
+                           4: (0, cmd_list[4], 'd\n', '')}
+
+    def test_exec_commands_batch_single_container(self):
+        module = MagicMock()
+        cmd_list = [cephadm_common.generate_ceph_cmd(['osd', 'pool'], ['stats', fake_pool]),
+                    cephadm_common.generate_ceph_cmd(['osd', 'pool'], ['ls'])]
+        module.run_command.return_value = (0,
+                                           batch_line(0, 2, '', 'ENOENT') + '\n' +
+                                           batch_line(1, 0, '[]', '') + '\n',
+                                           '')
+
+        results = cephadm_common.exec_commands_batch(module, cmd_list)
+
+        assert module.run_command.call_count == 1
+        cmd = module.run_command.call_args[0][0]
+        assert cmd == ['cephadm', '--timeout', '120', 'shell', '--', 'bash']
+        assert "_cephadm_run 1 ceph osd pool ls" in module.run_command.call_args[1]['data']
+        assert results == [(2, cmd_list[0], '', 'ENOENT'),
+                           (0, cmd_list[1], '[]', '')]
+
+    def test_exec_command_groups(self):
+        module = MagicMock()
+        cmd_groups = [[cephadm_common.generate_ceph_cmd(['osd', 'pool'], ['create', fake_pool]),
+                       cephadm_common.generate_ceph_cmd(['osd', 'pool'], ['application', 'enable', fake_pool, 'rbd'])],
+                      [cephadm_common.generate_ceph_cmd(['osd', 'pool'], ['rm', 'bar'])]]
+        module.run_command.return_value = (0,
+                                           batch_line(0, 1, '', 'EEXIST') + '\n' +
+                                           batch_line(2, 0, '', '') + '\n',
+                                           '')
+
+        results = cephadm_common.exec_command_groups(module, cmd_groups)
+
+        assert module.run_command.call_count == 1
+        assert results == [[(1, cmd_groups[0][0], '', 'EEXIST')],
+                           [(0, cmd_groups[1][0], '', '')]]
+
+    @patch('ansible_collections.stackhpc.cephadm.plugins.module_utils.cephadm_common.get_transport')
+    def test_exec_command_groups_parallel_transport(self, m_get_transport):
+        m_get_transport.return_value.name = 'rados'
+        m_get_transport.return_value.supports.return_value = True
+        m_get_transport.return_value.run.side_effect = lambda module, cmd, stdin: (1 if cmd[-1] == 'fail' else 0, '', '')
+        cmd_groups = [[cephadm_common.generate_ceph_cmd(['osd', 'pool'], ['set', fake_pool, 'size', '2'])],
+                      [cephadm_common.generate_ceph_cmd(['osd', 'pool'], ['fail']),
+                       cephadm_common.generate_ceph_cmd(['osd', 'pool'], ['never'])]]
+
+        results = cephadm_common.exec_command_groups(MagicMock(), cmd_groups, parallel=True)
+
+        assert results == [[(0, cmd_groups[0][0], '', '')],
+                           [(1, cmd_groups[1][0], '', '')]]
+
+    def test_exec_commands_batch_container_failure(self):
+        module = MagicMock()
+        cmd_list = [cephadm_common.generate_ceph_cmd(['osd', 'pool'], ['stats', fake_pool]),
+                    cephadm_common.generate_ceph_cmd(['osd', 'pool'], ['ls'])]
+        module.run_command.return_value = (1, '', 'Cannot infer an fsid')
+
+        results = cephadm_common.exec_commands_batch(module, cmd_list)
+
+        assert results == [(1, cmd_list[0], '', 'Cannot infer an fsid')]
+
+
+class TestCephadmCommonSnapshot(object):
+
+    def test_get_local_fsid(self, tmp_path):
+        conf = tmp_path / 'ceph.conf'
+        conf.write_text(u'[global]\n\tfsid = {0}\n\tmon_host = [v2:1.2.3.4:3300]\n'.format(fake_fsid))
+
+        assert cephadm_common.get_local_fsid(str(conf)) == fake_fsid
+        assert cephadm_common.get_local_fsid(str(tmp_path / 'missing')) is None
+
+    @patch('ansible_collections.stackhpc.cephadm.plugins.module_utils.cephadm_common.get_local_fsid')
+    def test_snapshot_is_cached_by_epoch(self, m_get_local_fsid, tmp_path):
+        m_get_local_fsid.return_value = fake_fsid
+        (tmp_path / fake_fsid).mkdir()
+        module = MagicMock()
+        module.run_command.side_effect = [
+            (0, json.dumps({'epoch': 42}), ''),
+            (0, batch_line(0, 0, json.dumps(fake_osd_dump), '') + '\n' +
+             batch_line(1, 0, json.dumps(fake_crush_rules), '') + '\n', ''),
+            (0, json.dumps({'epoch': 42}), ''),
+        ]
+
+        snapshot = cephadm_common.get_cluster_snapshot(module, str(tmp_path))
+        cached = cephadm_common.get_cluster_snapshot(module, str(tmp_path))
+
+        assert module.run_command.call_count == 3
+        assert snapshot == cached
+        assert snapshot['epoch'] == 42
+        assert snapshot['pools'][fake_pool]['pg_num'] == 32
+        assert snapshot['erasure_code_profiles']['default']['k'] == '2'
+        assert snapshot['crush_rules']['replicated_rule']['type'] == 1
+
+    @patch('ansible_collections.stackhpc.cephadm.plugins.module_utils.cephadm_common.get_local_fsid')
+    def test_snapshot_refreshed_on_new_epoch(self, m_get_local_fsid, tmp_path):
+        m_get_local_fsid.return_value = fake_fsid
+        (tmp_path / fake_fsid).mkdir()
+        cephadm_common.write_snapshot(str(tmp_path / fake_fsid / cephadm_common.SNAPSHOT_FILE),
+                                      cephadm_common.build_snapshot(fake_osd_dump, fake_crush_rules))
+        new_osd_dump = dict(fake_osd_dump, epoch=43, pools=[])
+        module = MagicMock()
+        module.run_command.side_effect = [
+            (0, json.dumps({'epoch': 43}), ''),
+            (0, batch_line(0, 0, json.dumps(new_osd_dump), '') + '\n' +
+             batch_line(1, 0, json.dumps(fake_crush_rules), '') + '\n', ''),
+        ]
+
+        snapshot = cephadm_common.get_cluster_snapshot(module, str(tmp_path))
+
+        assert snapshot['epoch'] == 43
+        assert snapshot['pools'] == {}
+
+    def test_snapshot_unavailable(self):
+        module = MagicMock()
+        module.run_command.return_value = (1, '', 'error')
+
+        assert cephadm_common.get_cluster_snapshot(module) is None
+
+
+class TestCephadmCommonFingerprint(object):
+
+    def test_fingerprint_of_desired_state(self):
+        fingerprint = cephadm_common.desired_state_fingerprint({'name': 'foo', 'size': '3', 'ceph_transport': 'cli'},
+                                                               ['name', 'size'])
+
+        assert fingerprint == cephadm_common.desired_state_fingerprint({'size': '3', 'name': 'foo'}, ['size', 'name'])
+        assert fingerprint != cephadm_common.desired_state_fingerprint({'name': 'foo', 'size': '2'}, ['name', 'size'])
+
+    def test_fingerprint_disabled(self):
+        module = MagicMock()
+        module.params = {'ceph_transport': 'cli', 'fingerprint': False, 'force_verify': False}
+
+        assert cephadm_common.check_fingerprint(module, 'pool', 'foo', ['name']) == (None, None, False)
+        cephadm_common.store_fingerprint(module, 'pool', 'foo', None)
+        assert module.run_command.call_count == 0
+
+    def test_force_verify(self):
+        module = MagicMock()
+        module.params = {'ceph_transport': 'cli', 'fingerprint': True, 'force_verify': True, 'name': 'foo'}
+
+        fingerprint, epoch, unchanged = cephadm_common.check_fingerprint(module, 'pool', 'foo', ['name'])
+
+        assert fingerprint == cephadm_common.desired_state_fingerprint({'name': 'foo'}, ['name'])
+        assert epoch is None
+        assert not unchanged
+        assert module.run_command.call_count == 0
+
+    def test_fingerprint_outdated_epoch(self):
+        module = MagicMock()
+        module.params = {'ceph_transport': 'cli', 'fingerprint': True, 'force_verify': False, 'name': 'foo'}
+        fingerprint = cephadm_common.desired_state_fingerprint(module.params, ['name'])
+        module.run_command.return_value = (
+            0, batch_line(0, 0, json.dumps({'epoch': 43}), '') + '\n' +
+            batch_line(1, 0, json.dumps({'fingerprint': fingerprint, 'epoch': 42}), '') + '\n', '')
+
+        assert cephadm_common.check_fingerprint(module, 'pool', 'foo', ['name']) == (fingerprint, 43, False)
+        assert module.run_command.call_count == 1
+
+
+class TestCephadmCommonShell(object):
+
+    def test_commands_share_one_shell(self):
+        module = MagicMock()
+        prefix = ['cephadm', '--timeout', '60', 'shell', '--']
+
+        with cephadm_common.CephShell(module, shell_cmd=['bash']) as shell:
+            rc, cmd, out, err = shell.run(prefix + ['sh', '-c', 'echo $$'])
+            assert rc == 0
+            assert cmd == prefix + ['sh', '-c', 'echo $$']
+            proc = shell.proc
+            assert shell.run(prefix + ['sh', '-c', 'echo out; echo err >&2; exit 3']) == \
+                (3, prefix + ['sh', '-c', 'echo out; echo err >&2; exit 3'], 'out\n', 'err\n')
+            assert shell.proc is proc
+
+            # The shell itself exits, it is started again for the next command
+            rc, cmd, out, err = shell.run(prefix + ['exit', '4'])
+            assert rc == 4
+            assert shell.proc is None
+            assert shell.run(prefix + ['echo', 'again'])[2] == 'again\n'
+
+        assert shell.proc is None
+
+
+class TestCephadmCommonShellPins(object):
+
+    def test_discover_shell_pins(self, tmp_path):
+        conf = tmp_path / 'ceph.conf'
+        conf.write_text(u'[global]\n\tfsid = {0}\n'.format(fake_fsid))
+        for daemon, image in (('crash.storage-0', 'crash-image'), ('mon.storage-0', 'mon-image')):
+            (tmp_path / fake_fsid / daemon).mkdir(parents=True)
+            (tmp_path / fake_fsid / daemon / 'unit.image').write_text(image + u'\n')
+
+        pins = cephadm_common.discover_shell_pins(str(conf), str(tmp_path / 'missing'), str(tmp_path))
+
+        assert pins == {'cephadm_fsid': fake_fsid, 'cephadm_config': str(conf), 'cephadm_image': 'mon-image'}
+        assert cephadm_common.discover_shell_pins(str(tmp_path / 'missing')) == {}
+
+    def test_discover_shell_pins_cache(self, tmp_path):
+        conf = tmp_path / 'ceph.conf'
+        conf.write_text(u'[global]\n\tfsid = {0}\n'.format(fake_fsid))
+        unit_image = tmp_path / fake_fsid / 'mon.storage-0' / 'unit.image'
+        unit_image.parent.mkdir(parents=True)
+        unit_image.write_text(u'old-image\n')
+        (tmp_path / 'run' / fake_fsid).mkdir(parents=True)
+        args = (str(conf), str(tmp_path / 'missing'), str(tmp_path), str(tmp_path / 'run'))
+
+        assert cephadm_common.discover_shell_pins(*args)['cephadm_image'] == 'old-image'
+        assert (tmp_path / 'run' / fake_fsid / cephadm_common.SHELL_PINS_FILE).exists()
+
+        # Served from the cache while the unit file is unchanged
+        with patch('glob.glob') as m_glob:
+            assert cephadm_common.discover_shell_pins(*args)['cephadm_image'] == 'old-image'
+        assert m_glob.call_count == 0
+
+        # Redeploying the daemon invalidates it
+        unit_image.write_text(u'new-image\n')
+        os.utime(str(unit_image), (0, 0))
+        assert cephadm_common.discover_shell_pins(*args)['cephadm_image'] == 'new-image'
+
+    @patch('ansible_collections.stackhpc.cephadm.plugins.module_utils.cephadm_common.discover_shell_pins')
+    def test_exec_command_pins_shell(self, m_discover_shell_pins):
+        m_discover_shell_pins.return_value = {'cephadm_fsid': fake_fsid, 'cephadm_image': 'discovered'}
+        module = MagicMock()
+        module.params = {'ceph_transport': 'cli', 'cephadm_discover': True, 'cephadm_image': 'pinned',
+                         'cephadm_keyring': '/etc/ceph/keyring'}
+        module.run_command.return_value = (0, '', '')
+        cmd = cephadm_common.generate_ceph_cmd(['osd', 'pool'], ['ls'])
+
+        rc, cmd, out, err = cephadm_common.exec_command(module, cmd)
+        cephadm_common.exec_command(module, cmd)
+
+        assert cmd == ['cephadm', '--image', 'pinned', '--timeout', '60', 'shell', '--fsid', fake_fsid,
+                       '--keyring', '/etc/ceph/keyring', '--', 'ceph', 'osd', 'pool', 'ls']
+        assert module.run_command.call_args[0][0] == cmd
+        # Discovered once per module run
+        assert m_discover_shell_pins.call_count == 1
+
+
+class TestCephadmCommonTransport(object):
+
+    def test_split_args(self):
+        transport = cephadm_common.MonCommandTransport(MagicMock(), validate=MagicMock())
+
+        assert transport.split_args(cephadm_common.generate_ceph_cmd(
+            ['osd', 'pool'], ['ls', 'detail', '-f', 'json'])) == (['osd', 'pool', 'ls', 'detail'], 'json')
+        assert transport.split_args(cephadm_common.generate_ceph_cmd(
+            ['osd', 'pool'], ['rm', fake_pool, fake_pool, '--yes-i-really-really-mean-it'])) == \
+            (['osd', 'pool', 'rm', fake_pool, fake_pool, '--yes-i-really-really-mean-it'], None)
+        assert transport.split_args(cephadm_common.generate_ceph_cmd(
+            ['auth'], ['get', 'client.foo', '-o', '/tmp/foo'])) is None
+        assert transport.split_args(['cephadm', 'ls']) is None
+
+    def test_falls_back_to_cli(self):
+        module = MagicMock()
+        module.run_command.return_value = (0, 'out', '')
+        cluster = MagicMock()
+        cephadm_common.set_transport(module, cephadm_common.MonCommandTransport(cluster, validate=MagicMock()))
+        cmd = cephadm_common.generate_ceph_cmd(['auth'], ['get', 'client.foo', '-o', '/tmp/foo'])
+
+        assert cephadm_common.exec_command(module, cmd) == (0, cmd, 'out', '')
+        assert not cluster.mon_command.called
+
+    def test_batch_runs_commands_individually(self):
+        module = MagicMock()
+        cluster = MagicMock()
+        cluster.mon_command.return_value = (0, b'[]', '')
+        cephadm_common.set_transport(module, cephadm_common.MonCommandTransport(
+            cluster, validate=lambda args: {'prefix': ' '.join(args)}))
+        cmd_list = [cephadm_common.generate_ceph_cmd(['osd', 'pool'], ['ls']),
+                    cephadm_common.generate_ceph_cmd(['osd', 'pool'], ['stats', fake_pool, '-f', 'json'])]
+
+        results = cephadm_common.exec_commands_batch(module, cmd_list)
+
+        assert not module.run_command.called
+        assert results == [(0, cmd_list[0], '[]', ''), (0, cmd_list[1], '[]', '')]
+        assert json.loads(cluster.mon_command.call_args[0][0]) == {
+            'prefix': 'osd pool stats {0}'.format(fake_pool), 'format': 'json'}
+
+    @patch('ansible_collections.stackhpc.cephadm.plugins.module_utils.cephadm_common.connect_rados')
+    def test_get_transport(self, m_connect_rados):
+        # The CLI is used unless another transport is chosen
+        module = MagicMock()
+        module.params = {}
+        assert cephadm_common.get_transport(module).name == 'cli'
+        assert not m_connect_rados.called
+
+        module = MagicMock()
+        module.params = {'ceph_transport': 'auto'}
+        m_connect_rados.return_value = MagicMock()
+        assert cephadm_common.get_transport(module).name == 'rados'
+
+        # The host CLI is only used when chosen
+        module = MagicMock()
+        module.params = {'ceph_transport': 'auto'}
+        module.get_bin_path.return_value = '/usr/bin/ceph'
+        m_connect_rados.return_value = None
+        assert cephadm_common.get_transport(module).name == 'cli'
+        assert not module.get_bin_path.called
+
+    @patch('ansible_collections.stackhpc.cephadm.plugins.module_utils.cephadm_common.connect_rados')
+    def test_host_cli(self, m_connect_rados, tmp_path):
+        conf = tmp_path / 'ceph.conf'
+        keyring = tmp_path / 'keyring'
+        conf.write_text(u'[global]\n')
+        keyring.write_text(u'[client.admin]\n')
+        module = MagicMock()
+        module.params = {'ceph_transport': 'host', 'cephadm_config': str(conf), 'cephadm_keyring': str(keyring)}
+        module.get_bin_path.return_value = '/usr/bin/ceph'
+        module.run_command.return_value = (0, '[]', '')
+        cmd = cephadm_common.generate_ceph_cmd(['osd', 'pool'], ['ls', '-f', 'json'])
+        get_key = cephadm_common.generate_ceph_cmd(['auth'], ['get', 'client.foo', '-o', '/tmp/foo'])
+
+        rc, cmd, out, err = cephadm_common.exec_command(module, cmd)
+        assert (rc, out) == (0, '[]')
+        assert module.run_command.call_args[0][0] == ['/usr/bin/ceph', '--conf', str(conf), '--keyring', str(keyring),
+                                                      'osd', 'pool', 'ls', '-f', 'json']
+        assert cephadm_common.get_timings(module)[0]['transport'] == 'host'
+
+        # The output file is a path in the container
+        cephadm_common.exec_command(module, get_key)
+        assert module.run_command.call_args[0][0][:3] == ['cephadm', '--timeout', '60']
+        assert module.run_command.call_args[0][0][-4:] == ['get', 'client.foo', '-o', '/tmp/foo']
+        assert not m_connect_rados.called
+
+    def test_host_cli_not_installed(self):
+        module = MagicMock()
+        module.params = {'ceph_transport': 'host'}
+        module.get_bin_path.return_value = None
+
+        assert cephadm_common.find_host_ceph(module) is None
+
+
+def run_container(cmd, **kwargs):
+    '''
+    Run the part of a 'cephadm shell' command line run in the container
+    '''
+
+    proc = subprocess.run(cephadm_common.container_cmd(cmd), input=kwargs.get('data'), stdout=subprocess.PIPE,
+                          stderr=subprocess.PIPE, universal_newlines=True)
+    return proc.returncode, proc.stdout, proc.stderr
+
+
+class TestCephadmCommonTimings(object):
+
+    def test_batch_script_reports_timings(self):
+        cmd_list = [['cephadm', 'shell', '--', 'sh', '-c', 'sleep 0.1'],
+                    ['cephadm', 'shell', '--', 'true']]
+        script = cephadm_common.generate_batch_script([[cmd] for cmd in cmd_list])
+        proc = subprocess.run(['bash'], input=script, stdout=subprocess.PIPE,
+                              universal_newlines=True)
+
+        timings = cephadm_common.parse_batch_timings(proc.stdout)
+
+        assert sorted(timings, key=str) == [0, 1, 'total']
+        assert 0.1 <= timings[0] <= timings['total']
+        assert timings[1] < 0.1
+
+    def test_exec_command_records_timing(self):
+        module = MagicMock()
+        module.params = {'ceph_transport': 'cli'}
+        module.run_command.return_value = (0, 'foo', '')
+        cmd = cephadm_common.generate_ceph_cmd(['osd', 'pool'], ['ls'])
+
+        cephadm_common.exec_command(module, cmd)
+
+        timings = cephadm_common.get_timings(module)
+        assert len(timings) == 1
+        assert timings[0]['cmd'] == cmd
+        assert timings[0]['rc'] == 0
+        assert timings[0]['stdout_bytes'] == 3
+        assert timings[0]['stderr_bytes'] == 0
+        assert timings[0]['transport'] == 'cli'
+        assert timings[0]['duration'] >= 0
+        assert 'cephadm' not in timings[0]
+
+    def test_detailed_timings(self):
+        module = MagicMock()
+        module.params = {'ceph_transport': 'cli', 'detailed_timings': True}
+        module.run_command.side_effect = run_container
+        cmd = ['cephadm', '--timeout', '60', 'shell', '--', 'sh', '-c', 'echo foo; exit 2']
+
+        assert cephadm_common.exec_command(module, cmd) == (2, cmd, 'foo\n', '')
+
+        timings = cephadm_common.get_timings(module)
+        assert len(timings) == 1
+        assert timings[0]['cmd'] == cmd
+        assert timings[0]['rc'] == 2
+        assert timings[0]['stdout_bytes'] == 4
+        assert timings[0]['cephadm'] >= 0
+        assert timings[0]['ceph'] <= timings[0]['duration']
+
+    def test_batch_timings(self):
+        module = MagicMock()
+        module.params = {'ceph_transport': 'cli', 'detailed_timings': True}
+        module.run_command.side_effect = run_container
+        cmd_list = [['cephadm', 'shell', '--', 'echo', 'a'],
+                    ['cephadm', 'shell', '--', 'false']]
+
+        cephadm_common.exec_commands_batch(module, cmd_list)
+
+        timings = cephadm_common.get_timings(module)
+        assert [t['rc'] for t in timings] == [0, 0, 1]
+        assert timings[0]['cmd'][-1] == '<batch of 2 commands>'
+        assert timings[0]['batch'] == 2
+        assert timings[0]['ceph'] <= timings[0]['duration']
+        assert [t['cmd'] for t in timings[1:]] == cmd_list
+        assert all(t['batched'] for t in timings[1:])
+
+
+class TestCephadmCommonJson(object):
+
+    def test_select_json(self):
+        text = json.dumps({
+            'epoch': 42,
+            'pools': [{'pool_name': 'a "[quoted]" {name}', 'size': 3, 'options': {'x': [1, {}]}},
+                      {'pool_name': 'b', 'size': 2.5e1, 'options': {}}],
+            'osds': [{'osd': i, 'up': True, 'addrs': ['\\u00e9\\\\"]'] * 3} for i in range(50)],
+            'empty': [],
+        })
+        paths = ['epoch', 'pools.*.pool_name', 'pools.*.size', 'empty', 'missing.key']
+        expected = {
+            'epoch': 42,
+            'pools': [{'pool_name': 'a "[quoted]" {name}', 'size': 3},
+                      {'pool_name': 'b', 'size': 25.0}],
+            'empty': [],
+        }
+
+        assert cephadm_common.parse_json(text, paths) == expected
+        assert cephadm_common.parse_json(text) == json.loads(text)
+        # Values split at every possible chunk boundary
+        data = text.encode()
+        for size in (1, 2, 3, 7):
+            chunks = [data[i:i + size] for i in range(0, len(data), size)]
+            assert cephadm_common.select_json(chunks, paths) == expected
+        assert cephadm_common.select_json([b'[1', b'2, 3', b'4]'], ['*']) == [12, 34]
+
+    def test_select_json_invalid(self):
+        for text in ('', '{"a": 1', '{"a": 1} x', '[1 2]'):
+            try:
+                cephadm_common.parse_json(text, ['a'])
+            except ValueError:
+                continue
+            raise AssertionError(text)
+
+    @patch.object(cephadm_common, 'JSON_CHUNK_SIZE', 16)
+    def test_exec_command_json(self):
+        module = MagicMock()
+        module.params = {'ceph_transport': 'cli', 'detailed_timings': True}
+        output = json.dumps({'pool_stats': [{'poolid': i, 'num_pg': 32, 'stat_sum': {'num_bytes': i}}
+                                            for i in range(100)]})
+        cmd = ['sh', '-c', 'printf %s "$0"; echo warning >&2', output]
+
+        rc, cmd, data, err = cephadm_common.exec_command_json(module, cmd, ['pool_stats.*.num_pg'])
+
+        assert (rc, err) == (0, 'warning\n')
+        assert data == {'pool_stats': [{'num_pg': 32}] * 100}
+        timings = cephadm_common.get_timings(module)
+        assert timings[0]['stdout_bytes'] == len(output)
+
+        rc, cmd, data, err = cephadm_common.exec_command_json(module, ['sh', '-c', 'echo "{"; exit 3'])
+        assert (rc, data) == (3, None)
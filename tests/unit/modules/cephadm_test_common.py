@@ -1,5 +1,8 @@
 from ansible.module_utils.testing import patch_module_args
+import base64
 import contextlib
+import errno
+import json
 
 
 @contextlib.contextmanager
@@ -13,6 +16,17 @@ def set_module_args(args):
         yield
 
 
+def batch_output(results):
+    '''
+    Format (index, rc, stdout, stderr) tuples like a batch of commands
+    '''
+
+    return ''.join('__CEPHADM_BATCH_RESULT__ {0} {1} {2} {3}\n'.format(
+        index, rc, base64.b64encode(out.encode()).decode(),
+        base64.b64encode(err.encode()).decode())
+        for index, rc, out, err in results)
+
+
 class AnsibleExitJson(Exception):
     pass
 
@@ -27,3 +41,37 @@ def exit_json(*args, **kwargs):
 
 def fail_json(*args, **kwargs):
     raise AnsibleFailJson(kwargs)
+
+
+class FakeCrushCluster(object):
+    '''
+    In-process stand-in for rados.Rados handling CRUSH rule mon commands
+    '''
+
+    def __init__(self, rules=None):
+        self.rules = dict(rules or {})
+        self.commands = []
+
+    def mon_command(self, cmd, inbuf, timeout=0):
+        cmd = json.loads(cmd)
+        self.commands.append(cmd)
+        name = cmd.get('name')
+        if cmd['prefix'] == 'osd crush rule dump':
+            if name not in self.rules:
+                return -errno.ENOENT, b'', "unknown crush rule '{0}'".format(name)
+            return 0, json.dumps(self.rules[name]).encode(), ''
+        if cmd['prefix'] == 'osd crush rule create-replicated':
+            self.rules[name] = {'rule_name': name, 'type': 1}
+            return 0, b'', ''
+        if cmd['prefix'] == 'osd crush rule rm':
+            self.rules.pop(name, None)
+            return 0, b'', ''
+        return -errno.EINVAL, b'', 'command not known'
+
+    @staticmethod
+    def validate(args):
+        if args[:3] != ['osd', 'crush', 'rule']:
+            return None
+        argdict = {'prefix': ' '.join(args[:4])}
+        argdict.update(zip(['name', 'root', 'type', 'class'], args[4:]))
+        return argdict
@@ -0,0 +1,141 @@
+# Make coding more python3-ish
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import json
+import pytest
+
+from . import cephadm_test_common
+from ansible_collections.stackhpc.cephadm.plugins.modules import cephadm_batch
+from mock.mock import patch
+
+fake_fsid = '7a9d3b5e-0000-4000-8000-0123456789ab'
+fake_old_pool = {
+    'pool_name': 'old',
+    'pg_num': 32,
+    'pg_placement_num': 32,
+    'size': 3,
+    'crush_rule': 5,
+    'pg_autoscale_mode': 'on',
+    'options': {},
+    'erasure_code_profile': 'oldprof',
+    'flags_names': 'hashpspool',
+    'application_metadata': {},
+}
+fake_replicated_rule = {'rule_id': 0, 'rule_name': 'replicated_rule', 'type': 1}
+fake_old_rule = {'rule_id': 5, 'rule_name': 'oldrule', 'type': 3}
+
+
+def read_output(pools=None, profiles=None, rules=None, keys=None):
+    osd_dump = {'fsid': fake_fsid, 'epoch': 7, 'pools': pools or [],
+                'erasure_code_profiles': profiles or {}}
+    return cephadm_test_common.batch_output([
+        (0, 0, json.dumps(osd_dump), ''),
+        (1, 0, json.dumps(rules or [fake_replicated_rule]), ''),
+        (2, 0, json.dumps({'auth_dump': keys or []}), ''),
+    ])
+
+
+new_objects = {
+    'ec_profiles': [{'name': 'ec42', 'k': '4', 'm': '2'}],
+    'crush_rules': [{'name': 'ec42', 'rule_type': 'erasure', 'profile': 'ec42'}],
+    'pools': [
+        {'name': 'data', 'pool_type': 'erasure', 'erasure_profile': 'ec42',
+         'rule_name': 'ec42', 'application': 'rgw'},
+        {'name': 'images'},
+    ],
+    'keys': [{'name': 'client.rgw',
+              'caps': {'mon': 'allow r', 'osd': 'allow rwx pool=data'}}],
+}
+
+
+class TestCephadmBatchModule(object):
+
+    @patch('ansible.module_utils.basic.AnsibleModule.exit_json')
+    @patch('ansible.module_utils.basic.AnsibleModule.run_command')
+    def test_dependency_order(self, m_run_command, m_exit_json):
+        args = dict(new_objects, _ansible_check_mode=True)
+        with cephadm_test_common.set_module_args(args):
+            m_exit_json.side_effect = cephadm_test_common.exit_json
+            m_run_command.return_value = 0, read_output(), ''
+
+            with pytest.raises(cephadm_test_common.AnsibleExitJson) as result:
+                cephadm_batch.main()
+
+            result = result.value.args[0]
+            assert result['changed']
+            assert m_run_command.call_count == 1
+            assert result['schedule'] == [['ec_profiles/ec42', 'pools/images'],
+                                          ['crush_rules/ec42'],
+                                          ['pools/data'],
+                                          ['keys/client.rgw']]
+            assert result['keys'][0]['cmds'][0][6:9] == ['auth', 'get-or-create', 'client.rgw']
+
+    @patch('ansible.module_utils.basic.AnsibleModule.fail_json')
+    @patch('ansible.module_utils.basic.AnsibleModule.run_command')
+    def test_failure_skips_dependents(self, m_run_command, m_fail_json):
+        with cephadm_test_common.set_module_args(dict(new_objects)):
+            m_fail_json.side_effect = cephadm_test_common.fail_json
+            m_run_command.side_effect = [
+                (0, read_output(), ''),
+                (0, cephadm_test_common.batch_output([(0, 22, '', 'Error EINVAL: bad k'),
+                                                      (1, 0, '', '')]), ''),
+            ]
+
+            with pytest.raises(cephadm_test_common.AnsibleFailJson) as result:
+                cephadm_batch.main()
+
+            result = result.value.args[0]
+            assert m_run_command.call_count == 2
+            assert result['msg'] == "Couldn't reconcile: ec_profiles/ec42, crush_rules/ec42, pools/data, keys/client.rgw"
+            assert result['changed']
+            assert result['ec_profiles'][0]['stderr'] == 'Error EINVAL: bad k'
+            assert result['crush_rules'][0]['stdout'] == 'Skipped, since ec_profiles ec42 failed'
+            assert result['pools'][0]['stdout'] == 'Skipped, since crush_rules ec42, ec_profiles ec42 failed'
+            assert result['keys'][0]['stdout'] == 'Skipped, since pools data failed'
+            assert result['pools'][1]['changed']
+
+    @patch('ansible.module_utils.basic.AnsibleModule.exit_json')
+    @patch('ansible.module_utils.basic.AnsibleModule.run_command')
+    def test_nothing_to_do(self, m_run_command, m_exit_json):
+        args = {
+            'ec_profiles': [{'name': 'oldprof', 'k': '4', 'm': '2'}],
+            'pools': [{'name': 'old'}],
+        }
+        with cephadm_test_common.set_module_args(args):
+            m_exit_json.side_effect = cephadm_test_common.exit_json
+            m_run_command.return_value = 0, read_output([fake_old_pool], {'oldprof': {'k': '4', 'm': '2'}}), ''
+
+            with pytest.raises(cephadm_test_common.AnsibleExitJson) as result:
+                cephadm_batch.main()
+
+            result = result.value.args[0]
+            assert not result['changed']
+            assert m_run_command.call_count == 1
+            assert result['schedule'] == []
+            # No key is managed, 'auth ls' isn't needed
+            assert '<batch of 2 commands>' in result['timings'][0]['cmd']
+
+    @patch('ansible.module_utils.basic.AnsibleModule.exit_json')
+    @patch('ansible.module_utils.basic.AnsibleModule.run_command')
+    def test_removal_order(self, m_run_command, m_exit_json):
+        args = {
+            'ec_profiles': [{'name': 'oldprof', 'state': 'absent'}],
+            'crush_rules': [{'name': 'oldrule', 'state': 'absent'}],
+            'pools': [{'name': 'old', 'state': 'absent'}],
+            '_ansible_check_mode': True,
+        }
+        with cephadm_test_common.set_module_args(args):
+            m_exit_json.side_effect = cephadm_test_common.exit_json
+            m_run_command.return_value = 0, read_output([fake_old_pool],
+                                                        {'oldprof': {'k': '4', 'm': '2'}},
+                                                        [fake_replicated_rule, fake_old_rule]), ''
+
+            with pytest.raises(cephadm_test_common.AnsibleExitJson) as result:
+                cephadm_batch.main()
+
+            result = result.value.args[0]
+            # The rule and the profile are only removed once the pool using
+            # them is gone
+            assert result['schedule'] == [['pools/old'],
+                                          ['crush_rules/oldrule', 'ec_profiles/oldprof']]
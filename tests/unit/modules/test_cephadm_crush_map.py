@@ -0,0 +1,124 @@
+# Make coding more python3-ish
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import json
+import pytest
+
+from . import cephadm_test_common
+from ansible_collections.stackhpc.cephadm.plugins.modules import cephadm_crush_map
+from mock.mock import patch
+
+shell_prefix = ['cephadm', '--timeout', '60', 'shell', '--']
+cephadm_prefix = shell_prefix + ['ceph']
+fake_crush = json.dumps({
+    'buckets': [
+        {'id': -1, 'name': 'default', 'type_name': 'root', 'items': [{'id': -2}]},
+        {'id': -2, 'name': 'storage-0', 'type_name': 'host', 'items': []},
+    ],
+    'rules': [
+        {'rule_id': 0, 'rule_name': 'replicated_rule', 'type': 1},
+        {'rule_id': 2, 'rule_name': 'old_rule', 'type': 1},
+    ],
+})
+fake_osd_dump = json.dumps({
+    'crush_version': 7,
+    'pools': [{'pool_name': 'rbd', 'crush_rule': 0, 'size': 3}],
+})
+args = {
+    'buckets': [
+        {'name': 'rack1', 'type': 'rack', 'location': {'root': 'default'}},
+        {'name': 'storage-0', 'location': {'rack': 'rack1'}},
+    ],
+    'rules': [
+        {'name': 'old_rule', 'state': 'absent'},
+        {'name': 'replicated_rack', 'rule_type': 'replicated',
+         'bucket_root': 'default', 'bucket_type': 'rack'},
+    ],
+    'ceph_transport': 'cli',
+}
+
+
+def read_batch():
+    return (0, cephadm_test_common.batch_output([(0, 0, fake_crush, ''),
+                                                 (1, 0, fake_osd_dump, '')]), '')
+
+
+class TestCephadmCrushMapModule(object):
+
+    def test_new_rule_ids(self):
+        rules = {'a': {'rule_id': 0}, 'b': {'rule_id': 2}}
+        assert cephadm_crush_map.new_rule_ids(rules, 2) == [1, 3]
+
+    @patch('ansible_collections.stackhpc.cephadm.plugins.module_utils.cephadm_common.CephShell.close')
+    @patch('ansible_collections.stackhpc.cephadm.plugins.module_utils.cephadm_common.CephShell.run')
+    @patch('ansible.module_utils.basic.AnsibleModule.exit_json')
+    @patch('ansible.module_utils.basic.AnsibleModule.run_command')
+    def test_single_inject(self, m_run_command, m_exit_json, m_run, m_close):
+        with cephadm_test_common.set_module_args(args):
+            m_exit_json.side_effect = cephadm_test_common.exit_json
+            m_run_command.return_value = read_batch()
+            m_run.side_effect = lambda cmd: (0, cmd, '', '')
+
+            with pytest.raises(cephadm_test_common.AnsibleExitJson) as result:
+                cephadm_crush_map.main()
+
+            result = result.value.args[0]
+            assert result['changed']
+            assert [b['changed'] for b in result['buckets']] == [True, True]
+            assert [r['changed'] for r in result['rules']] == [True, True]
+            assert m_run_command.call_count == 1
+
+            cmds = [call[0][0] for call in m_run.call_args_list]
+            crushtool = shell_prefix + ['crushtool', '-i', '/tmp/crushmap']
+            assert cmds[0] == cephadm_prefix + ['osd', 'getcrushmap', '-o', '/tmp/crushmap']
+            # Buckets, then new rules, then removed rules
+            assert cmds[1:5] == [
+                crushtool + ['--add-bucket', 'rack1', 'rack', '--loc', 'root', 'default', '-o', '/tmp/crushmap'],
+                crushtool + ['--move', 'storage-0', '--loc', 'rack', 'rack1', '-o', '/tmp/crushmap'],
+                crushtool + ['--create-replicated-rule', 'replicated_rack', 'default', 'rack', '-o', '/tmp/crushmap'],
+                crushtool + ['--remove-rule', 'old_rule', '-o', '/tmp/crushmap'],
+            ]
+            # The pool's rule at its size, and the new rule at id 1
+            assert [cmd[-1].split(' --rule ')[1].split(' --min-x')[0] for cmd in cmds[5:7]] == \
+                ['0 --num-rep 3', '1 --num-rep 3']
+            assert cmds[7:] == [cephadm_prefix + ['osd', 'setcrushmap', '-i', '/tmp/crushmap', '7']]
+            assert result['cmds'] == cmds
+
+    @patch('ansible_collections.stackhpc.cephadm.plugins.module_utils.cephadm_common.CephShell.close')
+    @patch('ansible_collections.stackhpc.cephadm.plugins.module_utils.cephadm_common.CephShell.run')
+    @patch('ansible.module_utils.basic.AnsibleModule.fail_json')
+    @patch('ansible.module_utils.basic.AnsibleModule.run_command')
+    def test_bad_mapping_not_injected(self, m_run_command, m_fail_json, m_run, m_close):
+        with cephadm_test_common.set_module_args(args):
+            m_fail_json.side_effect = cephadm_test_common.fail_json
+            m_run_command.return_value = read_batch()
+            # getcrushmap and the four edits succeed, the first test fails
+            m_run.side_effect = [(0, cephadm_prefix, '', '')] * 5 + \
+                [(1, cephadm_prefix, 'bad mapping rule 0 x 12 num_rep 3 result [1,2]', '')]
+
+            with pytest.raises(cephadm_test_common.AnsibleFailJson) as result:
+                cephadm_crush_map.main()
+
+            result = result.value.args[0]
+            assert not result['changed']
+            assert m_run.call_count == 6
+            assert all(r['rc'] == 1 and r['stdout'].startswith('bad mapping')
+                       for r in result['buckets'] + result['rules'])
+            assert not any(call[0][0][-5:-3] == ['osd', 'setcrushmap'] for call in m_run.call_args_list)
+
+    @patch('ansible.module_utils.basic.AnsibleModule.fail_json')
+    @patch('ansible.module_utils.basic.AnsibleModule.run_command')
+    def test_rule_in_use(self, m_run_command, m_fail_json):
+        in_use = dict(args, buckets=[], rules=[{'name': 'replicated_rule', 'state': 'absent'}],
+                      _ansible_check_mode=True)
+        with cephadm_test_common.set_module_args(in_use):
+            m_fail_json.side_effect = cephadm_test_common.fail_json
+            m_run_command.return_value = read_batch()
+
+            with pytest.raises(cephadm_test_common.AnsibleFailJson) as result:
+                cephadm_crush_map.main()
+
+            result = result.value.args[0]
+            assert result['rules'][0]['stdout'] == 'Crush Rule replicated_rule is used by pool(s) rbd'
+            assert result['cmds'] == []
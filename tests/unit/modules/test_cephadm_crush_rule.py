@@ -6,6 +6,7 @@ import pytest
 
 from . import cephadm_test_common
 from ansible_collections.stackhpc.cephadm.plugins.modules import cephadm_crush_rule
+from ansible_collections.stackhpc.cephadm.plugins.module_utils import cephadm_common
 from mock.mock import patch
 
 fake_cluster = 'ceph'
@@ -46,7 +47,8 @@ class TestCephCrushRuleModule(object):
             assert result['msg'] == 'state is present but all of the following are missing: rule_type'
 
     @patch('ansible.module_utils.basic.AnsibleModule.exit_json')
-    def test_with_check_mode(self, m_exit_json):
+    @patch('ansible.module_utils.basic.AnsibleModule.run_command')
+    def test_with_check_mode(self, m_run_command, m_exit_json):
         args = {
             'name': fake_name,
             'rule_type': 'replicated',
@@ -56,15 +58,45 @@ class TestCephCrushRuleModule(object):
         }
         with cephadm_test_common.set_module_args(args):
             m_exit_json.side_effect = cephadm_test_common.exit_json
+            m_run_command.return_value = 2, '', "Error ENOENT: unknown crush rule '{0}'".format(fake_name)
 
             with pytest.raises(cephadm_test_common.AnsibleExitJson) as result:
                 cephadm_crush_rule.main()
 
             result = result.value.args[0]
-            assert not result['changed']
+            # Only the rule is read, its creation is reported
+            assert m_run_command.call_count == 1
+            assert result['changed']
             assert result['rc'] == 0
-            assert not result['stdout']
+            assert result['stdout'] == 'Crush Rule {0} created.'.format(fake_name)
             assert not result['stderr']
+            assert result['cmds'] == [['cephadm', '--timeout', '60', 'shell', '--', 'ceph', 'osd', 'crush', 'rule',
+                                       'create-replicated', fake_name, fake_bucket_root, fake_bucket_type]]
+            assert result['diff'] == {'before': {},
+                                      'after': {'rule_type': 'replicated',
+                                                'bucket_root': fake_bucket_root,
+                                                'bucket_type': fake_bucket_type}}
+
+    @patch('ansible.module_utils.basic.AnsibleModule.fail_json')
+    @patch('ansible.module_utils.basic.AnsibleModule.run_command')
+    def test_with_check_mode_type_mismatch(self, m_run_command, m_fail_json):
+        args = {
+            'name': fake_name,
+            'rule_type': 'erasure',
+            'profile': fake_profile,
+            '_ansible_check_mode': True
+        }
+        with cephadm_test_common.set_module_args(args):
+            m_fail_json.side_effect = cephadm_test_common.fail_json
+            m_run_command.return_value = 0, '{"rule_name": "foo", "type": 1}', ''
+
+            with pytest.raises(cephadm_test_common.AnsibleFailJson) as result:
+                cephadm_crush_rule.main()
+
+            result = result.value.args[0]
+            assert m_run_command.call_count == 1
+            assert result['msg'] == 'Can not convert crush rule {0} to erasure'.format(fake_name)
+            assert result['diff']['before'] == {'rule_type': 'replicated'}
 
     @patch('ansible.module_utils.basic.AnsibleModule.exit_json')
     @patch('ansible.module_utils.basic.AnsibleModule.run_command')
@@ -403,3 +435,103 @@ class TestCephCrushRuleModule(object):
             assert result['rc'] == rc
             assert result['stderr'] == stderr
             assert result['stdout'] == stdout
+
+    @patch('ansible.module_utils.basic.AnsibleModule.exit_json')
+    @patch('ansible_collections.stackhpc.cephadm.plugins.modules.cephadm_crush_rule.get_cluster_snapshot')
+    @patch('ansible.module_utils.basic.AnsibleModule.run_command')
+    def test_create_existing_rule_from_snapshot(self, m_run_command, m_get_cluster_snapshot, m_exit_json):
+        args = {
+            'name': fake_name,
+            'rule_type': 'replicated',
+            'bucket_root': fake_bucket_root,
+            'bucket_type': fake_bucket_type,
+            'cluster_snapshot': True
+        }
+        with cephadm_test_common.set_module_args(args):
+            m_exit_json.side_effect = cephadm_test_common.exit_json
+            m_get_cluster_snapshot.return_value = {
+                'crush_rules': {fake_name: {'rule_name': fake_name, 'type': 1}}
+            }
+
+            with pytest.raises(cephadm_test_common.AnsibleExitJson) as result:
+                cephadm_crush_rule.main()
+
+            result = result.value.args[0]
+            assert not result['changed']
+            assert not m_run_command.called
+            assert result['rc'] == 0
+
+    @patch('ansible.module_utils.basic.AnsibleModule.exit_json')
+    @patch('ansible_collections.stackhpc.cephadm.plugins.modules.cephadm_crush_rule.get_cluster_snapshot')
+    @patch('ansible.module_utils.basic.AnsibleModule.run_command')
+    def test_create_non_existing_rule_from_snapshot(self, m_run_command, m_get_cluster_snapshot, m_exit_json):
+        args = {
+            'name': fake_name,
+            'rule_type': 'erasure',
+            'profile': fake_profile,
+            'cluster_snapshot': True
+        }
+        with cephadm_test_common.set_module_args(args):
+            m_exit_json.side_effect = cephadm_test_common.exit_json
+            m_get_cluster_snapshot.return_value = {'crush_rules': {}}
+            m_run_command.return_value = 0, '', ''
+
+            with pytest.raises(cephadm_test_common.AnsibleExitJson) as result:
+                cephadm_crush_rule.main()
+
+            result = result.value.args[0]
+            assert result['changed']
+            assert m_run_command.call_count == 1
+            assert result['cmd'] == ['cephadm', '--timeout', '60', 'shell', '--', 'ceph',
+                                     'osd', 'crush', 'rule', 'create-erasure', fake_name, fake_profile]
+
+    @patch('ansible.module_utils.basic.AnsibleModule.exit_json')
+    @patch('ansible_collections.stackhpc.cephadm.plugins.module_utils.cephadm_common.get_transport')
+    @patch('ansible.module_utils.basic.AnsibleModule.run_command')
+    def test_create_non_existing_replicated_rule_rados(self, m_run_command, m_get_transport, m_exit_json):
+        args = {
+            'name': fake_name,
+            'rule_type': 'replicated',
+            'bucket_root': fake_bucket_root,
+            'bucket_type': fake_bucket_type,
+            'ceph_transport': 'rados'
+        }
+        with cephadm_test_common.set_module_args(args):
+            m_exit_json.side_effect = cephadm_test_common.exit_json
+            cluster = cephadm_test_common.FakeCrushCluster()
+            m_get_transport.return_value = cephadm_common.MonCommandTransport(
+                cluster, validate=cluster.validate)
+
+            with pytest.raises(cephadm_test_common.AnsibleExitJson) as result:
+                cephadm_crush_rule.main()
+
+            result = result.value.args[0]
+            assert result['changed']
+            assert result['rc'] == 0
+            assert not m_run_command.called
+            assert cluster.commands == [
+                {'prefix': 'osd crush rule dump', 'name': fake_name, 'format': 'json'},
+                {'prefix': 'osd crush rule create-replicated', 'name': fake_name,
+                 'root': fake_bucket_root, 'type': fake_bucket_type},
+            ]
+            assert cluster.rules[fake_name]['type'] == 1
+
+    @patch('ansible.module_utils.basic.AnsibleModule.exit_json')
+    @patch('ansible_collections.stackhpc.cephadm.plugins.module_utils.cephadm_common.get_transport')
+    def test_get_non_existing_rule_rados(self, m_get_transport, m_exit_json):
+        args = {
+            'name': fake_name,
+            'state': 'info'
+        }
+        with cephadm_test_common.set_module_args(args):
+            m_exit_json.side_effect = cephadm_test_common.exit_json
+            cluster = cephadm_test_common.FakeCrushCluster()
+            m_get_transport.return_value = cephadm_common.MonCommandTransport(
+                cluster, validate=cluster.validate)
+
+            with pytest.raises(cephadm_test_common.AnsibleExitJson) as result:
+                cephadm_crush_rule.main()
+
+            result = result.value.args[0]
+            assert result['rc'] == 2
+            assert result['stderr'] == 'Error ENOENT: unknown crush rule \'{0}\''.format(fake_name)
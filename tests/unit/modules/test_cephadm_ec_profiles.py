@@ -0,0 +1,103 @@
+# Make coding more python3-ish
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import json
+import pytest
+
+from . import cephadm_test_common
+from ansible_collections.stackhpc.cephadm.plugins.module_utils import cephadm_ec_profile_common
+from ansible_collections.stackhpc.cephadm.plugins.modules import cephadm_ec_profiles
+from mock.mock import patch
+
+cephadm_prefix = ['cephadm', '--timeout', '60', 'shell', '--', 'ceph']
+# A profile set with 'k=4 m=2 stripe_unit=8K', as stored by the monitors
+fake_ec42 = {
+    'crush-device-class': '',
+    'crush-failure-domain': 'host',
+    'crush-root': 'default',
+    'jerasure-per-chunk-alignment': 'false',
+    'k': '4',
+    'm': '2',
+    'plugin': 'jerasure',
+    'stripe_unit': '8K',
+    'technique': 'reed_sol_van',
+    'w': '8',
+}
+enoent = "Error ENOENT: unknown erasure code profile"
+
+
+class TestCephadmEcProfilesModule(object):
+
+    @patch('ansible.module_utils.basic.AnsibleModule.exit_json')
+    @patch('ansible.module_utils.basic.AnsibleModule.run_command')
+    def test_only_differing_profiles_set(self, m_run_command, m_exit_json):
+        args = {
+            'ec_profiles': [
+                {'name': 'ec42', 'k': '4', 'm': '2', 'stripe_unit': '8192'},
+                {'name': 'ec42hdd', 'k': '4', 'm': '2', 'crush_device_class': 'hdd'},
+                {'name': 'ec21', 'k': '2', 'm': '1', 'plugin': 'isa'},
+                {'name': 'gone', 'state': 'absent'},
+            ]
+        }
+        with cephadm_test_common.set_module_args(args):
+            m_exit_json.side_effect = cephadm_test_common.exit_json
+            # Profiles are read in name order
+            m_run_command.side_effect = [
+                (0, cephadm_test_common.batch_output([(0, 2, '', enoent),
+                                                      (1, 0, json.dumps(fake_ec42), ''),
+                                                      (2, 0, json.dumps(fake_ec42), ''),
+                                                      (3, 2, '', enoent)]), ''),
+                (0, cephadm_test_common.batch_output([(0, 0, '', ''), (1, 0, '', '')]), ''),
+            ]
+
+            with pytest.raises(cephadm_test_common.AnsibleExitJson) as result:
+                cephadm_ec_profiles.main()
+
+            result = result.value.args[0]
+            assert result['changed']
+            assert m_run_command.call_count == 2
+            assert [p['changed'] for p in result['ec_profiles']] == [False, True, True, False]
+            assert result['ec_profiles'][1]['cmds'][0][6:] == ['osd', 'erasure-code-profile', 'set', 'ec42hdd',
+                                                               'k=4', 'm=2', 'crush-device-class=hdd', '--force']
+            assert result['ec_profiles'][2]['stdout'] == 'Profile ec21 created.'
+
+    @patch('ansible.module_utils.basic.AnsibleModule.fail_json')
+    @patch('ansible.module_utils.basic.AnsibleModule.run_command')
+    def test_container_failure(self, m_run_command, m_fail_json):
+        args = {
+            'ec_profiles': [
+                {'name': 'ec42', 'k': '4', 'm': '2', 'stripe_unit': '8192'},
+                {'name': 'ec42hdd', 'k': '4', 'm': '2', 'crush_device_class': 'hdd'},
+                {'name': 'ec21', 'k': '2', 'm': '1'},
+            ]
+        }
+        with cephadm_test_common.set_module_args(args):
+            m_fail_json.side_effect = cephadm_test_common.fail_json
+            m_run_command.side_effect = [
+                (0, cephadm_test_common.batch_output([(0, 2, '', enoent),
+                                                      (1, 0, json.dumps(fake_ec42), ''),
+                                                      (2, 0, json.dumps(fake_ec42), '')]), ''),
+                (125, '', 'Error: unable to start container'),
+            ]
+
+            with pytest.raises(cephadm_test_common.AnsibleFailJson) as result:
+                cephadm_ec_profiles.main()
+
+            result = result.value.args[0]
+            assert result['msg'] == "Couldn't reconcile profile(s): ec42hdd, ec21"
+            assert not result['changed']
+            assert [p['rc'] for p in result['ec_profiles']] == [0, 125, 1]
+            assert result['ec_profiles'][2]['stdout'] == 'Not applied'
+
+
+def test_profile_needs_update():
+    needs_update = cephadm_ec_profile_common.profile_needs_update
+    assert not needs_update(fake_ec42, {'k': '04', 'm': '2', 'stripe_unit': '8KiB'})
+    assert not needs_update(fake_ec42, {'k': '4', 'm': '2', 'stripe_unit': '8K',
+                                        'plugin': 'jerasure', 'crush_failure_domain': 'host'})
+    # Settings which aren't given keep the defaults of the cluster and plugin
+    assert not needs_update(dict(fake_ec42, plugin='isa', technique='cauchy'), {'k': '4', 'm': '2', 'stripe_unit': '8K'})
+    assert not needs_update(dict(fake_ec42, **{'crush-failure-domain': 'rack'}), {'k': '4', 'm': '2'})
+    assert needs_update(fake_ec42, {'k': '4', 'm': '2', 'stripe_unit': '8K', 'plugin': 'isa'})
+    assert needs_update(fake_ec42, {'k': '4', 'm': '3', 'stripe_unit': '8K'})
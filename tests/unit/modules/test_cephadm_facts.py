@@ -0,0 +1,123 @@
+# Make coding more python3-ish
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import json
+import pytest
+
+from . import cephadm_test_common
+from ansible_collections.stackhpc.cephadm.plugins.modules import cephadm_facts
+from mock.mock import patch
+
+fake_fsid = '7a9d3b5e-0000-4000-8000-0123456789ab'
+
+
+class TestCephadmFactsModule(object):
+
+    @patch('ansible.module_utils.basic.AnsibleModule.exit_json')
+    @patch('ansible.module_utils.basic.AnsibleModule.run_command')
+    def test_gather_all_in_one_container(self, m_run_command, m_exit_json):
+        # Sorted by subset name
+        outputs = [
+            ['hdd', 'ssd'],
+            {'stats': {'total_bytes': 1024}},
+            {'fsid': fake_fsid},
+            {'status': 'HEALTH_OK', 'checks': {}},
+            {'epoch': 3, 'active_name': 'a', 'available_modules': [{'name': 'cephadm'}],
+             'standbys': [{'name': 'b', 'available_modules': [{'name': 'cephadm'}]}]},
+            {'epoch': 1, 'mons': [{'name': 'a'}]},
+            {'nodes': [], 'stray': []},
+            [{'pool_name': 'rbd'}],
+            {'overall': {'ceph version 19.2.0': 3}},
+        ]
+        with cephadm_test_common.set_module_args({'ceph_transport': 'cli'}):
+            m_exit_json.side_effect = cephadm_test_common.exit_json
+            m_run_command.return_value = (0, cephadm_test_common.batch_output(
+                [(index, 0, json.dumps(output), '') for index, output in enumerate(outputs)]), '')
+
+            with pytest.raises(cephadm_test_common.AnsibleExitJson) as result:
+                cephadm_facts.main()
+
+            result = result.value.args[0]
+            facts = result['ansible_facts']['cephadm']
+            assert not result['changed']
+            assert m_run_command.call_count == 1
+            assert facts['fsid'] == fake_fsid
+            assert facts['health']['status'] == 'HEALTH_OK'
+            assert facts['device_classes'] == ['hdd', 'ssd']
+            assert facts['mgr_map'] == {'epoch': 3, 'active_name': 'a', 'standbys': [{'name': 'b'}]}
+            assert facts['pools'] == [{'pool_name': 'rbd'}]
+            assert facts['collected_at'] > 0
+
+    @patch('ansible.module_utils.basic.AnsibleModule.fail_json')
+    @patch('ansible.module_utils.basic.AnsibleModule.run_command')
+    def test_gather_subset_failure(self, m_run_command, m_fail_json):
+        args = {'gather_subset': ['health', 'fsid'], 'ceph_transport': 'cli'}
+        with cephadm_test_common.set_module_args(args):
+            m_fail_json.side_effect = cephadm_test_common.fail_json
+            m_run_command.return_value = (0, cephadm_test_common.batch_output(
+                [(0, 0, json.dumps({'fsid': fake_fsid}), ''), (1, 110, '', 'Error ETIMEDOUT')]), '')
+
+            with pytest.raises(cephadm_test_common.AnsibleFailJson) as result:
+                cephadm_facts.main()
+
+            result = result.value.args[0]
+            assert result['msg'] == "Couldn't gather health"
+            assert result['cmd'][-3:] == ['health', '-f', 'json']
+
+    @patch('ansible.module_utils.basic.AnsibleModule.fail_json')
+    @patch('ansible.module_utils.basic.AnsibleModule.run_command')
+    def test_gather_subset_not_run(self, m_run_command, m_fail_json):
+        args = {'gather_subset': ['health', 'fsid'], 'ceph_transport': 'cli'}
+        with cephadm_test_common.set_module_args(args):
+            m_fail_json.side_effect = cephadm_test_common.fail_json
+            m_run_command.return_value = (0, cephadm_test_common.batch_output(
+                [(1, 0, json.dumps({'status': 'HEALTH_OK'}), '')]), '')
+
+            with pytest.raises(cephadm_test_common.AnsibleFailJson) as result:
+                cephadm_facts.main()
+
+            result = result.value.args[0]
+            assert result['msg'] == "Couldn't gather fsid"
+            assert result['rc'] == 1
+
+    @patch('ansible_collections.stackhpc.cephadm.plugins.modules.cephadm_facts.get_local_fsid')
+    @patch('ansible.module_utils.basic.AnsibleModule.exit_json')
+    @patch('ansible.module_utils.basic.AnsibleModule.run_command')
+    def test_cache_ttl(self, m_run_command, m_exit_json, m_get_local_fsid, tmp_path):
+        m_get_local_fsid.return_value = fake_fsid
+        (tmp_path / fake_fsid).mkdir()
+        args = {'gather_subset': ['health', 'fsid'], 'cache_ttl': 600, 'ceph_transport': 'cli'}
+        with cephadm_test_common.set_module_args(args), \
+                patch.object(cephadm_facts, 'SNAPSHOT_DIR', str(tmp_path)):
+            m_exit_json.side_effect = cephadm_test_common.exit_json
+            m_run_command.return_value = (0, cephadm_test_common.batch_output(
+                [(0, 0, json.dumps({'fsid': fake_fsid}), ''), (1, 0, json.dumps({'status': 'HEALTH_OK'}), '')]), '')
+
+            with pytest.raises(cephadm_test_common.AnsibleExitJson) as result:
+                cephadm_facts.main()
+            assert result.value.args[0]['cached'] == []
+
+            # The next run reads the cache
+            with pytest.raises(cephadm_test_common.AnsibleExitJson) as result:
+                cephadm_facts.main()
+
+            result = result.value.args[0]
+            assert m_run_command.call_count == 1
+            assert result['cached'] == ['fsid', 'health']
+            assert result['ansible_facts']['cephadm']['health'] == {'status': 'HEALTH_OK'}
+
+            # Expired subsets are gathered again
+            cache = tmp_path / fake_fsid / cephadm_facts.FACTS_CACHE_FILE
+            entries = json.loads(cache.read_text())
+            entries['health']['collected_at'] -= 600
+            cache.write_text(json.dumps(entries))
+            m_run_command.return_value = (0, json.dumps({'status': 'HEALTH_WARN'}), '')
+
+            with pytest.raises(cephadm_test_common.AnsibleExitJson) as result:
+                cephadm_facts.main()
+
+            result = result.value.args[0]
+            assert m_run_command.call_count == 2
+            assert result['cached'] == ['fsid']
+            assert result['ansible_facts']['cephadm']['health'] == {'status': 'HEALTH_WARN'}
@@ -0,0 +1,99 @@
+# Make coding more python3-ish
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import json
+import os
+import pytest
+
+from . import cephadm_test_common
+from ansible.module_utils.basic import AnsibleModule
+from ansible_collections.stackhpc.cephadm.plugins.modules import cephadm_key
+from mock.mock import patch
+
+fake_auth_get = {
+    'client.cinder': json.dumps([{'entity': 'client.cinder', 'key': 'AQcinder==',
+                                  'caps': {'mon': 'profile rbd', 'osd': 'profile rbd pool=volumes'}}]),
+    'client.nova': json.dumps([{'entity': 'client.nova', 'key': 'AQnova==', 'caps': {'mon': 'profile rbd'}}]),
+}
+enoent = "Error ENOENT: failed to find client.glance in keyring"
+cephadm_prefix = ['cephadm', '--timeout', '60', 'shell', '--', 'ceph']
+
+
+class TestCephadmKeyModule(object):
+
+    @patch('ansible.module_utils.basic.AnsibleModule.exit_json')
+    @patch('ansible.module_utils.basic.AnsibleModule.run_command')
+    def test_export_in_one_call(self, m_run_command, m_exit_json, tmp_path):
+        args = {
+            'name': 'client.nova',
+            'names': ['client.cinder', 'client.nova'],
+            'state': 'export',
+            'dest': str(tmp_path),
+        }
+        auth_get = (0, cephadm_test_common.batch_output([(0, 0, fake_auth_get['client.nova'], ''),
+                                                         (1, 0, fake_auth_get['client.cinder'], '')]), '')
+        with cephadm_test_common.set_module_args(args):
+            m_exit_json.side_effect = cephadm_test_common.exit_json
+            m_run_command.side_effect = [auth_get, auth_get]
+
+            with pytest.raises(cephadm_test_common.AnsibleExitJson) as result:
+                cephadm_key.main()
+
+            result = result.value.args[0]
+            assert result['changed']
+            assert m_run_command.call_count == 1
+            # Only the requested keys are read, in a single container
+            script = m_run_command.call_args[1]['data']
+            assert 'ceph auth get client.nova -f json' in script
+            assert 'ceph auth get client.cinder -f json' in script
+            assert 'export' not in script
+            assert result['keyrings'] == {
+                'client.cinder': ('[client.cinder]\n'
+                                  '\tkey = AQcinder==\n'
+                                  '\tcaps mon = "profile rbd"\n'
+                                  '\tcaps osd = "profile rbd pool=volumes"\n'),
+                'client.nova': '[client.nova]\n\tkey = AQnova==\n\tcaps mon = "profile rbd"\n',
+            }
+            path = tmp_path / 'ceph.client.nova.keyring'
+            assert path.read_text() == result['keyrings']['client.nova']
+            assert os.stat(str(path)).st_mode & 0o777 == 0o600
+            assert sorted(os.listdir(str(tmp_path))) == ['ceph.client.cinder.keyring', 'ceph.client.nova.keyring']
+
+            # The files are up to date on the next run
+            with pytest.raises(cephadm_test_common.AnsibleExitJson) as result:
+                cephadm_key.main()
+            assert not result.value.args[0]['changed']
+
+    @patch.object(AnsibleModule, 'fail_json', autospec=True)
+    @patch('ansible.module_utils.basic.AnsibleModule.run_command')
+    def test_export_missing_key(self, m_run_command, m_fail_json):
+        args = {'names': ['client.nova', 'client.glance'], 'state': 'export'}
+        with cephadm_test_common.set_module_args(args):
+            m_fail_json.side_effect = cephadm_test_common.fail_json
+            m_run_command.return_value = (0, cephadm_test_common.batch_output([(0, 0, fake_auth_get['client.nova'], ''),
+                                                                               (1, 2, '', enoent)]), '')
+
+            with pytest.raises(cephadm_test_common.AnsibleFailJson) as result:
+                cephadm_key.main()
+
+            assert result.value.args[0]['msg'] == "Couldn't find key(s): client.glance"
+            # The secrets read are censored from the failure
+            assert 'AQnova==' in m_fail_json.call_args[0][0].no_log_values
+
+    @patch('ansible.module_utils.basic.AnsibleModule.fail_json')
+    @patch('ansible.module_utils.basic.AnsibleModule.run_command')
+    def test_export_failure(self, m_run_command, m_fail_json):
+        args = {'names': ['client.nova', 'client.cinder'], 'state': 'export'}
+        with cephadm_test_common.set_module_args(args):
+            m_fail_json.side_effect = cephadm_test_common.fail_json
+            m_run_command.return_value = (0, cephadm_test_common.batch_output([(0, 0, fake_auth_get['client.nova'], ''),
+                                                                               (1, 13, '', 'Error EACCES: denied')]), '')
+
+            with pytest.raises(cephadm_test_common.AnsibleFailJson) as result:
+                cephadm_key.main()
+
+            result = result.value.args[0]
+            assert result['msg'] == "Couldn't export the keys"
+            assert result['rc'] == 13
+            assert result['cmd'][-5:] == ['auth', 'get', 'client.cinder', '-f', 'json']
@@ -0,0 +1,116 @@
+# Make coding more python3-ish
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import base64
+import json
+import pytest
+
+from . import cephadm_test_common
+from ansible_collections.stackhpc.cephadm.plugins.module_utils import cephadm_key_common
+from ansible_collections.stackhpc.cephadm.plugins.modules import cephadm_keys
+from mock.mock import patch
+
+fake_auth_ls = json.dumps({'auth_dump': [
+    {'entity': 'client.glance', 'key': 'AQglance==', 'caps': {'mon': 'allow r'}},
+    {'entity': 'client.nova', 'key': 'AQnova==', 'caps': {'mon': 'profile rbd'}},
+    {'entity': 'client.old', 'key': 'AQold==', 'caps': {'mon': 'allow r'}},
+]})
+cephadm_prefix = ['cephadm', '--timeout', '60', 'shell', '--', 'ceph']
+
+
+class TestCephadmKeysModule(object):
+
+    @patch('ansible.module_utils.basic.AnsibleModule.exit_json')
+    @patch('ansible.module_utils.basic.AnsibleModule.run_command')
+    def test_reconcile_with_one_import(self, m_run_command, m_exit_json):
+        args = {
+            'keys': [
+                {'name': 'client.glance', 'caps': {'mon': 'allow r', 'osd': 'allow rw pool=images'}},
+                {'name': 'client.nova', 'caps': {'mon': 'profile rbd'}},
+                {'name': 'client.cinder', 'caps': {'mon': 'allow r'}, 'secret': 'AQcinder=='},
+                {'name': 'client.old', 'state': 'absent'},
+                {'name': 'client.gone', 'state': 'absent'},
+            ]
+        }
+        with cephadm_test_common.set_module_args(args):
+            m_exit_json.side_effect = cephadm_test_common.exit_json
+            m_run_command.side_effect = [
+                (0, fake_auth_ls, ''),
+                (0, '', 'imported keyring'),
+                (0, '', 'updated'),
+            ]
+
+            with pytest.raises(cephadm_test_common.AnsibleExitJson) as result:
+                cephadm_keys.main()
+
+            result = result.value.args[0]
+            assert result['changed']
+            assert m_run_command.call_count == 3
+            assert m_run_command.call_args_list[0][0][0] == cephadm_prefix + ['auth', 'ls', '-f', 'json']
+            assert m_run_command.call_args_list[1][0][0] == cephadm_prefix + ['auth', 'import', '-i', '-']
+            assert m_run_command.call_args_list[1][1]['data'] == (
+                '[client.glance]\n'
+                '\tkey = AQglance==\n'
+                '\tcaps mon = "allow r"\n'
+                '\tcaps osd = "allow rw pool=images"\n'
+                '[client.cinder]\n'
+                '\tkey = AQcinder==\n'
+                '\tcaps mon = "allow r"\n')
+            assert m_run_command.call_args_list[2][0][0] == cephadm_prefix + ['auth', 'del', 'client.old']
+            assert [k['changed'] for k in result['keys']] == [True, False, True, True, False]
+            assert result['keys'][0]['stdout'] == 'client.glance caps updated.'
+            assert result['keys'][1]['cmds'] == []
+
+    @patch('ansible.module_utils.basic.AnsibleModule.fail_json')
+    @patch('ansible.module_utils.basic.AnsibleModule.run_command')
+    def test_import_failure(self, m_run_command, m_fail_json):
+        args = {
+            'keys': [
+                {'name': 'client.glance', 'secret': 'AQnew=='},
+                {'name': 'client.cinder'},
+            ]
+        }
+        with cephadm_test_common.set_module_args(args):
+            m_fail_json.side_effect = cephadm_test_common.fail_json
+            m_run_command.side_effect = [
+                (0, fake_auth_ls, ''),
+                (22, '', 'Error EINVAL: bad keyring'),
+            ]
+
+            with pytest.raises(cephadm_test_common.AnsibleFailJson) as result:
+                cephadm_keys.main()
+
+            result = result.value.args[0]
+            assert m_run_command.call_count == 2
+            assert result['msg'] == "Couldn't reconcile key(s): client.glance, client.cinder"
+            assert result['keys'][0]['stderr'] == 'Error EINVAL: bad keyring'
+            assert not result['keys'][0]['changed']
+            assert result['keys'][1]['stdout'] == "Capabilities must be provided when state is 'present'"
+
+    @patch('ansible.module_utils.basic.AnsibleModule.exit_json')
+    @patch('ansible.module_utils.basic.AnsibleModule.run_command')
+    def test_check_mode(self, m_run_command, m_exit_json):
+        args = {
+            'keys': [{'name': 'client.cinder', 'caps': {'mon': 'allow r'}}],
+            '_ansible_check_mode': True,
+        }
+        with cephadm_test_common.set_module_args(args):
+            m_exit_json.side_effect = cephadm_test_common.exit_json
+            m_run_command.return_value = 0, fake_auth_ls, ''
+
+            with pytest.raises(cephadm_test_common.AnsibleExitJson) as result:
+                cephadm_keys.main()
+
+            result = result.value.args[0]
+            assert result['changed']
+            assert m_run_command.call_count == 1
+            assert result['keys'][0]['stdout'] == 'client.cinder created.'
+
+
+def test_generate_secret():
+    secret = base64.b64decode(cephadm_key_common.generate_secret())
+    # CEPH_CRYPTO_AES header followed by a 16 bytes key
+    assert len(secret) == 12 + 16
+    assert secret[:2] == b'\x01\x00'
+    assert secret[10:12] == b'\x10\x00'
@@ -0,0 +1,92 @@
+# Make coding more python3-ish
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import json
+import pytest
+
+from . import cephadm_test_common
+from ansible_collections.stackhpc.cephadm.plugins.modules import cephadm_maintenance_plan
+from mock.mock import patch
+
+
+def osd_tree(racks):
+    '''
+    Return 'osd tree' nodes for racks of hosts with one OSD each
+    '''
+
+    nodes = [{'id': -1, 'name': 'default', 'type': 'root', 'children': []}]
+    osd_id = 0
+    for rack, hosts in sorted(racks.items()):
+        rack_id = -len(nodes) - 1
+        nodes[0]['children'].append(rack_id)
+        nodes.append({'id': rack_id, 'name': rack, 'type': 'rack', 'children': []})
+        rack_node = nodes[-1]
+        for host in hosts:
+            host_id = -len(nodes) - 1
+            rack_node['children'].append(host_id)
+            nodes.append({'id': host_id, 'name': host, 'type': 'host', 'children': [osd_id]})
+            nodes.append({'id': osd_id, 'name': 'osd.{0}'.format(osd_id), 'type': 'osd',
+                          'device_class': 'hdd'})
+            osd_id += 1
+    return {'nodes': nodes, 'stray': []}
+
+
+def rule(rule_id, domain_type):
+    return {'rule_id': rule_id, 'rule_name': 'by_' + domain_type, 'steps': [
+        {'op': 'take', 'item': -1, 'item_name': 'default~hdd'},
+        {'op': 'chooseleaf_firstn', 'num': 0, 'type': domain_type},
+        {'op': 'emit'},
+    ]}
+
+
+racks = {'rack1': ['a1', 'a2', 'a3'], 'rack2': ['b1', 'b2'], 'rack3': ['c1']}
+
+
+class TestCephadmMaintenancePlanModule(object):
+
+    def test_host_domains(self):
+        nodes = osd_tree(racks)['nodes']
+        by_rack = cephadm_maintenance_plan.host_domains(nodes, 'default', 'hdd', 'rack')
+        assert by_rack['a1'] == by_rack['a3'] != by_rack['b1']
+        by_osd = cephadm_maintenance_plan.host_domains(nodes, 'default', '', 'osd')
+        assert by_osd['a1'] == set([0])
+        assert cephadm_maintenance_plan.host_domains(nodes, 'default', 'ssd', 'rack') == {}
+
+    def test_plan_waves(self):
+        nodes = osd_tree(racks)['nodes']
+        by_rack = cephadm_maintenance_plan.host_domains(nodes, 'default', '', 'rack')
+        hosts = ['c1', 'b2', 'b1', 'a3', 'a2', 'a1', 'mgmt']
+
+        # One rack at a time, the host without OSDs joins the first wave
+        assert cephadm_maintenance_plan.plan_waves(hosts, [(1, by_rack)], 1, set(), 0) == \
+            [['a1', 'a2', 'a3', 'mgmt'], ['b1', 'b2'], ['c1']]
+        # Two racks at a time, within the limit of hosts and monitors
+        assert cephadm_maintenance_plan.plan_waves(hosts, [(2, by_rack)], 1, set(['a1', 'b1']), 3) == \
+            [['a1', 'a2', 'a3'], ['b1', 'b2', 'c1'], ['mgmt']]
+
+    @patch('ansible.module_utils.basic.AnsibleModule.exit_json')
+    @patch('ansible.module_utils.basic.AnsibleModule.run_command')
+    def test_plan_in_one_container(self, m_run_command, m_exit_json):
+        outputs = [
+            osd_tree(racks),
+            [rule(0, 'host'), rule(1, 'rack')],
+            [{'pool_name': 'rbd', 'crush_rule': 1, 'size': 3, 'min_size': 2},
+             {'pool_name': 'ec', 'crush_rule': 1, 'size': 6, 'min_size': 5}],
+            {'epoch': 1, 'mons': [{'name': 'a1'}, {'name': 'b1'}, {'name': 'c1'}]},
+        ]
+        args = {'hosts': ['a1', 'a2', 'a3', 'b1', 'b2', 'c1'], 'ceph_transport': 'cli'}
+        with cephadm_test_common.set_module_args(args):
+            m_exit_json.side_effect = cephadm_test_common.exit_json
+            m_run_command.return_value = (0, cephadm_test_common.batch_output(
+                [(index, 0, json.dumps(output), '') for index, output in enumerate(outputs)]), '')
+
+            with pytest.raises(cephadm_test_common.AnsibleExitJson) as result:
+                cephadm_maintenance_plan.main()
+
+            result = result.value.args[0]
+            assert not result['changed']
+            assert m_run_command.call_count == 1
+            assert result['waves'] == [['a1', 'a2', 'a3'], ['b1', 'b2'], ['c1']]
+            assert result['osds'] == {'a1': [0], 'a2': [1], 'a3': [2], 'b1': [3], 'b2': [4], 'c1': [5]}
+            assert result['pools']['rbd'] == {'failure_domains': ['rack'], 'tolerance': 1}
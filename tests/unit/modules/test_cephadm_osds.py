@@ -0,0 +1,122 @@
+# Make coding more python3-ish
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import copy
+import json
+import pytest
+
+from . import cephadm_test_common
+from ansible_collections.stackhpc.cephadm.plugins.modules import cephadm_osds
+from mock.mock import patch
+
+cephadm_prefix = ['cephadm', '--timeout', '60', 'shell', '--', 'ceph']
+fake_inventory = json.dumps([
+    {'name': 'storage-0', 'devices': [{'path': '/dev/sdb', 'available': True},
+                                      {'path': '/dev/sdc', 'available': True}]},
+    {'name': 'storage-1', 'devices': [{'path': '/dev/sdb', 'available': True},
+                                      {'path': '/dev/sdc', 'available': False}]},
+    {'name': 'storage-2', 'devices': [{'path': '/dev/sdd', 'available': True}]},
+])
+args = {
+    'hosts': [
+        {'hostname': 'storage-0', 'devices': ['/dev/sdb', '/dev/sdc']},
+        {'hostname': 'storage-1', 'devices': ['/dev/sdc', '/dev/sdb']},
+        {'hostname': 'storage-2', 'devices': ['/dev/sdd']},
+    ],
+    'ceph_transport': 'cli',
+}
+
+
+def orch_ls(counts):
+    return json.dumps([{'service_name': name, 'status': {'running': running, 'size': size}}
+                       for name, (running, size) in counts])
+
+
+class TestCephadmOsdsModule(object):
+
+    def test_specs_group_hosts(self):
+        specs = cephadm_osds.osd_specs(args['hosts'], 'osd_devices')
+        assert [spec['placement']['hosts'] for spec in specs] == [['storage-0', 'storage-1'],
+                                                                  ['storage-2']]
+        assert specs[0]['spec'] == {'data_devices': {'paths': ['/dev/sdb', '/dev/sdc']}}
+        # The name of a spec only depends on its devices
+        assert specs[0]['service_id'] == cephadm_osds.osd_specs(args['hosts'][:1], 'osd_devices')[0]['service_id']
+
+    @patch('time.sleep')
+    @patch('ansible_collections.stackhpc.cephadm.plugins.module_utils.cephadm_common.CephShell.close')
+    @patch('ansible_collections.stackhpc.cephadm.plugins.module_utils.cephadm_common.CephShell.run')
+    @patch('ansible.module_utils.basic.AnsibleModule.exit_json')
+    @patch('ansible.module_utils.basic.AnsibleModule.run_command')
+    def test_apply_and_wait(self, m_run_command, m_exit_json, m_run, m_close, m_sleep):
+        specs = cephadm_osds.osd_specs(args['hosts'], 'osd_devices')
+        large, small = ['osd.' + spec['service_id'] for spec in specs]
+        with cephadm_test_common.set_module_args(args):
+            m_exit_json.side_effect = cephadm_test_common.exit_json
+            m_run_command.side_effect = [
+                (0, cephadm_test_common.batch_output([(0, 0, fake_inventory, ''),
+                                                      (1, 0, '[]', '')]), ''),
+                (0, 'Scheduled osd update...', ''),
+            ]
+            m_run.side_effect = [
+                (0, cephadm_prefix, orch_ls([(small, (0, 0)), (large, (1, 2))]), ''),
+                (0, cephadm_prefix, orch_ls([(small, (1, 1)), (large, (3, 3))]), ''),
+            ]
+
+            with pytest.raises(cephadm_test_common.AnsibleExitJson) as result:
+                cephadm_osds.main()
+
+            result = result.value.args[0]
+            assert result['changed']
+            assert result['expected'] == {small: 1, large: 3}
+            assert result['attempts'] == 2
+            assert m_run_command.call_count == 2
+            assert m_run_command.call_args_list[1][0][0] == cephadm_prefix + ['orch', 'apply', '-i', '-']
+            applied = [json.loads(doc) for doc in m_run_command.call_args_list[1][1]['data'].split('\n---\n')]
+            assert applied == specs
+            assert m_run.call_args[0][0] == cephadm_prefix + ['orch', 'ls', 'osd', '-f', 'json']
+
+    @patch('ansible.module_utils.basic.AnsibleModule.exit_json')
+    @patch('ansible.module_utils.basic.AnsibleModule.run_command')
+    def test_applied_specs_unchanged(self, m_run_command, m_exit_json):
+        specs = cephadm_osds.osd_specs(args['hosts'], 'osd_devices')
+        services = [dict(copy.deepcopy(spec), service_name='osd.' + spec['service_id'],
+                         status={'running': len(spec['placement']['hosts']) * len(spec['spec']['data_devices']['paths']),
+                                 'size': len(spec['placement']['hosts']) * len(spec['spec']['data_devices']['paths'])})
+                    for spec in specs]
+        # Exported hosts may be objects rather than names
+        services[1]['placement']['hosts'] = [{'hostname': 'storage-2'}]
+        inventory = json.dumps([{'name': 'storage-0', 'devices': [{'path': '/dev/sdb', 'available': False}]}])
+        with cephadm_test_common.set_module_args(args):
+            m_exit_json.side_effect = cephadm_test_common.exit_json
+            m_run_command.return_value = (0, cephadm_test_common.batch_output([
+                (0, 0, inventory, ''), (1, 0, json.dumps(services), '')]), '')
+
+            with pytest.raises(cephadm_test_common.AnsibleExitJson) as result:
+                cephadm_osds.main()
+
+            result = result.value.args[0]
+            assert not result['changed']
+            assert result['attempts'] == 0
+            assert m_run_command.call_count == 1
+
+    @patch('ansible.module_utils.basic.AnsibleModule.fail_json')
+    @patch('ansible.module_utils.basic.AnsibleModule.run_command')
+    def test_apply_failure(self, m_run_command, m_fail_json):
+        with cephadm_test_common.set_module_args(args):
+            m_fail_json.side_effect = cephadm_test_common.fail_json
+            m_run_command.side_effect = [
+                (0, cephadm_test_common.batch_output([(0, 0, fake_inventory, ''),
+                                                      (1, 0, '[]', '')]), ''),
+                (22, '', 'Error EINVAL: bad spec'),
+            ]
+
+            with pytest.raises(cephadm_test_common.AnsibleFailJson) as result:
+                cephadm_osds.main()
+
+            result = result.value.args[0]
+            assert result['msg'] == "Couldn't apply the OSD specs"
+            assert result['rc'] == 22
+            assert result['stderr'] == 'Error EINVAL: bad spec'
+            assert result['cmd'] == cephadm_prefix + ['orch', 'apply', '-i', '-']
+            assert result['changed']
@@ -0,0 +1,330 @@
+# Make coding more python3-ish
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import json
+import pytest
+
+from . import cephadm_test_common
+from ansible_collections.stackhpc.cephadm.plugins.modules import cephadm_pool
+from mock.mock import patch
+
+fake_name = 'images'
+fake_pool = {
+    'pool_name': fake_name,
+    'pg_num': 32,
+    'pg_placement_num': 32,
+    'size': 3,
+    'pg_autoscale_mode': 'on',
+    'options': {'target_size_ratio': 0.2},
+    'erasure_code_profile': '',
+    'flags_names': 'hashpspool',
+    'application_metadata': {'rbd': {}},
+}
+cephadm_prefix = ['cephadm', '--timeout', '60', 'shell', '--', 'ceph']
+ls_detail_cmd = cephadm_prefix + ['osd', 'pool', 'ls', 'detail', '-f', 'json']
+
+
+class TestCephadmPoolModule(object):
+
+    @patch('ansible.module_utils.basic.AnsibleModule.exit_json')
+    @patch('ansible.module_utils.basic.AnsibleModule.run_command')
+    def test_existing_pool_single_lookup(self, m_run_command, m_exit_json):
+        args = {
+            'name': fake_name,
+            'application': 'rbd',
+            'target_size_ratio': '0.2'
+        }
+        with cephadm_test_common.set_module_args(args):
+            m_exit_json.side_effect = cephadm_test_common.exit_json
+            m_run_command.return_value = 0, json.dumps([fake_pool]), ''
+
+            with pytest.raises(cephadm_test_common.AnsibleExitJson) as result:
+                cephadm_pool.main()
+
+            result = result.value.args[0]
+            assert not result['changed']
+            assert m_run_command.call_count == 1
+            assert result['cmd'] == ls_detail_cmd
+            assert result['stdout'] == 'Pool {0} already exists and there is nothing to update.'.format(fake_name)
+            assert [t['cmd'] for t in result['timings']] == [ls_detail_cmd]
+
+    @patch('ansible.module_utils.basic.AnsibleModule.exit_json')
+    @patch('ansible.module_utils.basic.AnsibleModule.run_command')
+    def test_update_application(self, m_run_command, m_exit_json):
+        args = {
+            'name': fake_name,
+            'application': 'rgw'
+        }
+        with cephadm_test_common.set_module_args(args):
+            m_exit_json.side_effect = cephadm_test_common.exit_json
+            m_run_command.side_effect = [
+                (0, json.dumps([fake_pool]), ''),
+                (0, cephadm_test_common.batch_output([(0, 0, '', ''), (1, 0, '', '')]), ''),
+            ]
+
+            with pytest.raises(cephadm_test_common.AnsibleExitJson) as result:
+                cephadm_pool.main()
+
+            result = result.value.args[0]
+            assert result['changed']
+            assert m_run_command.call_count == 2
+            assert result['cmd'] == cephadm_prefix + ['osd', 'pool', 'application', 'enable', fake_name, 'rgw']
+
+    @patch('ansible.module_utils.basic.AnsibleModule.exit_json')
+    @patch('ansible.module_utils.basic.AnsibleModule.run_command')
+    def test_update_failure_reported_per_key(self, m_run_command, m_exit_json):
+        args = {
+            'name': fake_name,
+            'application': 'rbd',
+            'size': '2',
+            'target_size_ratio': '0.4'
+        }
+        with cephadm_test_common.set_module_args(args):
+            m_exit_json.side_effect = cephadm_test_common.exit_json
+            m_run_command.side_effect = [
+                (0, json.dumps([fake_pool]), ''),
+                (0, cephadm_test_common.batch_output([(0, 22, '', 'Error EINVAL: bad size'), (1, 0, '', '')]), ''),
+            ]
+
+            with pytest.raises(cephadm_test_common.AnsibleExitJson) as result:
+                cephadm_pool.main()
+
+            result = result.value.args[0]
+            assert m_run_command.call_count == 2
+            script = m_run_command.call_args[1]['data']
+            assert 'wait -n' in script
+            assert result['rc'] == 22
+            assert result['cmd'] == cephadm_prefix + ['osd', 'pool', 'set', fake_name, 'size', '2']
+            assert '{0} has been updated: target_size_ratio is now 0.4'.format(fake_name) in result['stdout']
+            assert "{0} couldn't be updated: size is still not 2: Error EINVAL: bad size".format(fake_name) in result['stdout']
+            assert result['stderr'] == 'size: Error EINVAL: bad size'
+
+    @patch('time.sleep')
+    @patch('ansible_collections.stackhpc.cephadm.plugins.module_utils.cephadm_common.CephShell.close')
+    @patch('ansible_collections.stackhpc.cephadm.plugins.module_utils.cephadm_common.CephShell.run')
+    @patch('ansible.module_utils.basic.AnsibleModule.exit_json')
+    @patch('ansible.module_utils.basic.AnsibleModule.run_command')
+    def test_pg_num_steps(self, m_run_command, m_exit_json, m_run, m_close, m_sleep):
+        args = {
+            'name': fake_name,
+            'application': 'rbd',
+            'target_size_ratio': '0.2',
+            'pg_autoscale_mode': 'off',
+            'pg_num': '128',
+            'pg_num_step': 32,
+            'ceph_transport': 'cli',
+        }
+        # A previous run already moved the pool to 64 PGs
+        pool = dict(fake_pool, pool_id=3, pg_autoscale_mode='off', pg_num_target=64)
+
+        def pg_dump(num_pg, misplaced):
+            return 0, cephadm_prefix, json.dumps({'pool_stats': [
+                {'poolid': 3, 'num_pg': num_pg, 'stat_sum': {'num_objects_misplaced': misplaced,
+                                                             'num_object_copies': 1000}},
+                {'poolid': 4, 'num_pg': 8, 'stat_sum': {'num_objects_misplaced': 0,
+                                                        'num_object_copies': 1000}},
+            ]}), ''
+        set_ok = (0, cephadm_prefix, '', '')
+
+        with cephadm_test_common.set_module_args(args):
+            m_exit_json.side_effect = cephadm_test_common.exit_json
+            m_run_command.return_value = 0, json.dumps([pool]), ''
+            m_run.side_effect = [set_ok, set_ok, pg_dump(96, 0),
+                                 set_ok, set_ok, pg_dump(112, 500), pg_dump(128, 300), pg_dump(128, 50)]
+
+            with pytest.raises(cephadm_test_common.AnsibleExitJson) as result:
+                cephadm_pool.main()
+
+            result = result.value.args[0]
+            assert result['changed']
+            assert result['rc'] == 0
+            assert [step['pg_num'] for step in result['pg_num_progress']['steps']] == [96, 128]
+            assert [step['attempts'] for step in result['pg_num_progress']['steps']] == [1, 3]
+            assert m_run.call_args_list[3][0][0] == cephadm_prefix + ['osd', 'pool', 'set', fake_name, 'pg_num', '128']
+            assert m_run.call_args_list[4][0][0] == cephadm_prefix + ['osd', 'pool', 'set', fake_name, 'pgp_num', '128']
+            assert result['stdout'].endswith('{0} has been updated: pg_num is now 128 after 2 step(s)'.format(fake_name))
+            assert m_close.call_count == 1
+
+    @patch('ansible.module_utils.basic.AnsibleModule.exit_json')
+    @patch('ansible.module_utils.basic.AnsibleModule.run_command')
+    def test_create_pool(self, m_run_command, m_exit_json):
+        args = {
+            'name': 'foo',
+            'application': 'rbd'
+        }
+        with cephadm_test_common.set_module_args(args):
+            m_exit_json.side_effect = cephadm_test_common.exit_json
+            m_run_command.side_effect = [
+                (0, json.dumps([fake_pool]), ''),
+                (0, cephadm_test_common.batch_output([(0, 0, '', "pool 'foo' created"), (1, 0, '', '')]), ''),
+            ]
+
+            with pytest.raises(cephadm_test_common.AnsibleExitJson) as result:
+                cephadm_pool.main()
+
+            result = result.value.args[0]
+            assert result['changed']
+            assert result['rc'] == 0
+            assert m_run_command.call_count == 2
+            assert result['cmd'][len(cephadm_prefix):] == ['osd', 'pool', 'application', 'enable', 'foo', 'rbd']
+
+    @patch('ansible.module_utils.basic.AnsibleModule.exit_json')
+    @patch('ansible.module_utils.basic.AnsibleModule.run_command')
+    def test_create_pool_later_failure(self, m_run_command, m_exit_json):
+        args = {
+            'name': 'foo',
+            'application': 'rbd'
+        }
+        with cephadm_test_common.set_module_args(args):
+            m_exit_json.side_effect = cephadm_test_common.exit_json
+            m_run_command.side_effect = [
+                (0, json.dumps([fake_pool]), ''),
+                (0, cephadm_test_common.batch_output([(0, 0, '', "pool 'foo' created"),
+                                                      (1, 22, '', 'Error EINVAL: bad application')]), ''),
+            ]
+
+            with pytest.raises(cephadm_test_common.AnsibleExitJson) as result:
+                cephadm_pool.main()
+
+            result = result.value.args[0]
+            assert result['changed']
+            assert result['rc'] == 22
+            assert result['stderr'] == 'Error EINVAL: bad application'
+            assert result['cmd'][len(cephadm_prefix):] == ['osd', 'pool', 'application', 'enable', 'foo', 'rbd']
+
+    @patch('ansible.module_utils.basic.AnsibleModule.exit_json')
+    @patch('ansible.module_utils.basic.AnsibleModule.run_command')
+    def test_create_pool_not_run(self, m_run_command, m_exit_json):
+        with cephadm_test_common.set_module_args({'name': 'foo', 'application': 'rbd'}):
+            m_exit_json.side_effect = cephadm_test_common.exit_json
+            m_run_command.side_effect = [
+                (0, json.dumps([fake_pool]), ''),
+                (0, '', ''),
+            ]
+
+            with pytest.raises(cephadm_test_common.AnsibleExitJson) as result:
+                cephadm_pool.main()
+
+            result = result.value.args[0]
+            assert not result['changed']
+            assert result['rc'] == 1
+            assert result['cmd'][len(cephadm_prefix):len(cephadm_prefix) + 4] == ['osd', 'pool', 'create', 'foo']
+
+    @patch('ansible.module_utils.basic.AnsibleModule.exit_json')
+    @patch('ansible.module_utils.basic.AnsibleModule.run_command')
+    def test_remove_non_existing_pool(self, m_run_command, m_exit_json):
+        args = {
+            'name': 'foo',
+            'state': 'absent'
+        }
+        with cephadm_test_common.set_module_args(args):
+            m_exit_json.side_effect = cephadm_test_common.exit_json
+            m_run_command.return_value = 0, json.dumps([fake_pool]), ''
+
+            with pytest.raises(cephadm_test_common.AnsibleExitJson) as result:
+                cephadm_pool.main()
+
+            result = result.value.args[0]
+            assert not result['changed']
+            assert m_run_command.call_count == 1
+            assert result['stdout'] == "Skipped, since pool foo doesn't exist"
+
+    @patch('ansible.module_utils.basic.AnsibleModule.exit_json')
+    @patch('ansible.module_utils.basic.AnsibleModule.run_command')
+    def test_fingerprint_skips_verification(self, m_run_command, m_exit_json):
+        args = {
+            'name': fake_name,
+            'application': 'rbd',
+            'target_size_ratio': '0.2',
+            'fingerprint': True,
+        }
+        epoch = json.dumps({'epoch': 7})
+        fingerprint_key = 'stackhpc/cephadm/fingerprint/pool/' + fake_name
+        m_exit_json.side_effect = cephadm_test_common.exit_json
+
+        # First run, there is no fingerprint yet: verify then store it
+        with cephadm_test_common.set_module_args(dict(args)):
+            m_run_command.side_effect = [
+                (0, cephadm_test_common.batch_output([(0, 0, epoch, ''),
+                                                      (1, 2, '', 'Error ENOENT: ')]), ''),
+                (0, json.dumps([fake_pool]), ''),
+                (0, '', 'set ' + fingerprint_key),
+            ]
+
+            with pytest.raises(cephadm_test_common.AnsibleExitJson) as result:
+                cephadm_pool.main()
+
+            assert not result.value.args[0]['changed']
+            assert m_run_command.call_count == 3
+            set_cmd = m_run_command.call_args[0][0]
+            assert set_cmd[:-1] == cephadm_prefix + ['config-key', 'set', fingerprint_key]
+            assert json.loads(set_cmd[-1])['epoch'] == 7
+
+        # Second run at the same epoch: a single check
+        m_run_command.reset_mock()
+        with cephadm_test_common.set_module_args(dict(args)):
+            m_run_command.side_effect = [
+                (0, cephadm_test_common.batch_output([(0, 0, epoch, ''),
+                                                      (1, 0, set_cmd[-1], '')]), ''),
+            ]
+
+            with pytest.raises(cephadm_test_common.AnsibleExitJson) as result:
+                cephadm_pool.main()
+
+            result = result.value.args[0]
+            assert not result['changed']
+            assert m_run_command.call_count == 1
+            assert result['stdout'] == 'Pool images is unchanged since it was last applied.'
+
+        # The desired state changed: verify and apply again
+        m_run_command.reset_mock()
+        with cephadm_test_common.set_module_args(dict(args, application='rgw')):
+            m_run_command.side_effect = [
+                (0, cephadm_test_common.batch_output([(0, 0, epoch, ''),
+                                                      (1, 0, set_cmd[-1], '')]), ''),
+                (0, json.dumps([fake_pool]), ''),
+                (0, cephadm_test_common.batch_output([(0, 0, '', ''), (1, 0, '', '')]), ''),
+                (0, json.dumps({'epoch': 9}), ''),
+                (0, '', ''),
+            ]
+
+            with pytest.raises(cephadm_test_common.AnsibleExitJson) as result:
+                cephadm_pool.main()
+
+            assert result.value.args[0]['changed']
+            assert m_run_command.call_count == 5
+            stored = json.loads(m_run_command.call_args[0][0][-1])
+            assert stored['epoch'] == 9
+            assert stored['fingerprint'] != json.loads(set_cmd[-1])['fingerprint']
+
+    @patch('ansible.module_utils.basic.AnsibleModule.exit_json')
+    @patch('ansible.module_utils.basic.AnsibleModule.run_command')
+    def test_check_mode_diff(self, m_run_command, m_exit_json):
+        args = {
+            'name': fake_name,
+            'application': 'rgw',
+            'size': '2',
+            'target_size_ratio': '0.2',
+            '_ansible_check_mode': True,
+        }
+        with cephadm_test_common.set_module_args(args):
+            m_exit_json.side_effect = cephadm_test_common.exit_json
+            m_run_command.return_value = 0, json.dumps([fake_pool]), ''
+
+            with pytest.raises(cephadm_test_common.AnsibleExitJson) as result:
+                cephadm_pool.main()
+
+            result = result.value.args[0]
+            assert result['changed']
+            assert m_run_command.call_count == 1
+            assert m_run_command.call_args[0][0] == ls_detail_cmd
+            assert result['cmds'] == [
+                cephadm_prefix + ['osd', 'pool', 'set', fake_name, 'size', '2'],
+                cephadm_prefix + ['osd', 'pool', 'application', 'disable', fake_name, 'rbd', '--yes-i-really-mean-it'],
+                cephadm_prefix + ['osd', 'pool', 'application', 'enable', fake_name, 'rgw'],
+            ]
+            before, after = result['diff']['before'], result['diff']['after']
+            assert (before['size'], after['size']) == (3, '2')
+            assert (before['application'], after['application']) == ('rbd', 'rgw')
+            assert before['target_size_ratio'] == after['target_size_ratio'] == 0.2
@@ -0,0 +1,200 @@
+# Make coding more python3-ish
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import json
+import pytest
+
+from . import cephadm_test_common
+from ansible_collections.stackhpc.cephadm.plugins.modules import cephadm_pools
+from mock.mock import patch
+
+fake_pool = {
+    'pool_name': 'images',
+    'pg_num': 32,
+    'pg_placement_num': 32,
+    'size': 3,
+    'pg_autoscale_mode': 'on',
+    'options': {},
+    'erasure_code_profile': '',
+    'flags_names': 'hashpspool',
+    'application_metadata': {'rbd': {}},
+}
+fake_ls_detail = json.dumps([fake_pool])
+cephadm_prefix = ['cephadm', '--timeout', '60', 'shell', '--', 'ceph']
+
+
+class TestCephadmPoolsModule(object):
+
+    @patch('ansible.module_utils.basic.AnsibleModule.exit_json')
+    @patch('ansible.module_utils.basic.AnsibleModule.run_command')
+    def test_nothing_to_do(self, m_run_command, m_exit_json):
+        args = {
+            'pools': [{'name': 'images', 'application': 'rbd', 'size': '3'}]
+        }
+        with cephadm_test_common.set_module_args(args):
+            m_exit_json.side_effect = cephadm_test_common.exit_json
+            m_run_command.return_value = 0, fake_ls_detail, ''
+
+            with pytest.raises(cephadm_test_common.AnsibleExitJson) as result:
+                cephadm_pools.main()
+
+            result = result.value.args[0]
+            assert not result['changed']
+            assert m_run_command.call_count == 1
+            assert m_run_command.call_args[0][0] == cephadm_prefix + ['osd', 'pool', 'ls', 'detail', '-f', 'json']
+            assert result['pools'][0]['stdout'] == 'Pool images already exists and there is nothing to update.'
+
+    @patch('ansible.module_utils.basic.AnsibleModule.exit_json')
+    @patch('ansible.module_utils.basic.AnsibleModule.run_command')
+    def test_reconcile_in_one_container(self, m_run_command, m_exit_json):
+        args = {
+            'pools': [
+                {'name': 'images', 'application': 'rgw', 'size': '2'},
+                {'name': 'volumes', 'application': 'rbd'},
+                {'name': 'old', 'state': 'absent'},
+            ]
+        }
+        with cephadm_test_common.set_module_args(args):
+            m_exit_json.side_effect = cephadm_test_common.exit_json
+            m_run_command.side_effect = [
+                (0, fake_ls_detail, ''),
+                (0, cephadm_test_common.batch_output([(i, 0, '', '') for i in range(5)]), ''),
+            ]
+
+            with pytest.raises(cephadm_test_common.AnsibleExitJson) as result:
+                cephadm_pools.main()
+
+            result = result.value.args[0]
+            assert result['changed']
+            assert m_run_command.call_count == 2
+            script = m_run_command.call_args[1]['data']
+            assert '{ _cephadm_run 0 ceph osd pool set images size 2 && ' \
+                '_cephadm_run 1 ceph osd pool application disable images rbd --yes-i-really-mean-it && ' \
+                '_cephadm_run 2 ceph osd pool application enable images rgw; } >"$_results/0" &\n' in script
+            assert '{ _cephadm_run 3 ceph osd pool create volumes replicated replicated_rule ' \
+                '--expected_num_objects 0 --autoscale-mode on && ' \
+                '_cephadm_run 4 ceph osd pool application enable volumes rbd; } >"$_results/1" &\n' in script
+            assert [p['changed'] for p in result['pools']] == [True, True, False]
+            assert result['pools'][2]['cmds'] == []
+
+    @patch('ansible.module_utils.basic.AnsibleModule.fail_json')
+    @patch('ansible.module_utils.basic.AnsibleModule.run_command')
+    def test_failure_is_reported_per_pool(self, m_run_command, m_fail_json):
+        args = {
+            'pools': [
+                {'name': 'volumes', 'application': 'rbd'},
+                {'name': 'images', 'state': 'absent'},
+            ]
+        }
+        with cephadm_test_common.set_module_args(args):
+            m_fail_json.side_effect = cephadm_test_common.fail_json
+            m_run_command.side_effect = [
+                (0, fake_ls_detail, ''),
+                (0, cephadm_test_common.batch_output([(0, 34, '', 'Error ERANGE: pg_num exceeds max'),
+                                                      (2, 0, '', '')]), ''),
+            ]
+
+            with pytest.raises(cephadm_test_common.AnsibleFailJson) as result:
+                cephadm_pools.main()
+
+            result = result.value.args[0]
+            assert result['msg'] == "Couldn't reconcile pool(s): volumes"
+            assert result['changed']
+            assert result['pools'][0]['rc'] == 34
+            assert not result['pools'][0]['changed']
+            assert result['pools'][0]['stderr'] == 'Error ERANGE: pg_num exceeds max'
+            assert result['pools'][1]['changed']
+
+    @patch('ansible.module_utils.basic.AnsibleModule.fail_json')
+    @patch('ansible.module_utils.basic.AnsibleModule.run_command')
+    def test_container_failure(self, m_run_command, m_fail_json):
+        args = {
+            'pools': [
+                {'name': 'volumes', 'application': 'rbd'},
+                {'name': 'images', 'state': 'absent'},
+            ]
+        }
+        with cephadm_test_common.set_module_args(args):
+            m_fail_json.side_effect = cephadm_test_common.fail_json
+            m_run_command.side_effect = [
+                (0, fake_ls_detail, ''),
+                (125, '', 'Error: unable to start container'),
+            ]
+
+            with pytest.raises(cephadm_test_common.AnsibleFailJson) as result:
+                cephadm_pools.main()
+
+            result = result.value.args[0]
+            assert result['msg'] == "Couldn't reconcile pool(s): volumes, images"
+            assert not result['changed']
+            assert result['pools'][0]['rc'] == 125
+            assert result['pools'][0]['stderr'] == 'Error: unable to start container'
+            assert result['pools'][1]['rc'] == 1
+            assert result['pools'][1]['stdout'] == 'Not applied'
+
+    @patch('ansible.module_utils.basic.AnsibleModule.exit_json')
+    @patch('ansible.module_utils.basic.AnsibleModule.run_command')
+    def test_check_mode(self, m_run_command, m_exit_json):
+        args = {
+            'pools': [{'name': 'volumes'}],
+            '_ansible_check_mode': True
+        }
+        with cephadm_test_common.set_module_args(args):
+            m_exit_json.side_effect = cephadm_test_common.exit_json
+            m_run_command.return_value = 0, fake_ls_detail, ''
+
+            with pytest.raises(cephadm_test_common.AnsibleExitJson) as result:
+                cephadm_pools.main()
+
+            result = result.value.args[0]
+            assert result['changed']
+            assert m_run_command.call_count == 1
+            assert result['pools'][0]['cmds'][0][6:9] == ['osd', 'pool', 'create']
+
+    @patch('ansible.module_utils.basic.AnsibleModule.exit_json')
+    @patch('ansible.module_utils.basic.AnsibleModule.run_command')
+    def test_plan_pg_num(self, m_run_command, m_exit_json):
+        args = {
+            'pools': [
+                {'name': 'volumes', 'target_size_ratio': '0.4'},
+                {'name': 'metrics', 'target_size_ratio': '0.4', 'pg_num': '64'},
+                {'name': 'data', 'pool_type': 'erasure', 'erasure_profile': 'ec42',
+                 'target_size_ratio': '0.1'},
+                {'name': 'scratch'},
+            ],
+            'plan_pg_num': True,
+            '_ansible_check_mode': True
+        }
+        # 6 hdd and 6 ssd OSDs on 2 hosts under the default root
+        osds = [{'id': i, 'name': 'osd.{0}'.format(i), 'type': 'osd',
+                 'device_class': 'hdd' if i % 2 else 'ssd'} for i in range(12)]
+        hosts = [{'id': -2 - h, 'name': 'host{0}'.format(h), 'type': 'host',
+                  'children': list(range(h * 6, h * 6 + 6))} for h in range(2)]
+        root = {'id': -1, 'name': 'default', 'type': 'root', 'children': [-2, -3]}
+        rules = [{'rule_id': 0, 'rule_name': 'replicated_rule', 'type': 1,
+                  'steps': [{'op': 'take', 'item': -1, 'item_name': 'default'}]}]
+        osd_dump = {'erasure_code_profiles': {'ec42': {'k': '4', 'm': '2', 'crush-device-class': 'hdd'}}}
+        with cephadm_test_common.set_module_args(args):
+            m_exit_json.side_effect = cephadm_test_common.exit_json
+            m_run_command.side_effect = [
+                (0, fake_ls_detail, ''),
+                (0, cephadm_test_common.batch_output([(0, 0, json.dumps({'nodes': [root] + hosts + osds}), ''),
+                                                      (1, 0, json.dumps(rules), ''),
+                                                      (2, 0, json.dumps(osd_dump), '')]), ''),
+            ]
+
+            with pytest.raises(cephadm_test_common.AnsibleExitJson) as result:
+                cephadm_pools.main()
+
+            result = result.value.args[0]
+            assert m_run_command.call_count == 2
+            # volumes and metrics share the 1200 PG copies of the default
+            # root, data gets the 600 of its hdd OSDs in chunks of 6
+            assert result['pg_nums'] == {'volumes': 256, 'metrics': 256, 'data': 128}
+            create = result['pools'][0]['cmds'][0]
+            assert create[create.index('--pg_num') + 1] == '256'
+            # Pools which aren't planned are created as by cephadm_pool, the
+            # autoscaler picks their pg_num
+            assert '--pg_num' not in result['pools'][1]['cmds'][0]
+            assert '--pg_num' not in result['pools'][3]['cmds'][0]
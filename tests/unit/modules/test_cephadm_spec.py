@@ -0,0 +1,74 @@
+# Make coding more python3-ish
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import json
+import pytest
+
+from . import cephadm_test_common
+from ansible_collections.stackhpc.cephadm.plugins.modules import cephadm_spec
+from mock.mock import patch
+
+cephadm_prefix = ['cephadm', '--timeout', '60', 'shell', '--', 'ceph']
+# As exported by the orchestrator, with its defaults filled in
+fake_services = json.dumps([
+    {'service_type': 'mon', 'service_name': 'mon', 'placement': {'count': 3, 'label': 'mon'}},
+    {'service_type': 'rgw', 'service_id': 'default', 'service_name': 'rgw.default',
+     'placement': {'label': 'rgw'}, 'spec': {'rgw_frontend_port': 8080, 'rgw_realm': 'r'}},
+])
+fake_hosts = json.dumps([
+    {'hostname': 'storage-0', 'addr': '10.0.0.1', 'labels': ['_admin', 'mon', 'extra'], 'status': ''},
+])
+# As rendered from the role template
+specs = [
+    {'service_type': 'host', 'hostname': 'storage-0', 'addr': '10.0.0.1', 'labels': ['mon', '_admin']},
+    {'service_type': 'mon', 'placement': {'count': '3', 'label': 'mon'}},
+    {'service_type': 'rgw', 'service_id': 'default', 'placement': {'label': 'rgw'},
+     'spec': {'rgw_frontend_port': 8080}},
+]
+
+
+def read_batch():
+    return (0, cephadm_test_common.batch_output([(0, 0, fake_services, ''),
+                                                 (1, 0, fake_hosts, '')]), '')
+
+
+class TestCephadmSpecModule(object):
+
+    @patch('ansible.module_utils.basic.AnsibleModule.exit_json')
+    @patch('ansible.module_utils.basic.AnsibleModule.run_command')
+    def test_unchanged(self, m_run_command, m_exit_json):
+        with cephadm_test_common.set_module_args({'specs': specs, 'ceph_transport': 'cli'}):
+            m_exit_json.side_effect = cephadm_test_common.exit_json
+            m_run_command.return_value = read_batch()
+
+            with pytest.raises(cephadm_test_common.AnsibleExitJson) as result:
+                cephadm_spec.main()
+
+            result = result.value.args[0]
+            assert not result['changed']
+            assert result['applied'] == []
+            assert m_run_command.call_count == 1
+
+    @patch('ansible.module_utils.basic.AnsibleModule.exit_json')
+    @patch('ansible.module_utils.basic.AnsibleModule.run_command')
+    def test_apply_changed(self, m_run_command, m_exit_json):
+        changed = [
+            {'service_type': 'mgr', 'placement': {'count': 2, 'label': 'mgr'}},
+            dict(specs[1], placement={'count': 5, 'label': 'mon'}),
+            dict(specs[2], unmanaged=False),
+            dict(specs[0], hostname='storage-1', addr='10.0.0.2'),
+        ]
+        with cephadm_test_common.set_module_args({'specs': changed, 'ceph_transport': 'cli'}):
+            m_exit_json.side_effect = cephadm_test_common.exit_json
+            m_run_command.side_effect = [read_batch(), (0, 'Scheduled mgr update...', '')]
+
+            with pytest.raises(cephadm_test_common.AnsibleExitJson) as result:
+                cephadm_spec.main()
+
+            result = result.value.args[0]
+            assert result['changed']
+            assert result['applied'] == ['host.storage-1', 'mgr', 'mon']
+            assert m_run_command.call_args[0][0] == cephadm_prefix + ['orch', 'apply', '-i', '-']
+            applied = [json.loads(doc) for doc in m_run_command.call_args[1]['data'].split('\n---\n')]
+            assert applied == [changed[3], changed[0], changed[1]]
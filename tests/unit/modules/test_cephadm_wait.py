@@ -0,0 +1,118 @@
+# Make coding more python3-ish
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import json
+import pytest
+
+from . import cephadm_test_common
+from ansible_collections.stackhpc.cephadm.plugins.modules import cephadm_wait
+from mock.mock import patch
+
+cephadm_prefix = ['cephadm', '--timeout', '60', 'shell', '--', 'ceph']
+
+
+def orch_ls(running, size):
+    return 0, cephadm_prefix, json.dumps([{'service_name': 'rgw.default',
+                                           'status': {'running': running, 'size': size}}]), ''
+
+
+class TestCephadmWaitModule(object):
+
+    @patch('time.sleep')
+    @patch('ansible_collections.stackhpc.cephadm.plugins.module_utils.cephadm_common.CephShell.close')
+    @patch('ansible_collections.stackhpc.cephadm.plugins.module_utils.cephadm_common.CephShell.run')
+    @patch('ansible.module_utils.basic.AnsibleModule.exit_json')
+    def test_service_running_backoff(self, m_exit_json, m_run, m_close, m_sleep):
+        args = {
+            'condition': 'service_running',
+            'service': 'rgw',
+            'ceph_transport': 'cli',
+        }
+        with cephadm_test_common.set_module_args(args):
+            m_exit_json.side_effect = cephadm_test_common.exit_json
+            m_run.side_effect = [orch_ls(3, 2), orch_ls(3, 2), orch_ls(3, 2), orch_ls(2, 2)]
+
+            with pytest.raises(cephadm_test_common.AnsibleExitJson) as result:
+                cephadm_wait.main()
+
+            result = result.value.args[0]
+            assert not result['changed']
+            assert result['attempts'] == 4
+            assert result['stdout'] == 'rgw.default: 2/2 running'
+            assert m_run.call_args[0][0] == cephadm_prefix + ['orch', 'ls', 'rgw', '-f', 'json']
+            # No progress, the delay doubles
+            assert [c[0][0] for c in m_sleep.call_args_list] == [1, 2, 4]
+            assert m_close.call_count == 1
+
+    @patch('time.sleep')
+    @patch('ansible_collections.stackhpc.cephadm.plugins.module_utils.cephadm_common.CephShell.close')
+    @patch('ansible_collections.stackhpc.cephadm.plugins.module_utils.cephadm_common.CephShell.run')
+    @patch('ansible.module_utils.basic.AnsibleModule.exit_json')
+    def test_progress_resets_delay(self, m_exit_json, m_run, m_close, m_sleep):
+        args = {
+            'condition': 'pgs_clean',
+            'ceph_transport': 'cli',
+            'max_delay': 3,
+        }
+
+        def pg_stat(clean):
+            return 0, cephadm_prefix, json.dumps({
+                'num_pgs': 10,
+                'num_pg_by_state': [{'name': 'active+clean', 'num': clean},
+                                    {'name': 'active+undersized+degraded', 'num': 10 - clean}]}), ''
+
+        with cephadm_test_common.set_module_args(args):
+            m_exit_json.side_effect = cephadm_test_common.exit_json
+            m_run.side_effect = [pg_stat(5), pg_stat(5), pg_stat(5), pg_stat(5), pg_stat(8), pg_stat(10)]
+
+            with pytest.raises(cephadm_test_common.AnsibleExitJson) as result:
+                cephadm_wait.main()
+
+            result = result.value.args[0]
+            assert result['attempts'] == 6
+            assert result['stdout'] == '10 of 10 PGs active+clean'
+            assert [c[0][0] for c in m_sleep.call_args_list] == [1, 2, 3, 3, 1]
+
+    @patch('time.sleep')
+    @patch('ansible_collections.stackhpc.cephadm.plugins.module_utils.cephadm_common.CephShell.close')
+    @patch('ansible_collections.stackhpc.cephadm.plugins.module_utils.cephadm_common.CephShell.run')
+    @patch('ansible.module_utils.basic.AnsibleModule.fail_json')
+    def test_timeout(self, m_fail_json, m_run, m_close, m_sleep):
+        args = {
+            'condition': 'health',
+            'ceph_transport': 'cli',
+            'timeout': 0,
+        }
+        with cephadm_test_common.set_module_args(args):
+            m_fail_json.side_effect = cephadm_test_common.fail_json
+            m_run.return_value = 0, cephadm_prefix, json.dumps({'status': 'HEALTH_WARN',
+                                                                'checks': {'OSD_DOWN': {}}}), ''
+
+            with pytest.raises(cephadm_test_common.AnsibleFailJson) as result:
+                cephadm_wait.main()
+
+            result = result.value.args[0]
+            assert result['msg'] == 'Timed out after 0 seconds waiting for health: HEALTH_WARN OSD_DOWN'
+            assert result['attempts'] == 1
+            assert m_sleep.call_count == 0
+            assert m_close.call_count == 1
+
+
+def test_pg_state_clean():
+    for name in ('active+clean', 'active+clean+scrubbing', 'active+clean+scrubbing+deep',
+                 'active+clean+snaptrim', 'active+clean+snaptrim_wait', 'active+clean+remapped'):
+        assert cephadm_wait.pg_state_clean(name), name
+    for name in ('active+undersized+degraded', 'active+clean+degraded', 'active+recovering',
+                 'active+remapped+backfill_wait', 'active+clean+backfilling', 'peering', 'peered',
+                 'down', 'incomplete', 'stale+active+clean', 'active', 'clean', ''):
+        assert not cephadm_wait.pg_state_clean(name), name
+
+
+def test_pgs_clean_while_scrubbing():
+    data = {'pg_summary': {'num_pgs': 10, 'num_pg_by_state': [
+        {'name': 'active+clean', 'num': 6},
+        {'name': 'active+clean+scrubbing', 'num': 2},
+        {'name': 'active+clean+scrubbing+deep', 'num': 2},
+    ]}}
+    assert cephadm_wait.pgs_clean(data, {}) == (True, 10, '10 of 10 PGs active+clean')